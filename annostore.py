@@ -0,0 +1,302 @@
+import argparse
+import os
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+import boxops
+from cocoreader import iter_coco_sections
+
+
+class AnnotationStore:
+    """Columnar in-memory detection dataset shared by the COCO, VOC and YOLO formats.
+
+    Images, categories and boxes are kept in parallel NumPy arrays instead of one
+    Python object per box:
+
+    - image table: file_names (list of str), widths, heights, depths
+    - category table: category_ids, category_names
+    - boxes: image_index and category_index (rows of the two tables) and
+      boxes as float64 [N, 4] absolute (xmin, ymin, xmax, ymax)
+
+    The writers follow the converter scripts: COCO and VOC boxes are truncated
+    to int in the output's own layout (x, y, w, h or xmin, ymin, xmax, ymax), and
+    the YOLO class of a box is its category id, as coco2yolo writes it.
+    """
+
+    def __init__(self, file_names, widths, heights, depths, category_ids, category_names,
+                 image_index, category_index, boxes):
+        self.file_names = list(file_names)
+        self.widths = np.asarray(widths, dtype=np.int32)
+        self.heights = np.asarray(heights, dtype=np.int32)
+        self.depths = np.asarray(depths, dtype=np.int32)
+        self.category_ids = np.asarray(category_ids, dtype=np.int64)
+        self.category_names = list(category_names)
+        self.image_index = np.asarray(image_index, dtype=np.int32)
+        self.category_index = np.asarray(category_index, dtype=np.int32)
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self._order = None
+
+    @property
+    def image_nums(self):
+        return len(self.file_names)
+
+    @property
+    def category_nums(self):
+        return len(self.category_names)
+
+    @property
+    def bbox_nums(self):
+        return len(self.image_index)
+
+    def image_slices(self):
+        """Return (order, starts, ends): boxes of image i are order[starts[i]:ends[i]]"""
+        if self._order is None:
+            self._order = np.argsort(self.image_index, kind='stable')
+        counts = np.bincount(self.image_index, minlength=self.image_nums)
+        ends = np.cumsum(counts)
+        return self._order, ends - counts, ends
+
+    def iter_images(self):
+        """Yield (image row, box rows) for every image, in image table order"""
+        order, starts, ends = self.image_slices()
+        for i in range(self.image_nums):
+            yield i, order[starts[i]:ends[i]]
+
+    @classmethod
+    def from_coco(cls, anno_file):
+        """Load a COCO instances file (or every shard of a shard manifest) in one streaming pass"""
+        image_ids = []
+        file_names = []
+        widths = array('i')
+        heights = array('i')
+        category_ids = []
+        category_names = []
+        ann_image_ids = []
+        ann_category_ids = []
+        boxes = array('d')
+        for key, item in iter_coco_sections(anno_file):
+            if key == 'images':
+                image_ids.append(item['id'])
+                file_names.append(item['file_name'])
+                widths.append(item['width'])
+                heights.append(item['height'])
+            elif key == 'annotations':
+                ann_image_ids.append(item['image_id'])
+                ann_category_ids.append(item['category_id'])
+                boxes.extend(item['bbox'])
+            else:
+                category_ids.append(item['id'])
+                category_names.append(item['name'])
+
+        # Map ids to table rows after the pass, so the arrays can come in any order
+        boxes = boxops.xywh2xyxy(np.frombuffer(boxes, dtype=np.float64))
+        return cls(file_names, widths, heights, np.full(len(file_names), 3), category_ids, category_names,
+                   _rows_of(image_ids, ann_image_ids), _rows_of(category_ids, ann_category_ids), boxes)
+
+    @classmethod
+    def from_voc(cls, xml_dir):
+        """Load a directory of VOC xml files; categories are numbered in sorted name order.
+
+        Like voc2coco, an object without a <name> raises instead of becoming a category.
+        """
+        from voc2coco import parse_xml_file, read_xml_files
+
+        file_names = []
+        widths = array('i')
+        heights = array('i')
+        depths = array('i')
+        names = []
+        image_index = array('i')
+        boxes = array('d')
+        for xml_file in read_xml_files(xml_dir):
+            file_name, size, objects = parse_xml_file(xml_file)
+            row = len(file_names)
+            file_names.append(file_name)
+            widths.append(size['width'])
+            heights.append(size['height'])
+            depths.append(size.get('depth') or 3)
+            for object_name, bbox in objects:
+                names.append(object_name)
+                image_index.append(row)
+                boxes.extend((bbox[0], bbox[1], bbox[0] + bbox[2], bbox[1] + bbox[3]))
+
+        category_names, category_index = np.unique(np.array(names, dtype=str), return_inverse=True)
+        return cls(file_names, widths, heights, depths, np.arange(len(category_names)), category_names.tolist(),
+                   image_index, category_index, np.frombuffer(boxes, dtype=np.float64))
+
+    @classmethod
+    def from_yolo(cls, anno_path, image_path):
+        """Load a YOLO label directory (with classes.txt); image sizes come from image headers.
+
+        Malformed lines are reported and skipped like yolo2coco does, and class ids
+        missing from classes.txt raise before anything is written.
+        """
+        from imagesize import get_image_shape
+        from yololabels import load_label_files
+
+        with open(os.path.join(anno_path, 'classes.txt'), 'r') as f:
+            category_names = [line.strip() for line in f.readlines()]
+        images = {os.path.splitext(i)[0]: i for i in os.listdir(image_path)}
+
+        file_names = []
+        widths = array('i')
+        heights = array('i')
+        label_files = []
+        for file in sorted(os.listdir(anno_path)):
+            stem, ext = os.path.splitext(file)
+            if ext != '.txt' or stem not in images:
+                continue
+            shape = get_image_shape(os.path.join(image_path, images[stem]))
+            if shape is None:
+                continue
+            file_names.append(images[stem])
+            heights.append(shape[0])
+            widths.append(shape[1])
+            label_files.append(os.path.join(anno_path, file))
+
+        # Label rows line up with file_names, so file_index is the image row of every box
+        labels = load_label_files(label_files)
+        for error in labels.errors:
+            print(f"WARNING: skipped malformed line {error}")
+        unknown = sorted(set(labels.class_ids[(labels.class_ids < 0) | (labels.class_ids >= len(category_names))].tolist()))
+        assert not unknown, f"ERROR: class ids {unknown} are not in classes.txt"
+        image_index = labels.file_index.astype(np.int32)
+        widths = np.asarray(widths)
+        heights = np.asarray(heights)
+        boxes = boxops.denormalize(boxops.cxcywh2xyxy(labels.boxes), widths[image_index], heights[image_index])
+        return cls(file_names, widths, heights, np.full(len(file_names), 3), np.arange(len(category_names)),
+                   category_names, image_index, labels.class_ids.astype(np.int32), boxes)
+
+    def to_coco(self, save_path):
+        """Write a COCO instances file; x, y, w and h are truncated like yolo2coco does"""
+        from cocowriter import CocoWriter
+
+        date_captured = str(datetime.today())
+        order, starts, ends = self.image_slices()
+        # w and h come back from xmax - xmin a few ulps off (47.99999... for 48), so
+        # that noise is rounded away before truncating
+        xywh = boxops.xyxy2xywh(self.boxes)
+        xywh[:, 2:] = np.round(xywh[:, 2:], 9)
+        xywh = boxops.truncate(xywh)
+        with CocoWriter(save_path) as coco:
+            annotation_id = 0
+            for i in range(self.image_nums):
+                coco.add_image({
+                    'id': i + 1,
+                    'file_name': self.file_names[i],
+                    'width': int(self.widths[i]),
+                    'height': int(self.heights[i]),
+                    'license': None,
+                    'flickr_url': None,
+                    'coco_url': None,
+                    'date_captured': date_captured
+                })
+                rows = order[starts[i]:ends[i]]
+                for bbox, category in zip(xywh[rows].tolist(), self.category_ids[self.category_index[rows]].tolist()):
+                    annotation_id += 1
+                    coco.add_annotation({
+                        'segmentation': [[
+                            bbox[0], bbox[1],
+                            bbox[0], bbox[1] + bbox[3],
+                            bbox[0] + bbox[2], bbox[1] + bbox[3],
+                            bbox[0] + bbox[2], bbox[1]
+                        ]],
+                        'area': bbox[2] * bbox[3],
+                        'iscrowd': 0,
+                        'ignore': 0,
+                        'image_id': i + 1,
+                        'bbox': bbox,
+                        'category_id': category,
+                        'id': annotation_id
+                    })
+            coco.close([{'supercategory': 'none', 'id': int(k), 'name': v}
+                        for k, v in zip(self.category_ids, self.category_names)])
+
+    def to_voc(self, save_path):
+        """Write one VOC xml file per image"""
+        from coco2voc import save_anno_to_xml
+
+        if not os.path.exists(save_path):
+            os.makedirs(save_path)
+        boxes = boxops.truncate(self.boxes)
+        names = np.array(self.category_names, dtype=object)
+        for i, rows in self.iter_images():
+            size = {'width': int(self.widths[i]), 'height': int(self.heights[i]), 'depth': int(self.depths[i])}
+            objs = [[name] + box for name, box in zip(names[self.category_index[rows]].tolist(), boxes[rows].tolist())]
+            save_anno_to_xml(self.file_names[i], size, objs, save_path)
+
+    def to_yolo(self, save_path):
+        """Write classes.txt and one YOLO label file per image; classes are category ids, like coco2yolo"""
+        if not os.path.exists(save_path):
+            os.makedirs(save_path)
+        with open(os.path.join(save_path, "classes.txt"), 'w') as f:
+            for name in self.category_names:
+                f.write("{}\n".format(name))
+
+        xywhn = boxops.normalize(boxops.xyxy2cxcywh(self.boxes),
+                                 self.widths[self.image_index], self.heights[self.image_index])
+        for i, rows in self.iter_images():
+            txt_name = os.path.splitext(self.file_names[i])[0] + ".txt"
+            with open(os.path.join(save_path, txt_name), 'w') as f:
+                for category, box in zip(self.category_ids[self.category_index[rows]].tolist(), xywhn[rows].tolist()):
+                    f.write("{} {:.5f} {:.5f} {:.5f} {:.5f}\n".format(category, *box))
+
+
+def _rows_of(table_ids, ids):
+    """Map ids to their row in table_ids (vectorised dict lookup)"""
+    table_ids = np.asarray(table_ids)
+    ids = np.asarray(ids)
+    if len(ids) == 0:
+        return np.zeros(0, dtype=np.int32)
+    order = np.argsort(table_ids, kind='stable')
+    pos = np.searchsorted(table_ids, ids, sorter=order)
+    pos = np.minimum(pos, len(order) - 1)
+    rows = order[pos]
+    missing = table_ids[rows] != ids
+    if missing.any():
+        raise KeyError('unknown id {!r}'.format(ids[missing][0]))
+    return rows.astype(np.int32)
+
+
+LOADERS = {
+    'coco': lambda path, image_path: AnnotationStore.from_coco(path),
+    'voc': lambda path, image_path: AnnotationStore.from_voc(path),
+    'yolo': lambda path, image_path: AnnotationStore.from_yolo(path, image_path),
+}
+WRITERS = {
+    'coco': AnnotationStore.to_coco,
+    'voc': AnnotationStore.to_voc,
+    'yolo': AnnotationStore.to_yolo,
+}
+
+
+def convert(src_format, anno_path, dst_format, save_path, image_path=None):
+    """Convert between any two formats through an AnnotationStore"""
+    if src_format == 'yolo':
+        assert image_path is not None, "ERROR: YOLO input needs --img-path for image sizes"
+    assert os.path.exists(anno_path), "ERROR: {} does not exist".format(anno_path)
+    store = LOADERS[src_format](anno_path, image_path)
+    WRITERS[dst_format](store, save_path)
+    print(f"class nums: {store.category_nums}")
+    print(f"image nums: {store.image_nums}")
+    print(f"bbox nums: {store.bbox_nums}")
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-if', '--input-format', type=str, required=True, choices=sorted(LOADERS), help='Format of the input annotations')
+    parser.add_argument('-of', '--output-format', type=str, required=True, choices=sorted(WRITERS), help='Format to write')
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='COCO .json file, VOC .xml folder or YOLO .txt folder(with classes.txt)')
+    parser.add_argument('-sp', '--save-path', type=str, required=True, help='Output .json file or annotations folder')
+    parser.add_argument('-ip', '--img-path', type=str, default=None, help='Path to the images folder (needed for YOLO input)')
+    opt = parser.parse_args(argv)
+
+    print(opt)
+    convert(opt.input_format, opt.anno_path, opt.output_format, opt.save_path, opt.img_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import os
+import tarfile
+import zipfile
+
+
+def is_archive(path):
+    """True if path is a tar (optionally gzip/bz2/xz compressed) or zip file rather than a folder"""
+    return os.path.isfile(path) and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+
+def iter_archive(path, suffixes=None):
+    """Yield (member name, bytes) for every regular file in a tar or zip archive, in archive order.
+
+    Members are taken from anywhere in the archive, keeping their path inside it
+    as the name; with suffixes only names ending with one of them are read. Tar
+    archives (compressed or not) are read as one sequential stream and zip
+    members one after the other, so nothing is extracted to disk and only one
+    member is held in memory at a time.
+    """
+    suffixes = tuple(suffixes) if suffixes is not None else None
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or (suffixes and not info.filename.endswith(suffixes)):
+                    continue
+                yield info.filename, archive.read(info)
+        return
+
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if not member.isfile() or (suffixes and not member.name.endswith(suffixes)):
+                continue
+            yield member.name, archive.extractfile(member).read()
+
+
+def member_basename(name):
+    """File name of an archive member, without the folders it is stored under"""
+    return name.rsplit('/', 1)[-1]
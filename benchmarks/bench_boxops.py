@@ -0,0 +1,107 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import boxops  # noqa: E402
+
+
+# Per-box reference implementations, as the converters had them before boxops
+def voc2yolo_xyxy2xywhn(bbox, size):
+    bbox = list(map(float, bbox))
+    size = list(map(float, size))
+    xc = (bbox[0] + (bbox[2] - bbox[0]) / 2.) / size[0]
+    yc = (bbox[1] + (bbox[3] - bbox[1]) / 2.) / size[1]
+    wn = (bbox[2] - bbox[0]) / size[0]
+    hn = (bbox[3] - bbox[1]) / size[1]
+    return (xc, yc, wn, hn)
+
+
+def yolo2voc_xywhn2xyxy(bbox, size):
+    bbox = list(map(float, bbox))
+    size = list(map(float, size))
+    xmin = (bbox[0] - bbox[2] / 2.) * size[1]
+    ymin = (bbox[1] - bbox[3] / 2.) * size[0]
+    xmax = (bbox[0] + bbox[2] / 2.) * size[1]
+    ymax = (bbox[1] + bbox[3] / 2.) * size[0]
+    return [int(xmin), int(ymin), int(xmax), int(ymax)]
+
+
+def yolo2coco_xywhn2xywh(bbox, size):
+    bbox = list(map(float, bbox))
+    size = list(map(float, size))
+    xmin = (bbox[0] - bbox[2] / 2.) * size[1]
+    ymin = (bbox[1] - bbox[3] / 2.) * size[0]
+    w = bbox[2] * size[1]
+    h = bbox[3] * size[0]
+    return list(map(int, (xmin, ymin, w, h)))
+
+
+def coco2yolo_xywh2xywhn(bbox, width, height):
+    xc = bbox[0] + bbox[2] / 2.
+    yc = bbox[1] + bbox[3] / 2.
+    return (xc / width, yc / height, bbox[2] / width, bbox[3] / height)
+
+
+def timed(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(name, n, old, new):
+    print(f"{name:<24} per-box {n / old:>14,.0f} boxes/s   boxops {n / new:>14,.0f} boxes/s   {old / new:>6.1f}x")
+
+
+def main(n, repeat, seed):
+    rng = np.random.default_rng(seed)
+    width, height = 1920, 1080
+    cxcywhn = np.column_stack([rng.uniform(0.1, 0.9, (n, 2)), rng.uniform(0.01, 0.2, (n, 2))])
+    xyxy = boxops.truncate(boxops.denormalize(boxops.cxcywh2xyxy(cxcywhn), width, height))
+    xywh = boxops.xyxy2xywh(xyxy)
+    shape = (height, width, 3)
+
+    rows = cxcywhn.tolist()
+    old, ref = timed(lambda: [yolo2voc_xywhn2xyxy(b, shape) for b in rows], repeat)
+    new, out = timed(lambda: boxops.truncate(boxops.denormalize(boxops.cxcywh2xyxy(cxcywhn), width, height)), repeat)
+    assert out.tolist() == ref
+    report("xywhn -> xyxy (VOC)", n, old, new)
+
+    old, ref = timed(lambda: [yolo2coco_xywhn2xywh(b, shape) for b in rows], repeat)
+    new, out = timed(lambda: boxops.truncate(boxops.denormalize(boxops.cxcywh2xywh(cxcywhn), width, height)), repeat)
+    assert out.tolist() == ref
+    report("xywhn -> xywh (COCO)", n, old, new)
+
+    rows = xyxy.tolist()
+    old, ref = timed(lambda: [voc2yolo_xyxy2xywhn(b, (width, height)) for b in rows], repeat)
+    new, out = timed(lambda: boxops.normalize(boxops.xyxy2cxcywh(xyxy), width, height), repeat)
+    assert out.tolist() == [list(b) for b in ref]
+    report("xyxy -> xywhn (YOLO)", n, old, new)
+
+    rows = xywh.tolist()
+    old, ref = timed(lambda: [coco2yolo_xywh2xywhn(b, width, height) for b in rows], repeat)
+    new, out = timed(lambda: boxops.normalize(boxops.xywh2cxcywh(xywh), width, height), repeat)
+    assert out.tolist() == [list(b) for b in ref]
+    report("xywh -> xywhn (YOLO)", n, old, new)
+
+    new, _ = timed(lambda: boxops.clip(xyxy, width, height), repeat)
+    print(f"{'clip xyxy':<24} boxops {n / new:>14,.0f} boxes/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--boxes', type=int, default=1000000, help='Number of boxes to convert')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of timed repetitions (best is reported)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated boxes')
+    opt = parser.parse_args()
+
+    print(opt)
+    main(opt.boxes, opt.repeat, opt.seed)
@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from imagesize import get_image_shape  # noqa: E402
+
+
+def bench(name, func, files, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for file in files:
+            func(file)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<16} {len(files) / best:>12.1f} images/s  ({best:.3f}s for {len(files)} images)")
+    return best
+
+
+def main(image_path, limit, repeat):
+    assert os.path.exists(image_path), f"ERROR: {image_path} does not exist"
+    files = sorted(os.path.join(image_path, i) for i in os.listdir(image_path))[:limit]
+
+    # Both paths must agree before timing them
+    mismatches = 0
+    readable = []
+    for file in files:
+        img = cv2.imread(file)
+        if img is None:
+            continue
+        readable.append(file)
+        if get_image_shape(file) != img.shape:
+            mismatches += 1
+            print(f"mismatch: {file}: {get_image_shape(file)} != {img.shape}")
+    print(f"checked {len(readable)} images, {mismatches} mismatches")
+    files = readable
+
+    slow = bench("cv2.imread", lambda f: cv2.imread(f).shape, files, repeat)
+    fast = bench("get_image_shape", get_image_shape, files, repeat)
+    print(f"speedup: {slow / fast:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-ip', '--image-path', type=str, required=True, help='Path to the directory containing images')
+    parser.add_argument('-n', '--limit', type=int, default=1000, help='Maximum number of images to benchmark')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of timed repetitions (best is reported)')
+    opt = parser.parse_args()
+
+    print(opt)
+    main(opt.image_path, opt.limit, opt.repeat)
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from gen_dataset import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY = os.path.join(ROOT, 'detectionhelper.py')
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def tool_args(data, out, workers):
+    """detectionhelper arguments of every benchmarked tool, given the dataset paths and an output folder"""
+    w = ['-w', str(workers)]
+    return {
+        'coco2voc': ['convert', 'coco', 'voc', '-ap', data['coco'], '-sp', os.path.join(out, 'voc')] + w,
+        'coco2yolo': ['convert', 'coco', 'yolo', '-ap', data['coco'], '-sp', os.path.join(out, 'yolo')] + w,
+        'voc2coco': ['convert', 'voc', 'coco', '-ap', data['voc'], '-sp', os.path.join(out, 'coco.json')] + w,
+        'voc2yolo': ['convert', 'voc', 'yolo', '-ap', data['voc'], '-sp', os.path.join(out, 'yolo')] + w,
+        'yolo2coco': ['convert', 'yolo', 'coco', '-ap', data['yolo'], '-ip', data['images'], '-sp', os.path.join(out, 'coco.json')] + w,
+        'yolo2voc': ['convert', 'yolo', 'voc', '-ap', data['yolo'], '-ip', data['images'], '-sp', os.path.join(out, 'voc')] + w,
+        'statcoco': ['stat', 'coco', '-ap', data['coco']],
+        'statvoc': ['stat', 'voc', '-ap', data['voc']] + w,
+        'statyolo': ['stat', 'yolo', '-ap', data['yolo']] + w,
+        'viscoco': ['vis', 'coco', '-ip', data['images'], '-ap', data['coco'], '-sp', os.path.join(out, 'vis')],
+        'visvoc': ['vis', 'voc', '-ip', data['images'], '-ap', data['voc'], '-sp', os.path.join(out, 'vis')],
+        'visyolo': ['vis', 'yolo', '-ip', data['images'], '-ap', data['yolo'], '-sp', os.path.join(out, 'vis')],
+    }
+
+
+def run_tool(args):
+    """(seconds, peak RSS in MiB) of one run in a fresh interpreter; the RSS is the largest of the tool and its workers"""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, ENTRY] + args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    with proc.stderr:
+        stderr = proc.stderr.read()
+    # wait4 rather than proc.wait(), for the rusage of this one child
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError("{} failed:\n{}".format(' '.join(args), stderr.decode(errors='replace')))
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def bench(data, image_nums, tools, workers, repeat, tmp_dir=None):
+    """{tool: {'files_per_s', 'peak_rss_mb'}}, best of repeat runs, each writing into an empty folder"""
+    results = dict()
+    for name in tools:
+        best_time, peak_rss = None, 0
+        for _ in range(repeat):
+            out = tempfile.mkdtemp(prefix='bench-', dir=tmp_dir)
+            try:
+                elapsed, rss = run_tool(tool_args(data, out, workers)[name])
+            finally:
+                shutil.rmtree(out, ignore_errors=True)
+            best_time = elapsed if best_time is None else min(best_time, elapsed)
+            peak_rss = max(peak_rss, rss)
+        results[name] = {'files_per_s': image_nums / best_time, 'peak_rss_mb': peak_rss}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print every tool against the baseline; return the tools slower by more than tolerance"""
+    slower = []
+    print(f"{'tool':<10} {'files/s':>10} {'peak RSS':>10} {'baseline':>10} {'change':>8}")
+    for name, result in results.items():
+        line = f"{name:<10} {result['files_per_s']:>10,.0f} {result['peak_rss_mb']:>7,.0f} MB"
+        base = baseline.get(name)
+        if base is not None:
+            ratio = result['files_per_s'] / base['files_per_s']
+            line += f" {base['files_per_s']:>10,.0f} {ratio - 1:>+8.0%}"
+            if ratio < 1 - tolerance:
+                slower.append(name)
+                line += '  SLOWER'
+        print(line)
+    return slower
+
+
+def main(opt):
+    dataset = {'images': opt.images, 'max_boxes': opt.max_boxes, 'classes': opt.classes, 'seed': opt.seed, 'workers': opt.workers}
+    baseline = dict()
+    if not opt.save_baseline and os.path.exists(opt.baseline):
+        with open(opt.baseline) as f:
+            stored = json.load(f)
+        if stored['dataset'] == dataset:
+            baseline = stored['results']
+        else:
+            print(f"WARNING: baseline {opt.baseline} was taken with {stored['dataset']}, not comparing")
+
+    root = tempfile.mkdtemp(prefix='bench-data-', dir=opt.tmp_dir)
+    try:
+        data = generate(root, opt.images, opt.max_boxes, opt.classes, opt.seed)
+        results = bench(data, opt.images, opt.tools, opt.workers, opt.repeat, opt.tmp_dir)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    slower = compare(results, baseline, opt.tolerance)
+    if opt.save_baseline:
+        with open(opt.baseline, 'w') as f:
+            json.dump({'dataset': dataset, 'results': results}, f, indent=2)
+        print(f"baseline saved to {opt.baseline}")
+    elif slower:
+        print(f"slower than the baseline: {', '.join(slower)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    tools = list(tool_args(dict.fromkeys(['coco', 'voc', 'yolo', 'images'], ''), '', 1))
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--images', type=int, default=2000, help='Number of generated images')
+    parser.add_argument('-b', '--max-boxes', type=int, default=8, help='Maximum number of boxes per image')
+    parser.add_argument('-c', '--classes', type=int, default=20, help='Number of classes')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated dataset')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Worker processes passed to the converters and VOC/YOLO statistics')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of timed runs per tool (best is reported)')
+    parser.add_argument('-t', '--tools', type=str, nargs='+', default=tools, choices=tools, help='Tools to run')
+    parser.add_argument('-bp', '--baseline', type=str, default=BASELINE, help='Baseline .json file to compare against')
+    parser.add_argument('-s', '--save-baseline', action='store_true', help='Store this run as the baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Relative slowdown reported as a regression')
+    parser.add_argument('--tmp-dir', type=str, default=None, help='Where to generate the dataset and outputs')
+    opt = parser.parse_args()
+
+    print(opt)
+    main(opt)
@@ -0,0 +1,112 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from lxml import etree, objectify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vocwriter import render_voc  # noqa: E402
+from vocxml import parse_voc  # noqa: E402
+
+# Names that need escaping or character references, mixed in with plain ones
+NAMES = ['person', 'car', 'traffic light', 'R&D', '<tag>', 'a>b', 'quote"s', "it's", 'café', '行人', 'emoji\U0001F600', 'cr\rlf']
+
+
+# Reference implementation, as coco2voc and yolo2voc wrote files before vocwriter
+def render_lxml(filename, width, height, depth, objects):
+    E = objectify.ElementMaker(annotate=False)
+    anno_tree = E.annotation(
+        E.folder("DATA"),
+        E.filename(filename),
+        E.source(
+            E.database("The VOC Database"),
+            E.annotation("PASCAL VOC"),
+            E.image("flickr")
+        ),
+        E.size(
+            E.width(width),
+            E.height(height),
+            E.depth(depth)
+        ),
+        E.segmented(0)
+    )
+    for obj in objects:
+        anno_tree.append(
+            E.object(
+                E.name(obj[0]),
+                E.pose("Unspecified"),
+                E.truncated(0),
+                E.difficult(0),
+                E.bndbox(
+                    E.xmin(obj[1]),
+                    E.ymin(obj[2]),
+                    E.xmax(obj[3]),
+                    E.ymax(obj[4])
+                )
+            )
+        )
+    return etree.tostring(etree.ElementTree(anno_tree), pretty_print=True)
+
+
+def make_documents(count, seed):
+    """Random (filename, width, height, depth, objects) documents, some without objects"""
+    rng = random.Random(seed)
+    documents = []
+    for i in range(count):
+        width, height = rng.randint(1, 4000), rng.randint(1, 4000)
+        objects = []
+        for _ in range(rng.choice([0, 1, 3, 8, 20])):
+            x, y = rng.randint(0, width - 1), rng.randint(0, height - 1)
+            objects.append((rng.choice(NAMES), x, y, rng.randint(x, width), rng.randint(y, height)))
+        documents.append((f"{rng.choice(NAMES)}_{i:06d}.jpg", width, height, 3, objects))
+    return documents
+
+
+def check(documents):
+    """Both writers give the same bytes, and parse_voc reads the fields back unchanged"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        xml_file = os.path.join(tmp_dir, 'doc.xml')
+        for document in documents:
+            data = render_voc(*document)
+            assert data == render_lxml(*document), document[0]
+            with open(xml_file, 'wb') as f:
+                f.write(data)
+            filename, size, objects = parse_voc(xml_file)
+            # XML parsers normalise a literal \r to \n, the written &#13; keeps it
+            assert (filename, size, objects) == (document[0], tuple(document[1:4]), [tuple(obj) for obj in document[4]]), document[0]
+
+
+def timed(funcs, documents, repeat):
+    """Best time of each function over all documents; runs alternate so machine noise hits both alike"""
+    best = [None] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            start = time.perf_counter()
+            for document in documents:
+                func(*document)
+            elapsed = time.perf_counter() - start
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return best
+
+
+def main(count, repeat, seed):
+    documents = make_documents(count, seed)
+    check(documents)
+
+    old, new = timed([render_lxml, render_voc], documents, repeat)
+    print(f"lxml objectify      {len(documents) / old:>10,.0f} files/s")
+    print(f"vocwriter template  {len(documents) / new:>10,.0f} files/s   {old / new:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--count', type=int, default=20000, help='Number of generated documents')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Number of timed repetitions (best is reported)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated documents')
+    opt = parser.parse_args()
+
+    print(opt)
+    main(opt.count, opt.repeat, opt.seed)
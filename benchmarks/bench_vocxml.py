@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import time
+
+from lxml import etree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vocxml import parse_voc  # noqa: E402
+
+
+# Recursive reference implementation, as voc2yolo and visvoc had it before vocxml
+def parse_xml_to_dict(xml):
+    if len(xml) == 0:
+        return {xml.tag: xml.text}
+
+    result = {}
+    for child in xml:
+        child_result = parse_xml_to_dict(child)
+        if child.tag != 'object':
+            result[child.tag] = child_result[child.tag]
+        else:
+            if child.tag not in result:
+                result[child.tag] = []
+            result[child.tag].append(child_result[child.tag])
+    return {xml.tag: result}
+
+
+def read_xml_to_dict(xml_file):
+    with open(xml_file) as fid:
+        xml_str = fid.read()
+    xml = etree.fromstring(xml_str)
+    return parse_xml_to_dict(xml)
+
+
+def as_tuples(info):
+    """The fields parse_voc returns, taken from a parse_xml_to_dict result"""
+    anno = info['annotation']
+    size = tuple(int(anno['size'][k]) if k in anno['size'] else None for k in ('width', 'height', 'depth'))
+    objects = [(obj['name'],) + tuple(int(obj['bndbox'][k]) for k in ('xmin', 'ymin', 'xmax', 'ymax'))
+               for obj in anno.get('object', []) if 'bndbox' in obj]
+    return anno['filename'], size, objects
+
+
+def timed(funcs, files, repeat):
+    """Best time of each function over all files; runs alternate so machine noise hits both alike"""
+    best = [None] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            start = time.perf_counter()
+            for xml_file in files:
+                func(xml_file)
+            elapsed = time.perf_counter() - start
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return best
+
+
+def main(anno_path, repeat):
+    files = [os.path.join(anno_path, i) for i in sorted(os.listdir(anno_path)) if i.endswith('.xml')]
+    assert files, "ERROR: no .xml files in {}".format(anno_path)
+    for xml_file in files:
+        assert parse_voc(xml_file) == as_tuples(read_xml_to_dict(xml_file)), xml_file
+
+    old, new = timed([read_xml_to_dict, parse_voc], files, repeat)
+    print(f"parse_xml_to_dict {len(files) / old:>10,.0f} files/s")
+    print(f"vocxml.parse_voc  {len(files) / new:>10,.0f} files/s   {old / new:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to a folder of VOC .xml files')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Number of timed repetitions (best is reported)')
+    opt = parser.parse_args()
+
+    print(opt)
+    main(opt.anno_path, opt.repeat)
@@ -0,0 +1,50 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import boxops  # noqa: E402
+from yololabels import label_files, load_label_files  # noqa: E402
+
+
+# Per-file reference, as the converters read labels before yololabels
+def read_per_file(files):
+    return [boxops.parse_lines(open(file, 'r').readlines()) for file in files]
+
+
+def timed(funcs, files, repeat):
+    """Best time of each function over all files; runs alternate so machine noise hits both alike"""
+    best = [None] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            start = time.perf_counter()
+            func(files)
+            elapsed = time.perf_counter() - start
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return best
+
+
+def main(anno_path, repeat):
+    files = label_files(anno_path)
+    assert files, "ERROR: no .txt label files in {}".format(anno_path)
+    labels = load_label_files(files)
+    for i, values in enumerate(read_per_file(files)):
+        class_ids, boxes = labels.of(i)
+        assert np.array_equal(values[:, 0], class_ids) and np.array_equal(values[:, 1:], boxes), files[i]
+
+    old, new = timed([read_per_file, load_label_files], files, repeat)
+    print(f"per-file parse_lines          {len(files) / old:>10,.0f} files/s")
+    print(f"yololabels.load_label_files   {len(files) / new:>10,.0f} files/s   {old / new:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to a YOLO .txt annotations folder')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Number of timed repetitions (best is reported)')
+    opt = parser.parse_args()
+
+    print(opt)
+    main(opt.anno_path, opt.repeat)
@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from gen_dataset import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY = os.path.join(ROOT, 'detectionhelper.py')
+sys.path.insert(0, ROOT)
+from annostore import AnnotationStore, convert  # noqa: E402
+
+FORMATS = ('coco', 'voc', 'yolo')
+OUTPUTS = {'coco': 'instances.json', 'voc': 'Annotations', 'yolo': 'labels'}
+# Pairs whose xmax and ymax may be 1 px apart; xmin and ymin must still match.
+# coco2voc truncates x and w separately and adds them where annostore truncates
+# xmax itself; yolo2coco truncates w * width as computed, so an exact 48 that
+# comes out as 47.99999... becomes 47, where annostore writes 48.
+SIZE_TOLERANCES = {('coco', 'voc'): 1, ('yolo', 'coco'): 1}
+# Normalized YOLO values are written with 5 decimals; a last-digit flip is allowed
+YOLO_TOLERANCE = 1.5e-5
+
+
+def write_shifted_coco(coco_file, save_path):
+    """Copy of a COCO file with 1-based category ids, categories listed in reverse and fractional boxes.
+
+    The generated dataset has integer boxes and 0-based ids, so converting it
+    cannot tell box rounding or class-id mapping apart; this copy can.
+    """
+    with open(coco_file) as f:
+        coco = json.load(f)
+    for category in coco['categories']:
+        category['id'] += 1
+    coco['categories'].reverse()
+    for annotation in coco['annotations']:
+        annotation['category_id'] += 1
+        x, y, w, h = annotation['bbox']
+        annotation['bbox'] = [x + 0.6, y + 0.3, max(w - 0.7, 0.2), max(h - 0.9, 0.2)]
+    with open(save_path, 'w') as f:
+        json.dump(coco, f)
+    return save_path
+
+
+def load_output(anno_format, path, image_path):
+    """AnnotationStore of a converter output, read back the same way whichever tool wrote it"""
+    if anno_format == 'coco':
+        return AnnotationStore.from_coco(path)
+    if anno_format == 'voc':
+        return AnnotationStore.from_voc(path)
+    return AnnotationStore.from_yolo(path, image_path)
+
+
+def image_boxes(store):
+    """{file name: (width, height, sorted [(category name, xmin, ymin, xmax, ymax)])}"""
+    names = np.array(store.category_names, dtype=object)
+    result = dict()
+    for i, rows in store.iter_images():
+        objects = [(name,) + tuple(box) for name, box in zip(names[store.category_index[rows]].tolist(), store.boxes[rows].tolist())]
+        result[store.file_names[i]] = (int(store.widths[i]), int(store.heights[i]), sorted(objects))
+    return result
+
+
+def differences(expected, actual, tolerance, size_tolerance):
+    """Messages for every image whose size, classes or boxes differ.
+
+    xmin and ymin may differ by tolerance pixels, xmax and ymax by size_tolerance.
+    """
+    messages = []
+    if list(zip(expected.category_ids.tolist(), expected.category_names)) != list(zip(actual.category_ids.tolist(), actual.category_names)):
+        messages.append(f"categories {expected.category_names} != {actual.category_names}")
+    expected, actual = image_boxes(expected), image_boxes(actual)
+    for file_name in sorted(set(expected) | set(actual)):
+        if file_name not in actual or file_name not in expected:
+            messages.append(f"{file_name}: only in {'the script' if file_name in expected else 'annostore'} output")
+            continue
+        (width, height, objects), (other_width, other_height, other_objects) = expected[file_name], actual[file_name]
+        if (width, height) != (other_width, other_height) or len(objects) != len(other_objects):
+            messages.append(f"{file_name}: {width}x{height} with {len(objects)} boxes != "
+                            f"{other_width}x{other_height} with {len(other_objects)} boxes")
+            continue
+        for obj, other in zip(objects, other_objects):
+            if (obj[0] != other[0] or max(abs(a - b) for a, b in zip(obj[1:3], other[1:3])) > tolerance
+                    or max(abs(a - b) for a, b in zip(obj[3:], other[3:])) > size_tolerance):
+                messages.append(f"{file_name}: {obj} != {other}")
+                break
+    return messages
+
+
+def read_label_dir(label_dir):
+    """{file name: lines} of a YOLO output folder, with the label lines split into numbers"""
+    result = dict()
+    for file_name in os.listdir(label_dir):
+        with open(os.path.join(label_dir, file_name)) as f:
+            lines = f.read().splitlines()
+        result[file_name] = lines if file_name == 'classes.txt' else sorted([float(v) for v in line.split()] for line in lines)
+    return result
+
+
+def label_differences(expected_dir, actual_dir, tolerance):
+    """Messages for every YOLO label file whose classes or values differ, line by line.
+
+    A missing label file counts as an empty one: voc2yolo leaves out the file of
+    an image without boxes, annostore writes it empty.
+    """
+    messages = []
+    expected, actual = read_label_dir(expected_dir), read_label_dir(actual_dir)
+    for file_name in sorted(set(expected) | set(actual)):
+        lines, other_lines = expected.get(file_name, []), actual.get(file_name, [])
+        if file_name == 'classes.txt':
+            if lines != other_lines:
+                messages.append(f"classes.txt: {lines} != {other_lines}")
+            continue
+        if len(lines) != len(other_lines):
+            messages.append(f"{file_name}: {len(lines)} lines != {len(other_lines)} lines")
+            continue
+        for line, other in zip(lines, other_lines):
+            if line[0] != other[0] or max(abs(a - b) for a, b in zip(line[1:], other[1:])) > tolerance:
+                messages.append(f"{file_name}: {line} != {other}")
+                break
+    return messages
+
+
+def check(data, out, tolerance):
+    """Convert between every pair of formats with the script and with annostore; return the failing pairs"""
+    sources = [(src, src, data[src]) for src in FORMATS]
+    sources.append(('shifted coco', 'coco', write_shifted_coco(data['coco'], os.path.join(out, 'shifted.json'))))
+    failed = []
+    for name, src, anno_path in sources:
+        for dst in FORMATS:
+            if src == dst:
+                continue
+            pair = f"{name} -> {dst}"
+            script_path = os.path.join(out, pair.replace(' ', '-'), OUTPUTS[dst])
+            store_path = os.path.join(out, pair.replace(' ', '-') + '-store', OUTPUTS[dst])
+            os.makedirs(os.path.dirname(script_path))
+            os.makedirs(os.path.dirname(store_path))
+            args = ['convert', src, dst, '-ap', anno_path, '-sp', script_path]
+            if src == 'yolo':
+                args += ['-ip', data['images']]
+            subprocess.run([sys.executable, ENTRY] + args, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            convert(src, anno_path, dst, store_path, data['images'])
+
+            if dst == 'yolo':
+                messages = label_differences(script_path, store_path, YOLO_TOLERANCE)
+            else:
+                messages = differences(load_output(dst, script_path, data['images']), load_output(dst, store_path, data['images']),
+                                       tolerance, max(tolerance, SIZE_TOLERANCES.get((src, dst), 0)))
+            print(f"{pair}: {'ok' if not messages else 'DIFFERENT'}")
+            for message in messages[:10]:
+                print(f"    {message}")
+            if messages:
+                failed.append(pair)
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--images', type=int, default=200, help='Number of generated images')
+    parser.add_argument('-b', '--max-boxes', type=int, default=8, help='Maximum number of boxes per image')
+    parser.add_argument('-c', '--classes', type=int, default=20, help='Number of classes')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated dataset')
+    parser.add_argument('--tolerance', type=float, default=0, help='Largest box coordinate difference in pixels for every pair (see SIZE_TOLERANCES for the pairs whose xmax and ymax may be 1 px apart)')
+    parser.add_argument('--tmp-dir', type=str, default=None, help='Where to generate the dataset and outputs')
+    opt = parser.parse_args()
+
+    print(opt)
+    root = tempfile.mkdtemp(prefix='check-annostore-', dir=opt.tmp_dir)
+    try:
+        data = generate(os.path.join(root, 'data'), opt.images, opt.max_boxes, opt.classes, opt.seed)
+        failed = check(data, root, opt.tolerance)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    if failed:
+        print(f"annostore differs from the scripts for: {', '.join(failed)}")
+        sys.exit(1)
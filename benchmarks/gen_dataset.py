@@ -0,0 +1,124 @@
+import argparse
+import os
+import random
+import struct
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cocowriter import CocoWriter  # noqa: E402
+from vocwriter import render_voc  # noqa: E402
+
+# Image sizes to draw from; few enough that each PNG is compressed only once
+SIZES = [(320, 240), (480, 360), (640, 480), (800, 600), (1024, 768), (1280, 720), (1920, 1080), (600, 800)]
+
+
+def png_bytes(width, height, color=(128, 128, 128)):
+    """Smallest-effort valid RGB PNG of one solid colour; rows of equal pixels compress to almost nothing"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    row = b'\x00' + bytes(color) * width
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height, 9))
+            + chunk(b'IEND', b''))
+
+
+def make_dataset(image_nums, max_boxes, class_nums, seed=0):
+    """(classes, images) with images as (file_name, width, height, [(class_id, xmin, ymin, xmax, ymax)])
+
+    Every image gets 0 to max_boxes boxes of random classes and integer
+    coordinates inside the image, so all three formats can hold them exactly.
+    """
+    rng = random.Random(seed)
+    classes = ['class{:03d}'.format(i) for i in range(class_nums)]
+    images = []
+    for i in range(image_nums):
+        width, height = rng.choice(SIZES)
+        boxes = []
+        for _ in range(rng.randint(0, max_boxes)):
+            xmin, ymin = rng.randrange(width - 1), rng.randrange(height - 1)
+            xmax, ymax = rng.randint(xmin + 1, width), rng.randint(ymin + 1, height)
+            boxes.append((rng.randrange(class_nums), xmin, ymin, xmax, ymax))
+        images.append(('{:08d}.png'.format(i), width, height, boxes))
+    return classes, images
+
+
+def write_images(images, image_path):
+    os.makedirs(image_path, exist_ok=True)
+    cache = dict()
+    for file_name, width, height, _ in images:
+        if (width, height) not in cache:
+            cache[width, height] = png_bytes(width, height)
+        with open(os.path.join(image_path, file_name), 'wb') as f:
+            f.write(cache[width, height])
+
+
+def write_coco(classes, images, save_path):
+    annotation_id = 0
+    with CocoWriter(save_path) as coco:
+        for image_id, (file_name, width, height, boxes) in enumerate(images, 1):
+            coco.add_image({'id': image_id, 'file_name': file_name, 'width': width, 'height': height})
+            for class_id, xmin, ymin, xmax, ymax in boxes:
+                annotation_id += 1
+                coco.add_annotation({'area': (xmax - xmin) * (ymax - ymin), 'iscrowd': 0, 'image_id': image_id,
+                                     'bbox': [xmin, ymin, xmax - xmin, ymax - ymin], 'category_id': class_id,
+                                     'id': annotation_id})
+        coco.close([{'supercategory': 'none', 'id': i, 'name': name} for i, name in enumerate(classes)])
+
+
+def write_voc(classes, images, save_path):
+    os.makedirs(save_path, exist_ok=True)
+    for file_name, width, height, boxes in images:
+        objects = [(classes[class_id], xmin, ymin, xmax, ymax) for class_id, xmin, ymin, xmax, ymax in boxes]
+        with open(os.path.join(save_path, os.path.splitext(file_name)[0] + '.xml'), 'wb') as f:
+            f.write(render_voc(file_name, width, height, 3, objects))
+
+
+def write_yolo(classes, images, save_path):
+    os.makedirs(save_path, exist_ok=True)
+    with open(os.path.join(save_path, 'classes.txt'), 'w') as f:
+        f.write(''.join(name + '\n' for name in classes))
+    for file_name, width, height, boxes in images:
+        with open(os.path.join(save_path, os.path.splitext(file_name)[0] + '.txt'), 'w') as f:
+            for class_id, xmin, ymin, xmax, ymax in boxes:
+                f.write("{} {:.6f} {:.6f} {:.6f} {:.6f}\n".format(
+                    class_id, (xmin + xmax) / 2 / width, (ymin + ymax) / 2 / height, (xmax - xmin) / width, (ymax - ymin) / height))
+
+
+def dataset_paths(root):
+    """Where generate() puts the images and each format under root"""
+    return {
+        'images': os.path.join(root, 'images'),
+        'coco': os.path.join(root, 'instances.json'),
+        'voc': os.path.join(root, 'Annotations'),
+        'yolo': os.path.join(root, 'labels'),
+    }
+
+
+def generate(root, image_nums=1000, max_boxes=8, class_nums=20, seed=0, formats=('coco', 'voc', 'yolo')):
+    """Write the same synthetic dataset in every requested format under root, returning its paths"""
+    paths = dataset_paths(root)
+    classes, images = make_dataset(image_nums, max_boxes, class_nums, seed)
+    write_images(images, paths['images'])
+    writers = {'coco': write_coco, 'voc': write_voc, 'yolo': write_yolo}
+    for anno_format in formats:
+        writers[anno_format](classes, images, paths[anno_format])
+    print(f"image nums: {len(images)}")
+    print(f"bbox nums: {sum(len(boxes) for _, _, _, boxes in images)}")
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-sp', '--save-path', type=str, required=True, help='Folder to write images/, instances.json, Annotations/ and labels/ into')
+    parser.add_argument('-n', '--images', type=int, default=1000, help='Number of images')
+    parser.add_argument('-b', '--max-boxes', type=int, default=8, help='Maximum number of boxes per image (each image gets 0 to this many)')
+    parser.add_argument('-c', '--classes', type=int, default=20, help='Number of classes')
+    parser.add_argument('-f', '--formats', type=str, nargs='+', default=['coco', 'voc', 'yolo'], choices=['coco', 'voc', 'yolo'], help='Annotation formats to write')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    opt = parser.parse_args()
+
+    print(opt)
+    generate(opt.save_path, opt.images, opt.max_boxes, opt.classes, opt.seed, opt.formats)
@@ -0,0 +1,101 @@
+import numpy as np
+
+# Batched bounding-box conversions. Every function takes an array-like of shape
+# [N, 4] and returns a new float64 array of the same shape.
+#
+# Formats:
+#   xyxy   - (xmin, ymin, xmax, ymax)        VOC
+#   xywh   - (xmin, ymin, width, height)     COCO
+#   cxcywh - (x center, y center, w, h)      YOLO (normalized by image size)
+#
+# The arithmetic is done in the same order as the per-box helpers these replace,
+# so truncating or formatting the results gives the same output as before.
+
+
+def _as_boxes(boxes):
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def _as_size(width, height):
+    """Broadcastable (w, h) scale for scalar or per-box [N] image sizes"""
+    return np.stack(np.broadcast_arrays(np.asarray(width, dtype=np.float64),
+                                        np.asarray(height, dtype=np.float64)), axis=-1).reshape(-1, 2)
+
+
+def xyxy2xywh(boxes):
+    boxes = _as_boxes(boxes)
+    out = boxes.copy()
+    out[:, 2:] = boxes[:, 2:] - boxes[:, :2]
+    return out
+
+
+def xywh2xyxy(boxes):
+    boxes = _as_boxes(boxes)
+    out = boxes.copy()
+    out[:, 2:] = boxes[:, :2] + boxes[:, 2:]
+    return out
+
+
+def xyxy2cxcywh(boxes):
+    boxes = _as_boxes(boxes)
+    wh = boxes[:, 2:] - boxes[:, :2]
+    return np.concatenate([boxes[:, :2] + wh / 2., wh], axis=1)
+
+
+def cxcywh2xyxy(boxes):
+    boxes = _as_boxes(boxes)
+    half = boxes[:, 2:] / 2.
+    return np.concatenate([boxes[:, :2] - half, boxes[:, :2] + half], axis=1)
+
+
+def xywh2cxcywh(boxes):
+    boxes = _as_boxes(boxes)
+    out = boxes.copy()
+    out[:, :2] = boxes[:, :2] + boxes[:, 2:] / 2.
+    return out
+
+
+def cxcywh2xywh(boxes):
+    boxes = _as_boxes(boxes)
+    out = boxes.copy()
+    out[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2.
+    return out
+
+
+def normalize(boxes, width, height):
+    """Divide x coordinates by width and y coordinates by height"""
+    return _as_boxes(boxes) / np.tile(_as_size(width, height), 2)
+
+
+def denormalize(boxes, width, height):
+    """Multiply x coordinates by width and y coordinates by height"""
+    return _as_boxes(boxes) * np.tile(_as_size(width, height), 2)
+
+
+def clip(boxes, width, height):
+    """Clip xyxy boxes to [0, width] x [0, height]"""
+    return np.clip(_as_boxes(boxes), 0, np.tile(_as_size(width, height), 2))
+
+
+def truncate(boxes):
+    """Drop the fractional part like int() does, returning int64"""
+    return _as_boxes(boxes).astype(np.int64)
+
+
+def round_boxes(boxes, decimals=0):
+    return np.round(_as_boxes(boxes), decimals)
+
+
+def parse_lines(lines, columns=5):
+    """Parse whitespace separated rows of numbers into a float64 [N, columns] array.
+
+    Blank lines are skipped and fields past the first `columns` are ignored; a row
+    with fewer fields raises ValueError.
+    """
+    rows = [line.split()[:columns] for line in lines]
+    rows = [row for row in rows if row]
+    if not rows:
+        return np.zeros((0, columns), dtype=np.float64)
+    if any(len(row) != columns for row in rows):
+        raise ValueError("expected {} fields per line".format(columns))
+    return np.array(rows, dtype=np.float64)
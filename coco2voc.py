@@ -1,104 +1,102 @@
-from pycocotools.coco import COCO
 import os
-from lxml import etree, objectify
 import shutil
+from functools import partial
 from tqdm import tqdm
 import argparse
-
-# Global statistics variables
-images_nums = 0
-category_nums = 0
-bbox_nums = 0
-
-def catid2name(coco):
-    """Convert category IDs to category names"""
-    classes = dict()
-    for cat in coco.dataset['categories']:
-        classes[cat['id']] = cat['name']
-    return classes
+from parallel import imap
+from cocoreader import catid2name, coco_file_bytes, load_coco_images
+from metrics import Metrics, report
+from manifest import Manifest, data_fingerprint
+from vocwriter import render_voc, write_voc
+from shardwriter import SHARD_FORMATS, open_shards
+from writepool import write_behind
 
 def save_anno_to_xml(filename, size, objs, save_path):
-    """Save annotation in VOC format (XML)"""
-    E = objectify.ElementMaker(annotate=False)
-    anno_tree = E.annotation(
-        E.folder("DATA"),
-        E.filename(filename),
-        E.source(
-            E.database("The VOC Database"),
-            E.annotation("PASCAL VOC"),
-            E.image("flickr")
-        ),
-        E.size(
-            E.width(size['width']),
-            E.height(size['height']),
-            E.depth(size['depth'])
-        ),
-        E.segmented(0)
-    )
-    for obj in objs:
-        E2 = objectify.ElementMaker(annotate=False)
-        anno_tree2 = E2.object(
-            E.name(obj[0]),
-            E.pose("Unspecified"),
-            E.truncated(0),
-            E.difficult(0),
-            E.bndbox(
-                E.xmin(obj[1]),
-                E.ymin(obj[2]),
-                E.xmax(obj[3]),
-                E.ymax(obj[4])
-            )
-        )
-        anno_tree.append(anno_tree2)
+    """Save annotation in VOC format (XML); objs are [name, xmin, ymin, xmax, ymax]"""
+    anno_path = os.path.join(save_path, filename[:-3] + "xml")
+    write_voc(anno_path, filename, size['width'], size['height'], size['depth'], objs)
+
+def xml_file(save_path, item):
+    """Worker entry point: item is (filename, size, objs); returns (path, xml, None) for write_behind"""
+    filename, size, objs = item
     anno_path = os.path.join(save_path, filename[:-3] + "xml")
-    etree.ElementTree(anno_tree).write(anno_path, pretty_print=True)
+    return anno_path, render_voc(filename, size['width'], size['height'], size['depth'], objs), None
 
-def load_coco(anno_file, xml_save_path):
+def load_coco(anno_file, xml_save_path, workers=1, backend='pycocotools', incremental=False, write_threads=4, write_queue=64,
+              shard_format=None, shard_size=None, shard_images=None, metrics=None):
     """Load COCO annotations and convert them to VOC format"""
-    global images_nums, category_nums, bbox_nums
-    
-    if os.path.exists(xml_save_path):
-        shutil.rmtree(xml_save_path)
-    os.makedirs(xml_save_path)
-
-    coco = COCO(anno_file)
-    classes = catid2name(coco)
-    imgIds = coco.getImgIds()
-    category_nums = len(classes)  # Number of categories
-    
-    for imgId in tqdm(imgIds, desc="Processing images", ncols=100):
-        size = {}
-        img = coco.loadImgs(imgId)[0]
-        filename = img['file_name']
-        width = img['width']
-        height = img['height']
-        size['width'] = width
-        size['height'] = height
-        size['depth'] = 3  # Assuming all images are RGB
-        
-        # Retrieve annotations for this image
-        annIds = coco.getAnnIds(imgIds=img['id'], iscrowd=None)
-        anns = coco.loadAnns(annIds)
-        objs = []
-        for ann in anns:
-            object_name = classes[ann['category_id']]
-            bbox = list(map(int, ann['bbox']))
-            xmin = bbox[0]
-            ymin = bbox[1]
-            xmax = bbox[0] + bbox[2]
-            ymax = bbox[1] + bbox[3]
-            obj = [object_name, xmin, ymin, xmax, ymax]
-            objs.append(obj)
-        
-        # Update bounding box count
-        bbox_nums += len(objs)
-        images_nums += 1
-        
-        # Save the annotations in XML format
-        save_anno_to_xml(filename, size, objs, xml_save_path)
-
-def parse(anno_path, xmls_save_path):
+    metrics = metrics if metrics is not None else Metrics()
+    # With incremental, images whose record and annotations are unchanged since the
+    # last run keep their existing .xml file
+    manifest = Manifest(xml_save_path, {'tool': 'coco2voc'}) if incremental else None
+    if manifest is None or manifest.rebuild:
+        if os.path.exists(xml_save_path):
+            shutil.rmtree(xml_save_path)
+        os.makedirs(xml_save_path)
+    skipped = 0
+    shards = open_shards(xml_save_path, shard_format, shard_size, shard_images)
+    assert shards is None or manifest is None, "ERROR: --incremental does not work with --shards"
+
+    with metrics.stage('read'):
+        categories, image_count, images = load_coco_images(anno_file, backend)
+    metrics.add_read(coco_file_bytes(anno_file))
+    classes = catid2name(categories)
+    metrics.count('category_nums', len(classes))  # Number of categories
+
+    def iter_items():
+        nonlocal skipped
+        for img, anns in metrics.timed('read', images):
+            size = {}
+            filename = img['file_name']
+            width = img['width']
+            height = img['height']
+            size['width'] = width
+            size['height'] = height
+            size['depth'] = 3  # Assuming all images are RGB
+
+            objs = []
+            for ann in anns:
+                object_name = classes[ann['category_id']]
+                bbox = list(map(int, ann['bbox']))
+                xmin = bbox[0]
+                ymin = bbox[1]
+                xmax = bbox[0] + bbox[2]
+                ymax = bbox[1] + bbox[3]
+                obj = [object_name, xmin, ymin, xmax, ymax]
+                objs.append(obj)
+
+            # Update bounding box count
+            metrics.count('bbox_nums', len(objs))
+            metrics.count('image_nums')
+
+            if manifest is not None:
+                key = str(img['id'])
+                fingerprint = data_fingerprint([filename, size, objs])
+                if manifest.is_current(key, fingerprint):
+                    skipped += 1
+                    continue
+                manifest.record(key, fingerprint, [filename[:-3] + "xml"])
+            yield filename, size, objs
+
+    # Render the annotations in XML format; files are written on background threads
+    # and the progress bar counts completed writes
+    files = metrics.timed('transform', imap(partial(xml_file, xml_save_path), iter_items(), workers))
+    written = write_behind(metrics.track_written(files), write_threads, write_queue, shards)
+    for _ in tqdm(metrics.timed('write', written), total=image_count, desc="Processing images", ncols=100):
+        pass
+    if shards is not None:
+        shards.close()
+        print(f'shards: {len(shards.shards)}')
+
+    if manifest is not None:
+        removed = manifest.remove_stale()
+        manifest.save()
+        print(f'unchanged: {skipped}, removed: {removed}')
+
+def parse(anno_path, xmls_save_path, workers=1, backend='pycocotools', incremental=False, write_threads=4, write_queue=64,
+          shard_format=None, shard_size=None, shard_images=None, metrics=None):
     """Parse COCO annotations and convert them to VOC format"""
+    metrics = metrics if metrics is not None else Metrics()
     assert os.path.exists(anno_path), f"ERROR: {anno_path} does not exist"
 
     if os.path.isdir(anno_path):
@@ -107,21 +105,41 @@ def parse(anno_path, xmls_save_path):
             ann_file = f'instances_{data_type}.json'
             anno_path = os.path.join(anno_path, ann_file)
             xmls_save_path = os.path.join(xmls_save_path, data_type)
-            load_coco(anno_path, xmls_save_path)
+            load_coco(anno_path, xmls_save_path, workers, backend, incremental, write_threads, write_queue,
+                      shard_format, shard_size, shard_images, metrics)
     elif os.path.isfile(anno_path):
         anno_file = anno_path
-        load_coco(anno_file, xmls_save_path)
+        load_coco(anno_file, xmls_save_path, workers, backend, incremental, write_threads, write_queue,
+                  shard_format, shard_size, shard_images, metrics)
 
     # Print statistics at the end
-    print(f'class nums: {category_nums}')
-    print(f'image nums: {images_nums}')
-    print(f'bbox nums: {bbox_nums}')
+    print(f'class nums: {metrics.get("category_nums")}')
+    print(f'image nums: {metrics.get("image_nums")}')
+    print(f'bbox nums: {metrics.get("bbox_nums")}')
+    return metrics
 
-if __name__ == '__main__':
+def main(argv=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to COCO .json annotation file')
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to COCO .json annotation file, shard manifest or compiled .cocoindex')
     parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the generated VOC .xml annotations folder')
-    opt = parser.parse_args()
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes for writing (0 uses all CPUs)')
+    parser.add_argument('-b', '--backend', type=str, default='pycocotools', choices=['pycocotools', 'stream', 'index'], help='COCO reader: full pycocotools index, bounded-memory streaming or a compiled binary index')
+    parser.add_argument('-i', '--incremental', action='store_true', help='Only rewrite files whose images or annotations changed since the last run')
+    parser.add_argument('-wt', '--write-threads', type=int, default=4, help='Number of threads writing output files (0 writes them inline)')
+    parser.add_argument('-wq', '--write-queue', type=int, default=64, help='Maximum number of output files waiting to be written')
+    parser.add_argument('-sh', '--shards', type=str, default=None, choices=SHARD_FORMATS, help='Pack the output files into tar or zip shards (indexed in shards.json) instead of writing one file each')
+    parser.add_argument('-ss', '--shard-size', type=float, default=1024, help='Maximum size of one shard in MiB')
+    parser.add_argument('-si', '--shard-images', type=str, default=None, help='Images folder; pack each image next to its label in the same shard (WebDataset layout)')
+    parser.add_argument('-m', '--metrics', type=str, default=None, help='Write stage times, counts, bytes read and written and peak memory to this .json file')
+    parser.add_argument('--trace', type=str, default=None, help='Write the stage calls to this .json file as a Chrome trace')
+    parser.add_argument('--trace-memory', action='store_true', help='Track the peak Python memory with tracemalloc (slows the run down)')
+    opt = parser.parse_args(argv)
 
     print(opt)
-    parse(opt.anno_path, opt.save_path)
\ No newline at end of file
+    metrics = Metrics(opt.trace_memory, opt.trace is not None)
+    parse(opt.anno_path, opt.save_path, opt.workers, opt.backend, opt.incremental, opt.write_threads, opt.write_queue,
+          opt.shards, opt.shard_size, opt.shard_images, metrics)
+    report(metrics, opt.metrics, opt.trace)
+
+if __name__ == '__main__':
+    main()
@@ -1,112 +1,144 @@
-from pycocotools.coco import COCO
 import os
 import shutil
+from functools import partial
 from tqdm import tqdm
 import argparse
+from parallel import imap
+from cocoreader import catid2name, coco_file_bytes, load_coco_images
+from metrics import Metrics, report
+from cocoindex import is_coco_index
+import boxops
+from manifest import Manifest, data_fingerprint
+from shardwriter import SHARD_FORMATS, open_shards
+from writepool import write_behind, write_file
 
-# Global statistics variables
-images_nums = 0
-category_nums = 0
-bbox_nums = 0
-
-def catid2name(coco):
-    """Convert category IDs to category names"""
-    classes = dict()
-    for cat in coco.dataset['categories']:
-        classes[cat['id']] = cat['name']
-    return classes
-
-def xyxy2xywhn(object, width, height):
-    """Convert bounding box from (x1, y1, x2, y2) to normalized (x, y, w, h)"""
-    cat_id = object[0]
-    xn = object[1] / width
-    yn = object[2] / height
-    wn = object[3] / width
-    hn = object[4] / height
-    out = "{} {:.5f} {:.5f} {:.5f} {:.5f}".format(cat_id, xn, yn, wn, hn)
-    return out
+def render_txt(images_info):
+    """YOLO .txt content for one image"""
+    return "".join("{} {:.5f} {:.5f} {:.5f} {:.5f}\n".format(*obj) for obj in images_info['objects'])
+
+def txt_file(save_path, images_info):
+    """(path, content, None) of the .txt file for one image, for write_behind"""
+    txt_name = images_info['filename'][:-3] + "txt"
+    return os.path.join(save_path, txt_name), render_txt(images_info), None
 
 def save_anno_to_txt(images_info, save_path):
     """Save annotations in YOLO format (txt)"""
-    filename = images_info['filename']
-    txt_name = filename[:-3] + "txt"
-    with open(os.path.join(save_path, txt_name), "w") as f:
-        for obj in images_info['objects']:
-            line = xyxy2xywhn(obj, images_info['width'], images_info['height'])
-            f.write("{}\n".format(line))
-
-def load_coco(anno_file, txt_save_path):
+    path, content, _ = txt_file(save_path, images_info)
+    write_file(path, content)
+
+def load_coco(anno_file, txt_save_path, workers=1, backend='pycocotools', incremental=False, write_threads=4, write_queue=64,
+              shard_format=None, shard_size=None, shard_images=None, metrics=None):
     """Load COCO annotations and save them in YOLO format"""
-    global images_nums, category_nums, bbox_nums
-    
-    if os.path.exists(txt_save_path):
-        shutil.rmtree(txt_save_path)
-    os.makedirs(txt_save_path)
-
-    coco = COCO(anno_file)
-    classes = catid2name(coco)
-    imgIds = coco.getImgIds()
-    category_nums = len(classes)  # Number of categories
+    metrics = metrics if metrics is not None else Metrics()
+    # With incremental, images whose record and annotations are unchanged since the
+    # last run keep their existing .txt file
+    manifest = Manifest(txt_save_path, {'tool': 'coco2yolo'}) if incremental else None
+    if manifest is None or manifest.rebuild:
+        if os.path.exists(txt_save_path):
+            shutil.rmtree(txt_save_path)
+        os.makedirs(txt_save_path)
+    skipped = 0
+    shards = open_shards(txt_save_path, shard_format, shard_size, shard_images)
+    assert shards is None or manifest is None, "ERROR: --incremental does not work with --shards"
+
+    with metrics.stage('read'):
+        categories, image_count, images = load_coco_images(anno_file, backend)
+    metrics.add_read(coco_file_bytes(anno_file))
+    classes = catid2name(categories)
+    metrics.count('category_nums', len(classes))  # Number of categories
     
     # Write classes to a file
     with open(os.path.join(txt_save_path, "classes.txt"), 'w') as f:
         for id in classes:
             f.write("{}\n".format(classes[id]))
 
-    # Iterate over all images
-    for imgId in tqdm(imgIds, desc="Processing images", ncols=100):
-        info = {}
-        img = coco.loadImgs(imgId)[0]
-        filename = img['file_name']
-        width = img['width']
-        height = img['height']
-        info['filename'] = filename
-        info['width'] = width
-        info['height'] = height
-        
-        # Retrieve annotations for this image
-        annIds = coco.getAnnIds(imgIds=img['id'], iscrowd=None)
-        anns = coco.loadAnns(annIds)
-        objs = []
-        for ann in anns:
-            object_name = classes[ann['category_id']]
-            bbox = list(map(float, ann['bbox']))
-            xc = bbox[0] + bbox[2] / 2.
-            yc = bbox[1] + bbox[3] / 2.
-            w = bbox[2]
-            h = bbox[3]
-            obj = [ann['category_id'], xc, yc, w, h]
-            objs.append(obj)
-        
-        # Update statistics
-        bbox_nums += len(objs)
-        images_nums += 1
-        
-        # Save the annotations in YOLO format
-        info['objects'] = objs
-        save_anno_to_txt(info, txt_save_path)
-
-def parse(json_path, txt_save_path):
+    def iter_items():
+        nonlocal skipped
+        # Iterate over all images
+        for img, anns in metrics.timed('read', images):
+            info = {}
+            filename = img['file_name']
+            width = img['width']
+            height = img['height']
+            info['filename'] = filename
+            info['width'] = width
+            info['height'] = height
+
+            # Convert (x, y, w, h) boxes to normalized (xc, yc, w, h) for the whole image at once
+            boxes = boxops.normalize(boxops.xywh2cxcywh([ann['bbox'] for ann in anns]), width, height)
+            objs = [[ann['category_id']] + box for ann, box in zip(anns, boxes.tolist())]
+
+            # Update statistics
+            metrics.count('bbox_nums', len(objs))
+            metrics.count('image_nums')
+
+            info['objects'] = objs
+            if manifest is not None:
+                key = str(img['id'])
+                fingerprint = data_fingerprint(info)
+                if manifest.is_current(key, fingerprint):
+                    skipped += 1
+                    continue
+                manifest.record(key, fingerprint, [filename[:-3] + "txt"])
+            yield info
+
+    # Render the annotations in YOLO format; files are written on background threads
+    # and the progress bar counts completed writes
+    files = metrics.timed('transform', imap(partial(txt_file, txt_save_path), iter_items(), workers))
+    written = write_behind(metrics.track_written(files), write_threads, write_queue, shards)
+    for _ in tqdm(metrics.timed('write', written), total=image_count, desc="Processing images", ncols=100):
+        pass
+    if shards is not None:
+        shards.close()
+        print(f'shards: {len(shards.shards)}')
+
+    if manifest is not None:
+        removed = manifest.remove_stale()
+        manifest.save()
+        print(f'unchanged: {skipped}, removed: {removed}')
+
+def parse(json_path, txt_save_path, workers=1, backend='pycocotools', incremental=False, write_threads=4, write_queue=64,
+          shard_format=None, shard_size=None, shard_images=None, metrics=None):
     """Parse COCO annotations and convert them to YOLO format"""
+    metrics = metrics if metrics is not None else Metrics()
     assert os.path.exists(json_path), f"ERROR: {json_path} does not exist"
     
     if not os.path.exists(txt_save_path):
         os.makedirs(txt_save_path)
 
-    assert json_path.endswith('json'), f"ERROR: {json_path} is not a JSON file!"
+    assert json_path.endswith('json') or is_coco_index(json_path), f"ERROR: {json_path} is not a JSON file or COCO index!"
 
-    load_coco(json_path, txt_save_path)
+    load_coco(json_path, txt_save_path, workers, backend, incremental, write_threads, write_queue,
+              shard_format, shard_size, shard_images, metrics)
 
     # Print statistics at the end
-    print(f'class nums: {category_nums}')
-    print(f'image nums: {images_nums}')
-    print(f'bbox nums: {bbox_nums}')
+    print(f'class nums: {metrics.get("category_nums")}')
+    print(f'image nums: {metrics.get("image_nums")}')
+    print(f'bbox nums: {metrics.get("bbox_nums")}')
+    return metrics
 
-if __name__ == '__main__':
+def main(argv=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to COCO .json annotation file')
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to COCO .json annotation file, shard manifest or compiled .cocoindex')
     parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the generated YOLO .txt annotations folder(with classes.txt)')
-    opt = parser.parse_args()
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes for writing (0 uses all CPUs)')
+    parser.add_argument('-b', '--backend', type=str, default='pycocotools', choices=['pycocotools', 'stream', 'index'], help='COCO reader: full pycocotools index, bounded-memory streaming or a compiled binary index')
+    parser.add_argument('-i', '--incremental', action='store_true', help='Only rewrite files whose images or annotations changed since the last run')
+    parser.add_argument('-wt', '--write-threads', type=int, default=4, help='Number of threads writing output files (0 writes them inline)')
+    parser.add_argument('-wq', '--write-queue', type=int, default=64, help='Maximum number of output files waiting to be written')
+    parser.add_argument('-sh', '--shards', type=str, default=None, choices=SHARD_FORMATS, help='Pack the output files into tar or zip shards (indexed in shards.json) instead of writing one file each')
+    parser.add_argument('-ss', '--shard-size', type=float, default=1024, help='Maximum size of one shard in MiB')
+    parser.add_argument('-si', '--shard-images', type=str, default=None, help='Images folder; pack each image next to its label in the same shard (WebDataset layout)')
+    parser.add_argument('-m', '--metrics', type=str, default=None, help='Write stage times, counts, bytes read and written and peak memory to this .json file')
+    parser.add_argument('--trace', type=str, default=None, help='Write the stage calls to this .json file as a Chrome trace')
+    parser.add_argument('--trace-memory', action='store_true', help='Track the peak Python memory with tracemalloc (slows the run down)')
+    opt = parser.parse_args(argv)
 
     print(opt)
-    parse(opt.anno_path, opt.save_path)
\ No newline at end of file
+    metrics = Metrics(opt.trace_memory, opt.trace is not None)
+    parse(opt.anno_path, opt.save_path, opt.workers, opt.backend, opt.incremental, opt.write_threads, opt.write_queue,
+          opt.shards, opt.shard_size, opt.shard_images, metrics)
+    report(metrics, opt.metrics, opt.trace)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+import argparse
+import os
+from array import array
+
+import numpy as np
+
+from cocoreader import is_coco_manifest, iter_coco_sections, read_coco_manifest
+from packedarrays import MAGIC, read_packed, write_packed
+
+INDEX_EXT = '.cocoindex'
+INDEX_VERSION = 1
+CHUNK_IMAGES = 4096  # images whose annotation rows are converted to Python lists at a time
+
+
+def source_fingerprint(anno_file):
+    """[size, mtime_ns] of a COCO file; for a shard manifest, followed by those of every shard"""
+    st = os.stat(anno_file)
+    fingerprint = [st.st_size, st.st_mtime_ns]
+    if is_coco_manifest(anno_file):
+        for shard in read_coco_manifest(anno_file)['shards']:
+            st = os.stat(shard['path'])
+            fingerprint += [st.st_size, st.st_mtime_ns]
+    return fingerprint
+
+
+def default_index_path(anno_file):
+    return os.path.splitext(anno_file)[0] + INDEX_EXT
+
+
+def is_coco_index(path):
+    """True if path is a compiled COCO index rather than a JSON file"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def compile_coco_index(anno_file, index_path=None):
+    """Compile a COCO instances file into a memory-mappable binary index, returning its path.
+
+    Images keep their file order (the order pycocotools' getImgIds gives) and a
+    repeated image id replaces the earlier record in place, as in COCO.imgs.
+    Annotations are grouped by image, in file order within each image, and
+    image i owns rows ann_starts[i]:ann_starts[i + 1] of the annotation arrays;
+    annotations of unknown images are dropped. Only the fields the converters
+    and viscoco read are kept: image id, file name, width and height, and the
+    annotation id, category id, iscrowd and bbox. A shard manifest compiles
+    into one index over all of its shards.
+    """
+    index_path = index_path or default_index_path(anno_file)
+    fingerprint = source_fingerprint(anno_file)
+    image_rows = dict()
+    image_ids = []
+    file_names = []
+    widths = array('q')
+    heights = array('q')
+    categories = []
+    ann_image_ids = []
+    ann_ids = array('q')
+    ann_category_ids = array('q')
+    ann_iscrowd = array('b')
+    boxes = array('d')
+    for key, item in iter_coco_sections(anno_file):
+        if key == 'images':
+            row = image_rows.setdefault(item['id'], len(image_ids))
+            if row == len(image_ids):
+                image_ids.append(item['id'])
+                file_names.append(item['file_name'])
+                widths.append(item['width'])
+                heights.append(item['height'])
+            else:
+                file_names[row] = item['file_name']
+                widths[row] = item['width']
+                heights[row] = item['height']
+        elif key == 'annotations':
+            ann_image_ids.append(item['image_id'])
+            ann_ids.append(item.get('id', -1))
+            ann_category_ids.append(item['category_id'])
+            ann_iscrowd.append(item.get('iscrowd', 0))
+            boxes.extend(item['bbox'])
+        else:
+            categories.append({k: item[k] for k in ('id', 'name', 'supercategory') if k in item})
+
+    # Group the annotations by image row with a stable sort, so each image owns one range
+    ann_rows = np.array([image_rows.get(image_id, -1) for image_id in ann_image_ids], dtype=np.int64)
+    keep = np.flatnonzero(ann_rows >= 0)
+    order = keep[np.argsort(ann_rows[keep], kind='stable')]
+    ann_starts = np.zeros(len(image_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ann_rows[keep], minlength=len(image_ids)), out=ann_starts[1:])
+
+    names = [name.encode() for name in file_names]
+    name_starts = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in names], out=name_starts[1:])
+    int_ids = all(type(image_id) is int for image_id in image_ids)
+    write_packed(index_path, {
+        'image_ids': np.array(image_ids if int_ids else [], dtype=np.int64),
+        'widths': np.frombuffer(widths, dtype=np.int64),
+        'heights': np.frombuffer(heights, dtype=np.int64),
+        'name_starts': name_starts,
+        'names': np.frombuffer(b''.join(names), dtype=np.uint8),
+        'ann_starts': ann_starts,
+        'ann_ids': np.frombuffer(ann_ids, dtype=np.int64)[order],
+        'category_ids': np.frombuffer(ann_category_ids, dtype=np.int64)[order],
+        'iscrowd': np.frombuffer(ann_iscrowd, dtype=np.int8)[order],
+        'boxes': np.frombuffer(boxes, dtype=np.float64).reshape(-1, 4)[order],
+    }, {
+        'version': INDEX_VERSION,
+        'source': os.path.abspath(anno_file),
+        'source_fingerprint': fingerprint,
+        'categories': categories,
+        'image_ids': None if int_ids else image_ids,
+    })
+    return index_path
+
+
+class CocoIndex:
+    """Read-only view of a compiled COCO index.
+
+    All tables are memory-mapped arrays: image i has id image_ids[i], size
+    (widths[i], heights[i]) and the annotations in rows ann_starts[i]:ann_starts[i + 1]
+    of ann_ids, category_ids, iscrowd and boxes (float64 [N, 4] x, y, w, h).
+    """
+
+    def __init__(self, index_path):
+        meta, arrays = read_packed(index_path)
+        if meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"{index_path} is a COCO index of version {meta.get('version')}, expected {INDEX_VERSION}")
+        self.index_path = index_path
+        self.meta = meta
+        self.categories = meta['categories']
+        self.image_ids = meta['image_ids'] if meta['image_ids'] is not None else arrays['image_ids']
+        self.widths = arrays['widths']
+        self.heights = arrays['heights']
+        self.name_starts = arrays['name_starts']
+        self.names = arrays['names']
+        self.ann_starts = arrays['ann_starts']
+        self.ann_ids = arrays['ann_ids']
+        self.category_ids = arrays['category_ids']
+        self.iscrowd = arrays['iscrowd']
+        self.boxes = arrays['boxes']
+
+    @property
+    def image_nums(self):
+        return len(self.widths)
+
+    @property
+    def annotation_nums(self):
+        return len(self.ann_ids)
+
+    def __len__(self):
+        return self.image_nums
+
+    def is_current(self):
+        """True if the source JSON (and every shard of a manifest) still has the size and mtime it was compiled from"""
+        try:
+            return source_fingerprint(self.meta['source']) == self.meta['source_fingerprint']
+        except (OSError, ValueError):
+            return False
+
+    def file_names(self):
+        names = self.names.tobytes()
+        starts = self.name_starts.tolist()
+        return [names[a:b].decode() for a, b in zip(starts[:-1], starts[1:])]
+
+    def __iter__(self):
+        """Yield (image, annotations) like load_coco_images, with only the indexed fields.
+
+        The tables are converted to Python lists CHUNK_IMAGES images at a time:
+        each chunk owns one contiguous range of annotation rows, so only that
+        slice of the memory-mapped arrays becomes Python objects.
+        """
+        names = self.names
+        for first in range(0, self.image_nums, CHUNK_IMAGES):
+            last = min(first + CHUNK_IMAGES, self.image_nums)
+            image_ids = self.image_ids[first:last]
+            image_ids = image_ids if isinstance(image_ids, list) else image_ids.tolist()
+            widths = self.widths[first:last].tolist()
+            heights = self.heights[first:last].tolist()
+            name_starts = self.name_starts[first:last + 1].tolist()
+            starts = self.ann_starts[first:last + 1].tolist()
+            lo, hi = starts[0], starts[-1]
+            ann_ids = self.ann_ids[lo:hi].tolist()
+            category_ids = self.category_ids[lo:hi].tolist()
+            iscrowd = self.iscrowd[lo:hi].tolist()
+            boxes = self.boxes[lo:hi].tolist()
+            for i in range(last - first):
+                image_id = image_ids[i]
+                file_name = names[name_starts[i]:name_starts[i + 1]].tobytes().decode()
+                img = {'id': image_id, 'file_name': file_name, 'width': widths[i], 'height': heights[i]}
+                anns = [{'id': ann_ids[j], 'image_id': image_id, 'category_id': category_ids[j],
+                         'iscrowd': iscrowd[j], 'bbox': boxes[j]} for j in range(starts[i] - lo, starts[i + 1] - lo)]
+                yield img, anns
+
+
+def open_coco_index(path, compile_missing=True):
+    """CocoIndex for a compiled index, or for a JSON file through its sidecar index.
+
+    For a JSON file the index next to it is compiled first if it is missing or
+    older than the JSON (unless compile_missing is False, then it must exist).
+    """
+    if is_coco_index(path):
+        index = CocoIndex(path)
+        if not index.is_current():
+            print(f"WARNING: {path} was compiled from {index.meta['source']}, which is missing or changed since")
+        return index
+    index_path = default_index_path(path)
+    if os.path.exists(index_path) and is_coco_index(index_path):
+        index = CocoIndex(index_path)
+        if index.is_current():
+            return index
+    if not compile_missing:
+        raise FileNotFoundError(f"no current COCO index for {path}, compile it with cocoindex.py")
+    return CocoIndex(compile_coco_index(path, index_path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to COCO .json annotation file')
+    parser.add_argument('-xp', '--index-path', type=str, default=None, help='Where to write the index (default: the .json path with a .cocoindex extension)')
+    opt = parser.parse_args()
+
+    print(opt)
+    index = CocoIndex(compile_coco_index(opt.anno_path, opt.index_path))
+    print(f"class nums: {len(index.categories)}")
+    print(f"image nums: {index.image_nums}")
+    print(f"bbox nums: {index.annotation_nums}")
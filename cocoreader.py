@@ -0,0 +1,296 @@
+import json
+import os
+import shutil
+import tempfile
+import zlib
+
+CHUNK_SIZE = 1 << 20
+BUCKET_BYTES = 64 << 20  # input bytes per spill bucket when grouping by image
+WHITESPACE = ' \t\n\r'
+SHARD_MANIFEST_KEY = 'coco_shards'  # first key of a sharded COCO manifest, holding its version
+SHARD_MANIFEST_VERSION = 1
+
+
+class JsonStream:
+    """Minimal pull parser over a JSON file that never holds more than one value.
+
+    The file is read in chunks; values are decoded one at a time with
+    json.JSONDecoder.raw_decode, so memory is bounded by the chunk size plus the
+    largest single array element.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("unexpected end of JSON input")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("expected {!r} at offset {}, got {!r}".format(char, self.pos, self.buf[self.pos]))
+        self.pos += 1
+
+    def value(self):
+        """Decode and return the next complete value"""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number or literal ending exactly at the buffer edge may be cut short
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def items(self):
+        """Iterate over the elements of the array at the current position"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError("expected ',' or ']' in array, got {!r}".format(char))
+
+    def skip(self):
+        """Skip the value at the current position, element by element for arrays"""
+        if self.peek() == '[':
+            for _ in self.items():
+                pass
+        else:
+            self.value()
+
+
+def iter_sections(anno_file, keys=('images', 'annotations', 'categories')):
+    """Yield (key, item) for every element of the given top-level arrays, in file order.
+
+    The whole file is walked once; arrays not listed in keys are skipped without
+    being materialised.
+    """
+    keys = set(keys)
+    with open(anno_file, 'r') as f:
+        stream = JsonStream(f)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if key in keys and stream.peek() == '[':
+                for item in stream.items():
+                    yield key, item
+            else:
+                stream.skip()
+            char = stream.peek()
+            stream.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError("expected ',' or '}}' in object, got {!r}".format(char))
+
+
+def is_coco_manifest(path):
+    """True if path is the manifest of a sharded COCO output rather than a COCO file"""
+    with open(path, 'rb') as f:
+        head = f.read(64).lstrip()
+    return head.startswith(b'{"' + SHARD_MANIFEST_KEY.encode() + b'"')
+
+
+def read_coco_manifest(manifest_file):
+    """The manifest of a sharded COCO output, with each shard's 'path' resolved next to it"""
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get(SHARD_MANIFEST_KEY) != SHARD_MANIFEST_VERSION:
+        raise ValueError("{} is a COCO shard manifest of version {}, expected {}".format(
+            manifest_file, manifest.get(SHARD_MANIFEST_KEY), SHARD_MANIFEST_VERSION))
+    for shard in manifest['shards']:
+        shard['path'] = os.path.join(os.path.dirname(manifest_file), shard['file'])
+    return manifest
+
+
+def coco_file_bytes(anno_file):
+    """Size of a COCO file, or of a shard manifest and all of its shards"""
+    size = os.path.getsize(anno_file)
+    if is_coco_manifest(anno_file):
+        size += sum(os.path.getsize(shard['path']) for shard in read_coco_manifest(anno_file)['shards'])
+    return size
+
+
+def iter_coco_sections(anno_file, keys=('images', 'annotations', 'categories')):
+    """iter_sections for a COCO file or a shard manifest.
+
+    For a manifest the shards are walked one after the other and the shared
+    categories are taken once, from the manifest.
+    """
+    if not is_coco_manifest(anno_file):
+        yield from iter_sections(anno_file, keys)
+        return
+    manifest = read_coco_manifest(anno_file)
+    if 'categories' in keys:
+        for item in manifest['categories']:
+            yield 'categories', item
+    for shard in manifest['shards']:
+        yield from iter_sections(shard['path'], tuple(key for key in keys if key != 'categories'))
+
+
+def iter_array(anno_file, key):
+    """Yield the elements of one top-level array"""
+    for _, item in iter_sections(anno_file, (key,)):
+        yield item
+
+
+class CocoStreamReader:
+    """Group a COCO file's annotations by image without building a full index.
+
+    One streaming pass spills images and annotations into bucket files keyed by
+    image id (so annotations need not be grouped or sorted in the input), then
+    iteration loads one bucket at a time and yields (image, annotations) pairs.
+    Peak memory is roughly one bucket, i.e. the input size / num_buckets.
+    Polygon segmentations are dropped unless keep_segmentation is set.
+    """
+
+    def __init__(self, anno_file, num_buckets=None, keep_segmentation=False, tmp_dir=None):
+        if num_buckets is None:
+            num_buckets = max(1, os.path.getsize(anno_file) // BUCKET_BYTES + 1)
+        self.anno_file = anno_file
+        self.num_buckets = num_buckets
+        self.categories = []
+        self.image_nums = 0
+        self.annotation_nums = 0
+        self._tmp_dir = tempfile.mkdtemp(prefix='cocostream-', dir=tmp_dir)
+        self._spill(keep_segmentation)
+
+    def _bucket(self, image_id):
+        if isinstance(image_id, int):
+            return image_id % self.num_buckets
+        # hash() of a str is salted per process, crc32 keeps the order stable between runs
+        return zlib.crc32(str(image_id).encode()) % self.num_buckets
+
+    def _bucket_path(self, kind, index):
+        return os.path.join(self._tmp_dir, '{}-{}.jsonl'.format(kind, index))
+
+    def _spill(self, keep_segmentation):
+        images = [open(self._bucket_path('images', i), 'w') for i in range(self.num_buckets)]
+        annotations = [open(self._bucket_path('annotations', i), 'w') for i in range(self.num_buckets)]
+        try:
+            for key, item in iter_sections(self.anno_file):
+                if key == 'categories':
+                    self.categories.append(item)
+                elif key == 'images':
+                    images[self._bucket(item['id'])].write(json.dumps(item) + '\n')
+                    self.image_nums += 1
+                else:
+                    if not keep_segmentation:
+                        item.pop('segmentation', None)
+                    annotations[self._bucket(item['image_id'])].write(json.dumps(item) + '\n')
+                    self.annotation_nums += 1
+        finally:
+            for f in images + annotations:
+                f.close()
+
+    def __len__(self):
+        return self.image_nums
+
+    def __iter__(self):
+        for i in range(self.num_buckets):
+            anns = dict()
+            with open(self._bucket_path('annotations', i)) as f:
+                for line in f:
+                    ann = json.loads(line)
+                    anns.setdefault(ann['image_id'], []).append(ann)
+            with open(self._bucket_path('images', i)) as f:
+                for line in f:
+                    img = json.loads(line)
+                    yield img, anns.get(img['id'], [])
+
+    def close(self):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def catid2name(categories):
+    """Map category ids to names"""
+    return {cat['id']: cat['name'] for cat in categories}
+
+
+def load_coco_images(anno_file, backend='pycocotools'):
+    """Return (categories, image_nums, iterator of (image, annotations)) for a COCO file.
+
+    backend 'pycocotools' builds the usual COCO index; 'stream' uses
+    CocoStreamReader and keeps memory bounded on very large files; 'index' reads
+    the compiled binary index next to the file (see cocoindex.py), compiling it
+    first if needed. A compiled index given as anno_file is used whatever the backend.
+
+    A shard manifest (see cocowriter.ShardedCocoWriter) is read lazily: each
+    shard is loaded with the backend only when iteration reaches it, so at most
+    one shard is held in memory.
+    """
+    if is_coco_manifest(anno_file):
+        manifest = read_coco_manifest(anno_file)
+
+        def images():
+            for shard in manifest['shards']:
+                yield from load_coco_images(shard['path'], backend)[2]
+        return manifest['categories'], manifest['images'], images()
+
+    from cocoindex import is_coco_index, open_coco_index
+    if backend == 'index' or is_coco_index(anno_file):
+        index = open_coco_index(anno_file)
+        return index.categories, len(index), iter(index)
+
+    if backend == 'stream':
+        reader = CocoStreamReader(anno_file)
+
+        def images():
+            with reader:
+                yield from reader
+        return reader.categories, len(reader), images()
+
+    if backend != 'pycocotools':
+        raise ValueError("unknown COCO backend: {}".format(backend))
+    from pycocotools.coco import COCO
+    coco = COCO(anno_file)
+    imgIds = coco.getImgIds()
+
+    def images():
+        for imgId in imgIds:
+            img = coco.loadImgs(imgId)[0]
+            annIds = coco.getAnnIds(imgIds=img['id'], iscrowd=None)
+            yield img, coco.loadAnns(annIds)
+    return coco.dataset['categories'], len(imgIds), images()
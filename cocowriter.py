@@ -0,0 +1,209 @@
+import json
+import os
+import tempfile
+
+from cocoreader import SHARD_MANIFEST_KEY, SHARD_MANIFEST_VERSION
+
+
+class CocoWriter:
+    """Write a COCO instances file incrementally instead of json.dump-ing one big dict.
+
+    Images go straight to the output file as they are added. Annotations are
+    spooled to a temporary file next to the output (one JSON object per line) and
+    copied in after the images on close(), followed by the categories, so memory
+    stays flat however many annotations are written. The result has the same key
+    order and separators as json.dump(coco) of the old in-memory dict.
+
+    With spool_path the annotations are spooled to that named file instead, so
+    suspend() can close both files of an unfinished writer and close() reopens
+    them to finish it.
+    """
+
+    def __init__(self, save_path, spool_path=None):
+        self.save_path = save_path
+        self.spool_path = spool_path
+        self.image_nums = 0
+        self.annotation_nums = 0
+        self.category_nums = 0
+        self._file = open(save_path, 'w')
+        if spool_path is None:
+            self._spool = tempfile.TemporaryFile('w+', dir=os.path.dirname(os.path.abspath(save_path)), suffix='.annotations')
+        else:
+            self._spool = open(spool_path, 'w+')
+        self._file.write('{"images": [')
+
+    def add_image(self, image_item):
+        if self.image_nums:
+            self._file.write(', ')
+        self._file.write(json.dumps(image_item))
+        self.image_nums += 1
+
+    def add_annotation(self, annotation_item):
+        self._spool.write(json.dumps(annotation_item))
+        self._spool.write('\n')
+        self.annotation_nums += 1
+
+    def suspend(self):
+        """Close the files of a writer with a named spool until close() finishes it"""
+        assert self.spool_path is not None, "only a writer with a spool_path can be suspended"
+        self._file.close()
+        self._spool.close()
+
+    def close(self, categories, category_map=None):
+        """Finish the file with the given category items.
+
+        If category_map is given, each spooled annotation's category_id is looked
+        up in it, which lets callers write annotations before ids are assigned.
+        """
+        if self._file.closed:
+            self._file = open(self.save_path, 'a')
+            self._spool = open(self.spool_path, 'r')
+        self._file.write('], "type": "instances", "annotations": [')
+        self._spool.seek(0)
+        for i, line in enumerate(self._spool):
+            if i:
+                self._file.write(', ')
+            if category_map is None:
+                self._file.write(line[:-1])
+            else:
+                annotation_item = json.loads(line)
+                annotation_item['category_id'] = category_map[annotation_item['category_id']]
+                self._file.write(json.dumps(annotation_item))
+        self._spool.close()
+        if self.spool_path is not None:
+            os.remove(self.spool_path)
+        self._file.write('], "categories": ')
+        self._file.write(json.dumps(list(categories)))
+        self._file.write('}')
+        self._file.close()
+        self.category_nums = len(categories)
+
+    def abort(self):
+        """Close and remove a partially written file"""
+        self._spool.close()
+        self._file.close()
+        os.remove(self.save_path)
+        if self.spool_path is not None and os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not self._file.closed:
+            self.abort()
+        return False
+
+
+class ShardedCocoWriter:
+    """CocoWriter split into COCO files of at most images_per_shard images each, plus a manifest.
+
+    Shards are written next to save_path as <stem>-000000.json, <stem>-000001.json,
+    ... and save_path itself becomes the manifest listing them (see
+    cocoreader.read_coco_manifest). Every shard is a complete COCO file with the
+    same category table; ids are whatever the caller assigns, so they stay unique
+    across shards. Annotations go to the shard of the last image added, so they
+    must be added right after their image, as the converters do.
+
+    Each shard is finished as soon as it is full, so only the last one holds
+    open files. Without categories up front, a full shard is suspended
+    instead: its images are in place and its annotations wait, with the
+    caller's provisional category ids, in a spool file next to it
+    (<shard>.annotations). close() then finishes those shards one at a time,
+    streaming each spool through category_map as CocoWriter does.
+    """
+
+    def __init__(self, save_path, images_per_shard, categories=None):
+        assert images_per_shard > 0, "images_per_shard must be positive"
+        self.save_path = save_path
+        self.images_per_shard = images_per_shard
+        self.categories = categories
+        self.image_nums = 0
+        self.annotation_nums = 0
+        self.category_nums = 0
+        self.shards = []  # {'file', 'images', 'annotations'} of every shard
+        self._writers = []  # shards not finished yet
+        self._pending = []  # suspended shard writers waiting for their categories
+        self._closed = False
+        self._stem = os.path.splitext(save_path)[0]
+
+    def _open_shard(self):
+        shard_file = '{}-{:06d}.json'.format(self._stem, len(self.shards))
+        spool_path = shard_file + '.annotations' if self.categories is None else None
+        self._writers.append(CocoWriter(shard_file, spool_path))
+        self.shards.append({'file': os.path.basename(shard_file), 'images': 0, 'annotations': 0})
+
+    def _finish(self, writer, categories, category_map=None):
+        writer.close(categories, category_map)
+        self._writers.remove(writer)
+
+    def _finish_full(self, writer):
+        """Finish a full shard, or suspend it if the categories are not known yet"""
+        if self.categories is not None:
+            self._finish(writer, self.categories)
+        else:
+            writer.suspend()
+            self._writers.remove(writer)
+            self._pending.append(writer)
+
+    def add_image(self, image_item):
+        if not self.shards or self.shards[-1]['images'] >= self.images_per_shard:
+            if self._writers:
+                self._finish_full(self._writers[-1])
+            self._open_shard()
+        self._writers[-1].add_image(image_item)
+        self.shards[-1]['images'] += 1
+        self.image_nums += 1
+
+    def add_annotation(self, annotation_item):
+        if not self._writers:
+            raise ValueError("annotation added before any image")
+        self._writers[-1].add_annotation(annotation_item)
+        self.shards[-1]['annotations'] += 1
+        self.annotation_nums += 1
+
+    def close(self, categories, category_map=None):
+        """Finish the open shards with the given category items and write the manifest"""
+        if not self.shards:
+            self._open_shard()
+        categories = list(categories)
+        for writer in self._pending:
+            writer.close(categories, category_map)
+        self._pending = []
+        for writer in list(self._writers):
+            self._finish(writer, categories, category_map)
+        manifest = {SHARD_MANIFEST_KEY: SHARD_MANIFEST_VERSION, 'type': 'instances',
+                    'images': self.image_nums, 'annotations': self.annotation_nums,
+                    'categories': categories, 'shards': self.shards}
+        tmp_path = self.save_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.save_path)
+        self.category_nums = len(categories)
+        self._closed = True
+
+    def abort(self):
+        """Close and remove every shard written so far"""
+        for writer in self._pending + self._writers:
+            writer.abort()
+        self._pending = []
+        self._writers = []
+        for shard in self.shards:
+            shard_file = os.path.join(os.path.dirname(self.save_path), shard['file'])
+            if os.path.exists(shard_file):
+                os.remove(shard_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not self._closed:
+            self.abort()
+        return False
+
+
+def open_coco_writer(save_path, images_per_shard=None, categories=None):
+    """CocoWriter for one file, or a ShardedCocoWriter when images_per_shard is set"""
+    if images_per_shard is None:
+        return CocoWriter(save_path)
+    return ShardedCocoWriter(save_path, images_per_shard, categories)
@@ -0,0 +1,95 @@
+"""One command line for every converter, statistics and visualisation tool.
+
+    python detectionhelper.py convert voc coco -ap Annotations -sp instances.json
+    python detectionhelper.py stat yolo -ap labels -w 0
+    python detectionhelper.py vis coco -ip images -ap instances.json -sp vis -p
+
+Each (command, format) pair is a plugin module with a main(argv) function; the
+options after the formats are passed to it unchanged, so `... convert voc coco -h`
+lists the converter's own options. A convert pair without its own plugin (e.g.
+`convert coco coco` to merge shards) goes through the reader and writer
+registry of annostore instead. Plugins are imported only once they are
+chosen, so cv2, matplotlib, pycocotools and lxml are loaded only by the tools
+that use them and this module itself starts with nothing but argparse.
+"""
+import argparse
+import importlib
+import sys
+
+FORMATS = ('coco', 'voc', 'yolo')
+
+# command -> key -> module; convert is keyed by (input format, output format)
+PLUGINS = {
+    'convert': {
+        ('coco', 'voc'): 'coco2voc',
+        ('coco', 'yolo'): 'coco2yolo',
+        ('voc', 'coco'): 'voc2coco',
+        ('voc', 'yolo'): 'voc2yolo',
+        ('yolo', 'coco'): 'yolo2coco',
+        ('yolo', 'voc'): 'yolo2voc',
+    },
+    'stat': {
+        'coco': 'statcoco',
+        'voc': 'statvoc',
+        'yolo': 'statyolo',
+    },
+    'vis': {
+        'coco': 'viscoco',
+        'voc': 'visvoc',
+        'yolo': 'visyolo',
+    },
+}
+# Number of format arguments each command takes before the plugin's own options
+FORMAT_ARGS = {'convert': 2, 'stat': 1, 'vis': 1}
+# Converts any pair of formats through annostore.LOADERS and annostore.WRITERS
+CONVERT_FALLBACK = 'annostore'
+
+
+def register_plugin(command, key, module):
+    """Add or replace the module run for a command and format (or (input, output) formats for convert)"""
+    PLUGINS[command][key] = module
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='detectionhelper', description='Convert, count and draw COCO, VOC and YOLO annotations')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help='Convert annotations from one format to another')
+    convert.add_argument('input_format', choices=FORMATS, help='Format of the input annotations')
+    convert.add_argument('output_format', choices=FORMATS, help='Format to write')
+    stat = commands.add_parser('stat', help='Count images, boxes and classes')
+    stat.add_argument('format', choices=FORMATS, help='Format of the annotations')
+    vis = commands.add_parser('vis', help='Draw the boxes onto the images')
+    vis.add_argument('format', choices=FORMATS, help='Format of the annotations')
+    for command in (convert, stat, vis):
+        command.epilog = 'Options after the formats go to the chosen tool; add -h after them to list its options.'
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = build_parser()
+    split = 1 + FORMAT_ARGS.get(argv[0], 0) if argv else 1
+    opt = parser.parse_args(argv[:split])
+
+    if opt.command == 'convert':
+        key = (opt.input_format, opt.output_format)
+        name = '{} {}'.format(*key)
+    else:
+        key = opt.format
+        name = key
+    module = PLUGINS[opt.command].get(key)
+    plugin_argv = argv[split:]
+    if module is None and opt.command == 'convert':
+        module = CONVERT_FALLBACK
+        plugin_argv = ['-if', opt.input_format, '-of', opt.output_format] + plugin_argv
+    if module is None:
+        available = ', '.join(' '.join(k) if isinstance(k, tuple) else k for k in PLUGINS[opt.command])
+        parser.error(f"no {opt.command} plugin for {name} (available: {available})")
+
+    # The plugin parses its own options; its usage line shows the full command
+    sys.argv[0] = f"{parser.prog} {opt.command} {name}"
+    importlib.import_module(module).main(plugin_argv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from imagesize import get_image_shape, probe_image
+
+INDEX_NAME = '.imageindex.json'
+INDEX_VERSION = 1
+
+
+def probe_entry(file_path):
+    """Return (width, height, channels) for one image, or (None, None, None) if unreadable"""
+    size = probe_image(file_path)
+    if size is not None:
+        return size
+    shape = get_image_shape(file_path)
+    if shape is None:
+        return None, None, None
+    return shape[1], shape[0], shape[2]
+
+
+class ImageIndex:
+    """Sidecar index of an image folder: stem -> file name, extension, width, height, channels.
+
+    Entries are keyed by file name and validated against the file's size and
+    mtime, so refresh() only opens images that are new or changed since the
+    index was written. The index lives in image_path/.imageindex.json unless
+    index_path is given (e.g. for read-only image folders).
+    """
+
+    def __init__(self, image_path, index_path=None, workers=8):
+        self.image_path = image_path
+        self.index_path = index_path or os.path.join(image_path, INDEX_NAME)
+        self.workers = workers
+        self.entries = dict()  # file name -> [size, mtime_ns, width, height, channels]
+        self.stems = dict()  # stem -> file name
+        self.probed = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                self.entries = data['entries']
+
+    def refresh(self):
+        """Bring the index in line with the folder, probing new or changed files in parallel"""
+        current = dict()
+        stale = []
+        with os.scandir(self.image_path) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name == os.path.basename(self.index_path):
+                    continue
+                st = entry.stat()
+                cached = self.entries.get(entry.name)
+                if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+                    current[entry.name] = cached
+                else:
+                    current[entry.name] = [st.st_size, st.st_mtime_ns, None, None, None]
+                    stale.append(entry.name)
+
+        if stale:
+            paths = [os.path.join(self.image_path, name) for name in stale]
+            with ThreadPoolExecutor(max(1, self.workers)) as pool:
+                for name, size in zip(stale, pool.map(probe_entry, paths)):
+                    current[name][2:] = list(size)
+        changed = bool(stale) or len(current) != len(self.entries)
+        self.probed = len(stale)
+        self.entries = current
+        self.stems = {os.path.splitext(name)[0]: name for name in sorted(current)}
+        if changed:
+            self.save()
+        return self
+
+    def save(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def __contains__(self, stem):
+        return stem in self.stems
+
+    def __len__(self):
+        return len(self.stems)
+
+    def name(self, stem):
+        """File name (with extension) of the image for stem"""
+        return self.stems[stem]
+
+    def path(self, stem):
+        return os.path.join(self.image_path, self.stems[stem])
+
+    def shape(self, stem):
+        """(height, width, 3) like cv2.imread(...).shape, or None if the image is unreadable"""
+        entry = self.entries[self.stems[stem]]
+        if entry[2] is None:
+            return None
+        return entry[3], entry[2], 3
+
+    def info(self, stem):
+        """dict with path, extension, width, height and channels of the image for stem"""
+        name = self.stems[stem]
+        size, mtime_ns, width, height, channels = self.entries[name]
+        return {'path': os.path.join(self.image_path, name), 'ext': os.path.splitext(name)[1],
+                'width': width, 'height': height, 'channels': channels}
+
+
+def load_image_index(image_path, index_path=None, workers=8):
+    """Open (building or refreshing as needed) the index for image_path"""
+    return ImageIndex(image_path, index_path, workers).refresh()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-ip', '--image-path', type=str, required=True, help='Path to the directory containing images')
+    parser.add_argument('-xp', '--index-path', type=str, default=None, help='Where to keep the index (default: .imageindex.json in the image folder)')
+    parser.add_argument('-w', '--workers', type=int, default=8, help='Number of threads probing image headers')
+    opt = parser.parse_args()
+
+    print(opt)
+    index = load_image_index(opt.image_path, opt.index_path, opt.workers)
+    print(f"image nums: {len(index)}")
+    print(f"probed: {index.probed}")
@@ -0,0 +1,143 @@
+import os
+import struct
+
+# JPEG start-of-frame markers carrying the frame size (DHT/JPG/DAC share the range)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# PNG colour type -> number of channels
+PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+
+HEADER_BYTES = 64
+
+
+def _jpeg_orientation(exif):
+    """Read the orientation tag from an APP1 Exif payload, return 1 if absent"""
+    if exif[:6] != b'Exif\x00\x00':
+        return 1
+    tiff = exif[6:]
+    if tiff[:2] == b'II':
+        endian = '<'
+    elif tiff[:2] == b'MM':
+        endian = '>'
+    else:
+        return 1
+    try:
+        ifd_offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+        entries = struct.unpack(endian + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+        for i in range(entries):
+            entry = ifd_offset + 2 + i * 12
+            tag, = struct.unpack(endian + 'H', tiff[entry:entry + 2])
+            if tag == 0x0112:
+                return struct.unpack(endian + 'H', tiff[entry + 8:entry + 10])[0]
+    except struct.error:
+        pass
+    return 1
+
+
+def _jpeg_size(f):
+    """Walk JPEG markers up to the first SOF segment"""
+    f.seek(2)
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue  # standalone markers have no length
+        if marker in (0xD9, 0xDA):
+            return None  # reached image data without a frame header
+        length_bytes = f.read(2)
+        if len(length_bytes) != 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0] - 2
+        if marker == 0xE1 and orientation == 1:
+            orientation = _jpeg_orientation(f.read(length))
+        elif marker in JPEG_SOF_MARKERS:
+            data = f.read(6)
+            if len(data) != 6:
+                return None
+            height, width, channels = struct.unpack('>HHB', data[1:6])
+            if orientation in (5, 6, 7, 8):
+                # cv2.imread applies the Exif rotation, so report the rotated size
+                width, height = height, width
+            return width, height, channels
+        else:
+            f.seek(length, os.SEEK_CUR)
+
+
+def _png_size(head):
+    if len(head) < 26 or head[12:16] != b'IHDR':
+        return None
+    width, height = struct.unpack('>II', head[16:24])
+    return width, height, PNG_CHANNELS.get(head[25], 3)
+
+
+def _bmp_size(head):
+    header_size = struct.unpack('<I', head[14:18])[0]
+    if header_size == 12:
+        width, height, _, bits = struct.unpack('<HHHH', head[18:26])
+    elif header_size >= 40:
+        width, height, _, bits = struct.unpack('<iiHH', head[18:30])
+    else:
+        return None
+    channels = 4 if bits == 32 else (1 if bits <= 8 else 3)
+    return abs(width), abs(height), channels
+
+
+def _webp_size(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and head[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF, 3
+    if chunk == b'VP8L' and head[20:21] == b'\x2f':
+        bits = struct.unpack('<I', head[21:25])[0]
+        alpha = (bits >> 28) & 1
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, 4 if alpha else 3
+    if chunk == b'VP8X':
+        alpha = head[20] & 0x10
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return width, height, 4 if alpha else 3
+    return None
+
+
+def probe_image(file_path):
+    """Read (width, height, channels) from the image header without decoding pixels.
+
+    Returns None if the format is not recognised or the header is truncated.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(HEADER_BYTES)
+        try:
+            if head[:3] == b'\xff\xd8\xff':
+                return _jpeg_size(f)
+            if head[:8] == b'\x89PNG\r\n\x1a\n':
+                return _png_size(head)
+            if head[:2] == b'BM' and len(head) >= 30:
+                return _bmp_size(head)
+            if head[:4] == b'RIFF' and head[8:12] == b'WEBP' and len(head) >= 30:
+                return _webp_size(head)
+        except struct.error:
+            return None
+    return None
+
+
+def get_image_shape(file_path):
+    """Return the shape cv2.imread(file_path) would produce: (height, width, 3).
+
+    Only the header bytes are read for JPEG/PNG/BMP/WebP, other formats fall back
+    to a full decode. Returns None if the image cannot be read.
+    """
+    size = probe_image(file_path)
+    if size is not None:
+        return size[1], size[0], 3
+
+    import cv2
+    img = cv2.imread(file_path)
+    if img is None:
+        return None
+    return img.shape
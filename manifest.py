@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = '.manifest.json'
+MANIFEST_VERSION = 1
+
+
+def file_fingerprint(path, content_hash=False):
+    """Fingerprint an input file by (size, mtime) or, with content_hash, by its sha1"""
+    if content_hash:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def data_fingerprint(obj):
+    """Fingerprint JSON-serialisable input data, e.g. one image record and its annotations"""
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+
+class Manifest:
+    """Record of which input produced which output files in a converter's output folder.
+
+    Each entry maps an input key (a file path or image id) to the fingerprint of
+    that input and the output files written from it. A re-run with the same
+    options only rewrites outputs whose input fingerprint changed, and
+    remove_stale() deletes outputs whose inputs are gone. If the options differ
+    from the recorded ones, every entry is considered out of date.
+    """
+
+    def __init__(self, save_path, options):
+        self.save_path = save_path
+        os.makedirs(save_path, exist_ok=True)
+        self.path = os.path.join(save_path, MANIFEST_NAME)
+        self.options = json.loads(json.dumps(options))
+        self.entries = dict()
+        self.previous = dict()
+        self.meta = dict()  # free-form run state the converter wants back next time
+        self.previous_meta = dict()
+        self.rebuild = True
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION and data.get('options') == self.options:
+                self.previous = data['entries']
+                self.previous_meta = data.get('meta', {})
+                self.rebuild = False
+
+    def lookup(self, key, fingerprint):
+        """Return the previous entry for key if its fingerprint still matches, else None"""
+        entry = self.previous.get(key)
+        if entry is not None and entry['fingerprint'] == fingerprint:
+            self.entries[key] = entry
+            return entry
+        return None
+
+    def is_current(self, key, fingerprint):
+        """True if key was converted from an input with this fingerprint and its outputs exist"""
+        entry = self.lookup(key, fingerprint)
+        return entry is not None and all(
+            os.path.exists(os.path.join(self.save_path, name)) for name in entry['outputs'])
+
+    def record(self, key, fingerprint, outputs, **extra):
+        entry = {'fingerprint': fingerprint, 'outputs': list(outputs)}
+        entry.update(extra)
+        self.entries[key] = entry
+
+    def remove_stale(self):
+        """Delete previous outputs no input produced in this run, return how many"""
+        keep = set()
+        for entry in self.entries.values():
+            keep.update(entry['outputs'])
+        removed = 0
+        for entry in self.previous.values():
+            for name in entry['outputs']:
+                path = os.path.join(self.save_path, name)
+                if name not in keep and os.path.exists(path):
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'options': self.options, 'meta': self.meta, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,166 @@
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+MAX_TRACE_EVENTS = 200000  # stage calls kept for the Chrome trace; later ones are only counted
+
+
+class Metrics:
+    """Counters, stage timings, byte counts and peak memory of one converter run.
+
+    Converters count with count() (image_nums, bbox_nums, ...) instead of module
+    globals, and wrap their work in stages: stage(name) times a block and
+    timed(name, items) times how long each item of a lazy iterator takes to
+    produce. Stage time is exclusive, so a parse stage pulled lazily by the
+    write loop is charged to parse, not write, and the stages add up to at
+    most the wall time. Stages are timed on the calling thread only; work on
+    process pools and writer threads shows up as the time spent waiting for it.
+
+    With trace_memory, tracemalloc follows Python allocations of this process
+    (slowing them down) for the peak traced memory; with trace_events every
+    stage call is kept for save_trace(), up to MAX_TRACE_EVENTS.
+    """
+
+    def __init__(self, trace_memory=False, trace_events=False):
+        self.counters = dict()
+        self.stages = dict()  # name -> [seconds, calls]
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.trace_events = trace_events
+        self.events = []  # (name, start, seconds) of each stage call, for the Chrome trace
+        self.dropped_events = 0
+        self.wall_seconds = None
+        self.peak_traced_memory = None
+        self._stack = []  # [name, seconds spent in nested stages] of the open stages
+        self._trace_memory = trace_memory and not tracemalloc.is_tracing()
+        if self._trace_memory:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def get(self, name):
+        return self.counters.get(name, 0)
+
+    def add_read(self, n):
+        self.bytes_read += n
+
+    def add_written(self, n):
+        self.bytes_written += n
+
+    def _enter(self, name):
+        self._stack.append([name, 0.0])
+        return time.perf_counter()
+
+    def _exit(self, start):
+        name, nested = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += elapsed - nested
+        stage[1] += 1
+        if self._stack:
+            self._stack[-1][1] += elapsed
+        if self.trace_events:
+            if len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append((name, start, elapsed))
+            else:
+                self.dropped_events += 1
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as one call of stage name"""
+        start = self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit(start)
+
+    def timed(self, name, items):
+        """Iterate over items, charging the time taken to produce each one to stage name"""
+        items = iter(items)
+        while True:
+            start = self._enter(name)
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            finally:
+                self._exit(start)
+            yield item
+
+    def track_read(self, members):
+        """Pass (name, bytes) archive members through, counting their bytes as read"""
+        for member in members:
+            self.bytes_read += len(member[1])
+            yield member
+
+    def track_written(self, files):
+        """Pass write_behind's (path, data, tag) items through, counting the data as written"""
+        for path, data, tag in files:
+            if path is not None:
+                self.bytes_written += len(data)
+            yield path, data, tag
+
+    def finish(self):
+        """Stop the clock (and tracemalloc); later calls keep the first result"""
+        if self.wall_seconds is None:
+            self.wall_seconds = time.perf_counter() - self._start
+            if self._trace_memory:
+                self.peak_traced_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        return self
+
+    def to_dict(self):
+        self.finish()
+        result = {
+            'wall_seconds': self.wall_seconds,
+            'stages': {name: {'seconds': seconds, 'calls': calls} for name, (seconds, calls) in self.stages.items()},
+            'counters': self.counters,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'peak_traced_memory': self.peak_traced_memory,
+        }
+        try:
+            import resource
+            # ru_maxrss is in KiB on Linux
+            result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        except ImportError:
+            pass
+        if self.dropped_events:
+            result['dropped_trace_events'] = self.dropped_events
+        return result
+
+    def print_stages(self):
+        self.finish()
+        for name, (seconds, calls) in sorted(self.stages.items(), key=lambda stage: -stage[1][0]):
+            print(f"{name}: {seconds:.3f} s in {calls} calls ({seconds / self.wall_seconds:.0%})")
+        print(f"total: {self.wall_seconds:.3f} s, read {self.bytes_read / (1 << 20):.1f} MiB, written {self.bytes_written / (1 << 20):.1f} MiB")
+
+    def save(self, json_path):
+        with open(json_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def save_trace(self, trace_path):
+        """Write the stage calls in Chrome trace format (chrome://tracing, Perfetto)"""
+        self.finish()
+        pid = os.getpid()
+        events = [{'name': name, 'ph': 'X', 'ts': (start - self._start) * 1e6, 'dur': elapsed * 1e6, 'pid': pid, 'tid': 0}
+                  for name, start, elapsed in self.events]
+        with open(trace_path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def report(metrics, json_path=None, trace_path=None):
+    """Print the stage times and write the metrics and trace files the converters' options ask for"""
+    if json_path is None and trace_path is None:
+        return
+    metrics.print_stages()
+    if json_path is not None:
+        metrics.save(json_path)
+        print(f"metrics: {json_path}")
+    if trace_path is not None:
+        metrics.save_trace(trace_path)
+        print(f"trace: {trace_path}")
@@ -0,0 +1,84 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'DHPACK1\n'
+ALIGN = 64  # every array starts on a 64-byte boundary
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_packed(path, arrays, meta=None):
+    """Write named NumPy arrays and a JSON-serialisable meta dict to one packed file.
+
+    Layout: MAGIC, the header length as a little-endian uint64, a JSON header
+    ({'meta': ..., 'arrays': {name: {'dtype', 'shape', 'offset'}}}), then the raw
+    array bytes, each aligned to 64 bytes. The file is written to a temporary
+    name and moved into place, so readers never see a half-written file.
+    """
+    arrays = {name: np.ascontiguousarray(value) for name, value in arrays.items()}
+    specs = dict()
+    offset = 0
+    for name, value in arrays.items():
+        specs[name] = {'dtype': value.dtype.str, 'shape': list(value.shape), 'offset': offset}
+        offset = _aligned(offset + value.nbytes)
+    header = json.dumps({'meta': meta or {}, 'arrays': specs}).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for name, value in arrays.items():
+            f.seek(data_start + specs[name]['offset'])
+            f.write(value.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def read_packed(path):
+    """Open a packed file written by write_packed, returning (meta, {name: array}).
+
+    The file is memory-mapped and the arrays are read-only views into the
+    mapping, so opening costs a few syscalls whatever the array sizes; pages are
+    only read when the arrays are touched. Raises ValueError for a file that is
+    not a packed array file.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty")
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a packed array file")
+    header_len, = struct.unpack_from('<Q', buf, len(MAGIC))
+    header = json.loads(buf[len(MAGIC) + 8:len(MAGIC) + 8 + header_len])
+    data_start = _aligned(len(MAGIC) + 8 + header_len)
+
+    arrays = dict()
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        arrays[name] = np.frombuffer(buf, dtype=dtype, count=count,
+                                     offset=data_start + spec['offset']).reshape(spec['shape'])
+    return header['meta'], arrays
+
+
+def update_packed(path, name, value):
+    """Overwrite array name of a packed file in place; value must have the stored dtype and shape"""
+    with open(path, 'r+b') as f:
+        head = f.read(len(MAGIC) + 8)
+        if head[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a packed array file")
+        header_len, = struct.unpack_from('<Q', head, len(MAGIC))
+        spec = json.loads(f.read(header_len))['arrays'][name]
+        value = np.ascontiguousarray(value, dtype=np.dtype(spec['dtype']))
+        if list(value.shape) != spec['shape']:
+            raise ValueError(f"{name} has shape {spec['shape']}, got {list(value.shape)}")
+        f.seek(_aligned(len(MAGIC) + 8 + header_len) + spec['offset'])
+        f.write(value.tobytes())
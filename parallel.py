@@ -0,0 +1,42 @@
+import os
+from itertools import islice
+from multiprocessing import Pool
+
+
+def default_workers():
+    """Number of worker processes to use when --workers 0 is given"""
+    return os.cpu_count() or 1
+
+
+def imap(func, items, workers=1, chunksize=None):
+    """Yield func(item) for every item, in input order.
+
+    With workers > 1 the calls are spread over a process pool; results still come
+    back in input order, so anything derived from their position (image ids,
+    annotation ids, category order) is identical to the serial run. func must be
+    a module-level function (or functools.partial of one) so it can be pickled.
+    Iterables without a length (generators) are fed to the pool in windows so
+    they are never fully materialised.
+    """
+    if workers == 0:
+        workers = default_workers()
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    if chunksize is None:
+        # A few chunks per worker keeps the pool busy without per-item IPC
+        total = len(items) if hasattr(items, '__len__') else workers * 1024
+        chunksize = max(1, min(256, total // (workers * 4)))
+    with Pool(workers) as pool:
+        if hasattr(items, '__len__'):
+            yield from pool.imap(func, items, chunksize=chunksize)
+            return
+        items = iter(items)
+        window = workers * chunksize * 4
+        while True:
+            batch = list(islice(items, window))
+            if not batch:
+                return
+            yield from pool.imap(func, batch, chunksize=chunksize)
@@ -0,0 +1,160 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from imagesize import probe_image
+
+
+def hex2rgb(h):  # rgb order (PIL)
+    return tuple(int(h[1 + i:1 + i + 2], 16) for i in (0, 2, 4))
+
+
+# Box colours in BGR order, indexed by category id
+PALETTE = [(c[2], c[1], c[0]) for c in map(hex2rgb, (
+    '#FF0000', '#00FF00', '#0000FF', '#FFA500', '#FF00FF', '#00FFFF', '#FFD700', '#800080', '#008000', '#800000',
+    '#008080', '#FF4500', '#9400D3', '#008B8B', '#FF1493', '#32CD32', '#1E90FF', '#FF69B4', '#FF6347', '#20B2AA'))]
+
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def box_color(category_id):
+    return PALETTE[int(category_id) % len(PALETTE)]
+
+
+def read_image(file_path, preview_size=None):
+    """cv2.imread, or with preview_size a copy whose longer side is at most preview_size.
+
+    Returns (img, scale) where scale is the (x, y) factor from original to returned
+    pixel coordinates, or None at full size. Previews of large JPEGs are decoded at
+    1/2, 1/4 or 1/8 resolution by libjpeg instead of being decoded in full and resized.
+    """
+    if not preview_size:
+        return cv2.imread(file_path), None
+    size = probe_image(file_path)
+    flag = cv2.IMREAD_COLOR
+    if size is not None:
+        for factor, reduced in REDUCED_FLAGS:
+            if max(size[:2]) / factor >= preview_size:
+                flag = reduced
+                break
+    img = cv2.imread(file_path, flag)
+    if img is None:
+        return None, None
+    if size is None:
+        size = (img.shape[1], img.shape[0])
+    height, width = img.shape[:2]
+    if max(width, height) > preview_size:
+        ratio = preview_size / max(width, height)
+        width, height = max(1, round(width * ratio)), max(1, round(height * ratio))
+        img = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+    return img, (width / size[0], height / size[1])
+
+
+def scale_box(box, scale):
+    """Map an integer (xmin, ymin, xmax, ymax) box into a preview made by read_image"""
+    if scale is None:
+        return box
+    return (int(box[0] * scale[0]), int(box[1] * scale[1]), int(box[2] * scale[0]), int(box[3] * scale[1]))
+
+
+def register_objects(objects, category_set, every_class_num):
+    """Count (name, ...) objects per class and return their category ids.
+
+    category_set maps names to ids; a name seen for the first time gets the next
+    id, so box colours follow first-seen order.
+    """
+    category_ids = []
+    for obj in objects:
+        category_name = obj[0]
+        every_class_num[category_name] += 1
+        if category_name not in category_set:
+            category_set[category_name] = len(category_set)
+        category_ids.append(category_set[category_name])
+    return category_ids
+
+
+def paint_box(img, objects, category_ids, scale=None):
+    """Draw (name, xmin, ymin, xmax, ymax) objects and their names onto img, coloured by category id"""
+    for (category_name, xmin, ymin, xmax, ymax), category_id in zip(objects, category_ids):
+        xmin, ymin, xmax, ymax = scale_box((int(xmin), int(ymin), int(xmax), int(ymax)), scale)
+        color = box_color(category_id)
+
+        cv2.rectangle(img, (xmin, ymin), (xmax, ymax), color)
+        cv2.putText(img, category_name, (xmin, ymin), cv2.FONT_HERSHEY_SIMPLEX, 1, color, thickness=2)
+    return img
+
+
+def plot_class_distribution(every_class_num, save_path):
+    """Bar chart of the boxes per class, saved into save_path and shown"""
+    import matplotlib.pyplot as plt
+
+    plt.bar(range(len(every_class_num)), every_class_num.values(), align='center')
+    plt.xticks(range(len(every_class_num)), every_class_num.keys(), rotation=0)
+    for index, (i, v) in enumerate(every_class_num.items()):
+        plt.text(x=index, y=v, s=str(v), ha='center')
+    plt.xlabel('image class')
+    plt.ylabel('number of images')
+    plt.title('class distribution')
+
+    res_path = os.path.join(save_path, '00000_class_distribution.png')
+    plt.savefig(res_path)
+    plt.show()
+
+
+def write_params(quality=None):
+    """cv2.imwrite parameters for an output quality (JPEG and WebP), if one is given"""
+    if quality is None:
+        return []
+    return [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_WEBP_QUALITY, quality]
+
+
+def render_pipeline(items, decode, register, draw, encode, workers=4, draw_workers=2, encode_workers=4, queue_size=32):
+    """Decode, draw and encode images on thread pools, yielding each item once it has been decoded.
+
+    decode(item) runs on the decode pool and returns the loaded data, or None to skip the item.
+    register(item, data) runs on the calling thread in input order, so shared bookkeeping such as
+    class counts and category colours sees the items exactly as a serial loop would; it returns
+    the job passed to draw(data, job) on the draw pool (or None to skip the item), whose result
+    goes to encode(item, result) on the encode pool. OpenCV releases the GIL while decoding and
+    encoding, so these scale with threads. At most queue_size items wait in each stage; an
+    error in any stage is raised here.
+    """
+    decoding = deque()
+    writing = deque()
+    items = iter(items)
+    with ThreadPoolExecutor(max(1, workers)) as decode_pool, \
+            ThreadPoolExecutor(max(1, draw_workers)) as draw_pool, \
+            ThreadPoolExecutor(max(1, encode_workers)) as encode_pool:
+
+        def fill():
+            while len(decoding) < queue_size:
+                item = next(items, decoding)
+                if item is decoding:
+                    break
+                decoding.append((item, decode_pool.submit(decode, item)))
+
+        def write(item, drawn):
+            return encode(item, drawn.result())
+
+        try:
+            fill()
+            while decoding:
+                item, future = decoding.popleft()
+                data = future.result()
+                fill()
+                job = register(item, data) if data is not None else None
+                if job is not None:
+                    drawn = draw_pool.submit(draw, data, job)
+                    writing.append(encode_pool.submit(write, item, drawn))
+                    while len(writing) > queue_size or (writing and writing[0].done()):
+                        writing.popleft().result()
+                yield item
+            while writing:
+                writing.popleft().result()
+        finally:
+            for _, future in decoding:
+                future.cancel()
+            for future in writing:
+                future.cancel()
@@ -0,0 +1,29 @@
+import random
+from collections import defaultdict
+
+
+def stratified_sample(image_classes, per_class=0, top_boxes=0, seed=0):
+    """Pick a seeded, class-stratified sample of images from their annotations alone.
+
+    image_classes holds the class names of every box, one list per image. Up to
+    per_class images are drawn at random among the images containing each class
+    (rarest classes first, so they are not crowded out), plus the top_boxes images
+    with the most boxes. Returns the sorted indices of the chosen images.
+    """
+    rng = random.Random(seed)
+    by_class = defaultdict(list)
+    for index, names in enumerate(image_classes):
+        for name in sorted(set(names)):
+            by_class[name].append(index)
+
+    selected = set()
+    for name in sorted(by_class, key=lambda name: (len(by_class[name]), name)):
+        candidates = [index for index in by_class[name] if index not in selected]
+        have = len(by_class[name]) - len(candidates)
+        if have < per_class:
+            selected.update(rng.sample(candidates, min(per_class - have, len(candidates))))
+
+    if top_boxes:
+        busiest = sorted(range(len(image_classes)), key=lambda index: (-len(image_classes[index]), index))
+        selected.update(busiest[:top_boxes])
+    return sorted(selected)
@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+import zipfile
+
+SHARD_INDEX = 'shards.json'
+SHARD_FORMATS = ('tar', 'zip')
+SHARD_SIZE = 1 << 30  # default shard size bound in bytes
+
+
+class ShardWriter:
+    """Pack output files into numbered, size-bounded tar or zip shards instead of one file each.
+
+    write(path, data) takes the path a converter would have written under
+    save_path and stores it as a member named by its path relative to save_path,
+    in save_path/shard-000000.tar, shard-000001.tar, ... A shard is closed once
+    adding the next file would take it past shard_size bytes. close() writes
+    save_path/shards.json listing every shard and its members.
+
+    With image_path, the layout is WebDataset-style: each label is stored as
+    <key>.txt / <key>.xml next to its image <key>.<ext> from image_path in the
+    same shard, where key is the file stem with dots replaced by underscores
+    (WebDataset splits keys at the first dot). Labels without an image are
+    stored alone and counted in missing_images.
+    """
+
+    def __init__(self, save_path, shard_format='tar', shard_size=SHARD_SIZE, image_path=None):
+        if shard_format not in SHARD_FORMATS:
+            raise ValueError(f"unknown shard format {shard_format!r}, expected one of {SHARD_FORMATS}")
+        os.makedirs(save_path, exist_ok=True)
+        self.save_path = save_path
+        self.shard_format = shard_format
+        self.shard_size = shard_size
+        self.image_path = image_path
+        self.images = None
+        if image_path is not None:
+            self.images = {os.path.splitext(i)[0]: i for i in sorted(os.listdir(image_path))}
+        self.mtime = int(time.time())
+        self.shards = []  # {'name', 'members', 'bytes'} of every shard written so far
+        self.missing_images = 0
+        self._archive = None
+        self._lock = threading.Lock()
+
+    def _open_shard(self):
+        name = 'shard-{:06d}.{}'.format(len(self.shards), self.shard_format)
+        path = os.path.join(self.save_path, name)
+        if self.shard_format == 'tar':
+            self._archive = tarfile.open(path, 'w', format=tarfile.USTAR_FORMAT)
+        else:
+            self._archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)
+        self.shards.append({'name': name, 'members': [], 'bytes': 0})
+
+    def _close_shard(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def _add(self, name, data):
+        if self.shard_format == 'tar':
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = self.mtime
+            self._archive.addfile(info, io.BytesIO(data))
+        else:
+            info = zipfile.ZipInfo(name, time.localtime(self.mtime)[:6])
+            self._archive.writestr(info, data)
+        shard = self.shards[-1]
+        shard['members'].append(name)
+        shard['bytes'] += len(data)
+
+    def _members(self, path, data):
+        """(member name, bytes) pairs to store for one output file"""
+        data = data if isinstance(data, bytes) else data.encode()
+        name = os.path.relpath(path, self.save_path).replace(os.sep, '/')
+        if self.images is None:
+            return [(name, data)]
+        stem, ext = os.path.splitext(os.path.basename(name))
+        key = stem.replace('.', '_')
+        members = []
+        image = self.images.get(stem)
+        if image is None:
+            self.missing_images += 1
+        else:
+            with open(os.path.join(self.image_path, image), 'rb') as f:
+                members.append((key + os.path.splitext(image)[1].lower(), f.read()))
+        members.append((key + ext, data))
+        return members
+
+    def write(self, path, data):
+        """Store one output file (and its image in WebDataset layout), keeping them in the same shard"""
+        members = self._members(path, data)
+        size = sum(len(member) for _, member in members)
+        with self._lock:
+            if self._archive is None or (self.shards[-1]['members'] and self.shards[-1]['bytes'] + size > self.shard_size):
+                self._close_shard()
+                self._open_shard()
+            for name, member in members:
+                self._add(name, member)
+
+    def close(self):
+        """Close the last shard and write the index"""
+        with self._lock:
+            self._close_shard()
+            index = {'format': self.shard_format, 'webdataset': self.images is not None, 'shards': self.shards}
+            tmp_path = os.path.join(self.save_path, SHARD_INDEX + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, os.path.join(self.save_path, SHARD_INDEX))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def open_shards(save_path, shard_format=None, shard_size_mb=None, image_path=None):
+    """ShardWriter for the converters' --shards options, or None to write plain files"""
+    if shard_format is None:
+        return None
+    shard_size = SHARD_SIZE if shard_size_mb is None else int(shard_size_mb * (1 << 20))
+    return ShardWriter(save_path, shard_format, shard_size, image_path)
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from functools import partial
+from itertools import islice
+
+import numpy as np
+
+from archiveinput import is_archive, iter_archive
+from cocoreader import is_coco_manifest, iter_sections, read_coco_manifest
+from parallel import imap
+from vocxml import parse_voc
+from yololabels import load_label_cache, load_label_files, read_classes
+
+FORMATS = ('coco', 'voc', 'yolo')
+FILES_PER_TASK = 512  # files counted per worker task, so results cross the pool in batches
+
+
+def new_stats(anno_format):
+    return {
+        'format': anno_format,
+        'image_count': 0,
+        'total_boxes': 0,
+        'category_bbox_count': dict(),  # category name -> boxes, in first-seen order
+        'bbox_count_distribution': dict(),  # boxes in an image -> images
+        'errors': [],
+    }
+
+
+def add_count(counts, key, n=1):
+    counts[key] = counts.get(key, 0) + n
+
+
+def merge_stats(stats, part):
+    """Add the counts of part into stats"""
+    stats['image_count'] += part['image_count']
+    stats['total_boxes'] += part['total_boxes']
+    for key, n in part['category_bbox_count'].items():
+        add_count(stats['category_bbox_count'], key, n)
+    for key, n in part['bbox_count_distribution'].items():
+        add_count(stats['bbox_count_distribution'], key, n)
+    stats['errors'].extend(part['errors'])
+    return stats
+
+
+def finish_stats(stats):
+    stats['avg_boxes_per_image'] = stats['total_boxes'] / stats['image_count'] if stats['image_count'] > 0 else 0
+    stats['bbox_count_distribution'] = dict(sorted(stats['bbox_count_distribution'].items()))
+    return stats
+
+
+def chunked(items, size=FILES_PER_TASK):
+    """Lists of size items; lazily for an iterator, so it is consumed as the batches are counted"""
+    if isinstance(items, list):
+        return [items[i:i + size] for i in range(0, len(items), size)]
+    items = iter(items)
+    return iter(lambda: list(islice(items, size)), [])
+
+
+def count_voc_files(xml_files):
+    """Count boxes in a batch of VOC xml files, given as paths or (archive member name, bytes) pairs"""
+    part = new_stats('voc')
+    for xml_file in xml_files:
+        xml_file, data = xml_file if isinstance(xml_file, tuple) else (xml_file, None)
+        try:
+            _, _, objects = parse_voc(xml_file, data, boxes=False)
+        except (ET.ParseError, ValueError) as e:
+            part['errors'].append(f"Error parsing file {xml_file}: {e}")
+            continue
+
+        # Only objects with a <bndbox> count as bounding boxes
+        num_boxes_in_image = len(objects)
+        for obj in objects:
+            add_count(part['category_bbox_count'], obj[0])
+
+        add_count(part['bbox_count_distribution'], num_boxes_in_image)
+        part['total_boxes'] += num_boxes_in_image
+        part['image_count'] += 1
+    return part
+
+
+def count_yolo_files(classes, txt_files):
+    """Count boxes in a batch of YOLO label files"""
+    return count_yolo_labels(classes, load_label_files(txt_files))
+
+
+def count_yolo_labels(classes, labels):
+    """Count boxes in parsed YOLO labels"""
+    part = new_stats('yolo')
+    part['errors'].extend(f"Skipped malformed line {error}" for error in labels.errors)
+
+    # Every line counts towards the boxes of its image, only well-formed ones towards a class
+    for bbox_count in labels.line_counts.tolist():
+        add_count(part['bbox_count_distribution'], bbox_count)
+    class_ids, first_seen, counts = np.unique(labels.class_ids, return_index=True, return_counts=True)
+    for i in np.argsort(first_seen, kind='stable').tolist():
+        class_id = int(class_ids[i])
+        add_count(part['category_bbox_count'], classes[class_id] if -len(classes) <= class_id < len(classes) else 'Unknown', int(counts[i]))
+
+    part['total_boxes'] += int(labels.line_counts.sum())
+    part['image_count'] += len(labels)
+    return part
+
+
+def stat_coco(annotation_file, streaming=True, workers=1):
+    """Statistics of a COCO annotation file, read incrementally unless streaming is False.
+
+    For a shard manifest every shard is counted on its own, on a process pool,
+    and the counts are merged; an image and its annotations are always in the
+    same shard, so the per-image distribution adds up.
+    """
+    assert os.path.exists(annotation_file), f"ERROR: {annotation_file} does not exist"
+    stats = new_stats('coco')
+    if is_coco_manifest(annotation_file):
+        shard_files = [shard['path'] for shard in read_coco_manifest(annotation_file)['shards']]
+        for part in imap(partial(stat_coco, streaming=streaming), shard_files, workers, chunksize=1):
+            merge_stats(stats, part)
+        return finish_stats(stats)
+    image_box_count = defaultdict(int)
+    if streaming:
+        # Categories may come after the annotations, so count by id and name them at the end
+        category_id_to_name = dict()
+        category_id_count = dict()
+        for key, item in iter_sections(annotation_file):
+            if key == 'images':
+                stats['image_count'] += 1
+            elif key == 'annotations':
+                add_count(category_id_count, item['category_id'])
+                image_box_count[item['image_id']] += 1
+                stats['total_boxes'] += 1
+            else:
+                category_id_to_name[item['id']] = item['name']
+        for category_id, count in category_id_count.items():
+            add_count(stats['category_bbox_count'], category_id_to_name.get(category_id, 'Unknown'), count)
+    else:
+        with open(annotation_file, 'r') as f:
+            data = json.load(f)
+        annotations = data.get('annotations', [])
+        category_id_to_name = {category['id']: category['name'] for category in data.get('categories', [])}
+        for annotation in annotations:
+            add_count(stats['category_bbox_count'], category_id_to_name.get(annotation['category_id'], 'Unknown'))
+            image_box_count[annotation['image_id']] += 1
+        stats['image_count'] = len(data.get('images', []))
+        stats['total_boxes'] = len(annotations)
+
+    # Only images with at least one box appear in the distribution
+    for bbox_count in image_box_count.values():
+        add_count(stats['bbox_count_distribution'], bbox_count)
+    return finish_stats(stats)
+
+
+def stat_voc(root_dir, workers=1):
+    """Statistics of every .xml file under root_dir (a folder or a tar/zip archive), parsed on a process pool"""
+    assert os.path.exists(root_dir), f"ERROR: {root_dir} does not exist"
+    if is_archive(root_dir):
+        xml_files = iter_archive(root_dir, ('.xml',))
+    else:
+        xml_files = [os.path.join(dirpath, filename)
+                     for dirpath, _, filenames in os.walk(root_dir) for filename in filenames if filename.endswith('.xml')]
+    stats = new_stats('voc')
+    for part in imap(count_voc_files, chunked(xml_files), workers, chunksize=1):
+        merge_stats(stats, part)
+    return finish_stats(stats)
+
+
+def stat_yolo(annotation_dir, workers=1, label_cache=False, check_files=True):
+    """Statistics of a YOLO label folder (with classes.txt), read on a process pool or from its label cache"""
+    classes_file = os.path.join(annotation_dir, 'classes.txt')
+    assert os.path.exists(classes_file), f"ERROR: {classes_file} does not exist"
+    classes = read_classes(annotation_dir)
+    if label_cache:
+        return finish_stats(count_yolo_labels(classes, load_label_cache(annotation_dir, check_files=check_files)))
+
+    txt_files = [os.path.join(annotation_dir, filename) for filename in os.listdir(annotation_dir)
+                 if filename.endswith('.txt') and filename != 'classes.txt']
+    stats = new_stats('yolo')
+    for part in imap(partial(count_yolo_files, classes), chunked(txt_files), workers, chunksize=1):
+        merge_stats(stats, part)
+    return finish_stats(stats)
+
+
+def dataset_stats(anno_format, path, workers=1, streaming=True, label_cache=False, check_files=True):
+    """Statistics of a dataset in any supported format"""
+    if anno_format == 'coco':
+        return stat_coco(path, streaming, workers)
+    if anno_format == 'voc':
+        return stat_voc(path, workers)
+    if anno_format == 'yolo':
+        return stat_yolo(path, workers, label_cache, check_files)
+    raise ValueError(f"unknown format {anno_format!r}, expected one of {FORMATS}")
+
+
+def print_stats(stats):
+    for error in stats['errors']:
+        print(error)
+    print(f"Total number of images: {stats['image_count']}")
+    print(f"Total number of bounding boxes: {stats['total_boxes']}")
+    print(f"Average number of bounding boxes per image: {stats['avg_boxes_per_image']:.2f}")
+
+    print("\nNumber of bounding boxes for each category:")
+    for category, count in stats['category_bbox_count'].items():
+        print(f"{category}: {count} bounding boxes")
+
+    if stats['format'] == 'yolo':
+        print("\nDistribution of images by number of bounding boxes:")
+        for bbox_count, img_count in stats['bbox_count_distribution'].items():
+            print(f"Images with {bbox_count} bounding boxes: {img_count} images")
+    else:
+        print("\nDistribution of bounding boxes per image:")
+        for box_num, img_count in stats['bbox_count_distribution'].items():
+            print(f"Images with {box_num} bounding boxes: {img_count}")
+
+
+def save_stats(stats, json_path):
+    with open(json_path, 'w') as f:
+        json.dump(stats, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-f', '--format', type=str, required=True, choices=FORMATS, help='Format of the annotations')
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='COCO .json file (or shard manifest), VOC .xml folder (or tar/zip archive) or YOLO .txt folder(with classes.txt)')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes for VOC, YOLO and COCO shards (0 uses all CPUs)')
+    parser.add_argument('--load-all', action='store_true', help='Load a COCO file with json.load instead of streaming it')
+    parser.add_argument('-c', '--label-cache', action='store_true', help='Read YOLO labels from a packed cache next to classes.txt')
+    parser.add_argument('--skip-file-check', action='store_true', help='With --label-cache, only check the labels folder, not the size and mtime of every label file (faster on large folders, but misses labels edited in place)')
+    parser.add_argument('-o', '--output', type=str, default=None, help='Also write the statistics to this .json file')
+    opt = parser.parse_args()
+
+    stats = dataset_stats(opt.format, opt.anno_path, opt.workers, not opt.load_all, opt.label_cache, not opt.skip_file_check)
+    print_stats(stats)
+    if opt.output:
+        save_stats(stats, opt.output)
@@ -2,128 +2,130 @@ import argparse
 import os
 from collections import defaultdict
 from xml import etree
-from pycocotools.coco import COCO
 import cv2
-import matplotlib.pyplot as plt
 from tqdm import tqdm
+from cocoindex import is_coco_index
+from cocoreader import catid2name, load_coco_images
+from sampling import stratified_sample
+from renderpool import paint_box, plot_class_distribution, read_image, register_objects, render_pipeline, write_params
 
 category_set = dict()
 image_set = set()
 every_class_num = defaultdict(int)
 
-category_item_id = -1
-
-def addCatItem(name):
-    global category_item_id
-    category_item = dict()
-    category_item_id += 1
-    category_item['id'] = category_item_id
-    category_item['name'] = name
-    category_set[name] = category_item_id
-    return category_item_id
-
-def draw_box(img, objects):
-    for object in objects:
-        category_name = object[0]
-        every_class_num[category_name] += 1
-        if category_name not in category_set:
-            category_id = addCatItem(category_name)
-        else:
-            category_id = category_set[category_name]
-        xmin = int(object[1])
-        ymin = int(object[2])
-        xmax = int(object[3])
-        ymax = int(object[4])
-
-        def hex2rgb(h):  # rgb order (PIL)
-            return tuple(int(h[1 + i:1 + i + 2], 16) for i in (0, 2, 4))
-
-        hex = ('FF0000', '00FF00', '0000FF', 'FFA500', 'FF00FF', '00FFFF', 'FFD700', '800080', '008000', '800000',
-               '008080', 'FF4500', '9400D3', '008B8B', 'FF1493', '32CD32', '1E90FF', 'FF69B4', 'FF6347', '20B2AA')
-
+def reset():
+    """Empty the module state, so show_image can run more than once in a process"""
+    category_set.clear()
+    image_set.clear()
+    every_class_num.clear()
 
-        palette = [hex2rgb('#' + c) for c in hex]
-        n = len(palette)
-        c = palette[int(category_id) % n]
-        color = (c[2], c[1], c[0])
-
-        cv2.rectangle(img, (xmin, ymin), (xmax, ymax), color)
-        cv2.putText(img, category_name, (xmin, ymin), cv2.FONT_HERSHEY_SIMPLEX, 1, color, thickness=2)
-    return img
-
-def catid2name(coco):
-    classes = dict()
-    for cat in coco.dataset['categories']:
-        classes[cat['id']] = cat['name']
-    return classes
-
-def show_image(image_path, anno_path, save_path, plot_image=False):
+def show_image(image_path, anno_path, save_path, plot_image=False, workers=4, draw_workers=2, encode_workers=4, queue_size=32,
+               preview_size=None, quality=None, skip_existing=False, sample_per_class=0, sample_top=0, seed=0,
+               backend='pycocotools'):
+    reset()
     assert os.path.exists(image_path), "image path:{} dose not exists".format(image_path)
     assert os.path.exists(anno_path), "annotation path:{} does not exists".format(anno_path)
-    if not anno_path.endswith(".json"):
+    if not anno_path.endswith(".json") and not is_coco_index(anno_path):
         raise RuntimeError("ERROR {} dose not a json file".format(anno_path))
     if not os.path.exists(save_path):
         os.makedirs(save_path)
 
-    coco = COCO(anno_path)
-    classes = catid2name(coco)
-    imgIds = coco.getImgIds()
-    for imgId in tqdm(imgIds):
-        size = {}
-        img = coco.loadImgs(imgId)[0]
-        filename = img['file_name']
-        image_set.add(filename)
-        width = img['width']
-        height = img['height']
-        size['width'] = width
-        size['height'] = height
-        size['depth'] = 3
-        annIds = coco.getAnnIds(imgIds=img['id'], iscrowd=None)
-        anns = coco.loadAnns(annIds)
-        objs = []
-        for ann in anns:
-            object_name = classes[ann['category_id']]
-            # bbox:[x,y,w,h]
-            bbox = list(map(int, ann['bbox']))
-            xmin = bbox[0]
-            ymin = bbox[1]
-            xmax = bbox[0] + bbox[2]
-            ymax = bbox[1] + bbox[3]
-            obj = [object_name, xmin, ymin, xmax, ymax]
-            objs.append(obj)
-
-        file_path = os.path.join(image_path, filename)
-        img = cv2.imread(file_path)
+    categories, image_count, images = load_coco_images(anno_path, backend)
+    classes = catid2name(categories)
+
+    def iter_items():
+        for img, anns in images:
+            objs = []
+            for ann in anns:
+                object_name = classes[ann['category_id']]
+                # bbox:[x,y,w,h]
+                bbox = list(map(int, ann['bbox']))
+                xmin = bbox[0]
+                ymin = bbox[1]
+                xmax = bbox[0] + bbox[2]
+                ymax = bbox[1] + bbox[3]
+                obj = [object_name, xmin, ymin, xmax, ymax]
+                objs.append(obj)
+            yield img['file_name'], objs
+
+    items = iter_items()
+    total = image_count
+    sampled = bool(sample_per_class or sample_top)
+    if sampled:
+        # Class counts and colours come from the annotations of every image;
+        # only the sampled images are decoded
+        items = list(items)
+        for filename, objs in items:
+            image_set.add(filename)
+            register_objects(objs, category_set, every_class_num)
+        keep = stratified_sample([[obj[0] for obj in objs] for _, objs in items], sample_per_class, sample_top, seed)
+        items = [items[i] for i in keep]
+        total = len(items)
+
+    params = write_params(quality)
+
+    def decode(item):
+        if skip_existing and os.path.exists(os.path.join(save_path, item[0])):
+            return None, None, True
+        img, scale = read_image(os.path.join(image_path, item[0]), preview_size)
         if img is None:
-            continue
-        img = draw_box(img, objs)
-        res_path = os.path.join(save_path, filename)
-        cv2.imwrite(res_path, img)
-        
+            return None
+        return img, scale, False
+
+    def register(item, data):
+        img, scale, existing = data
+        if sampled:
+            category_ids = [category_set[obj[0]] for obj in item[1]]
+        else:
+            category_ids = register_objects(item[1], category_set, every_class_num)
+        if existing:
+            return None
+        return item[1], category_ids, scale
+
+    def draw(data, job):
+        return paint_box(data[0], *job)
+
+    def encode(item, img):
+        cv2.imwrite(os.path.join(save_path, item[0]), img, params)
+
+    # Images are decoded, drawn and encoded on thread pools; class counts are
+    # still taken on this thread, in annotation order
+    pipeline = render_pipeline(items, decode, register, draw, encode,
+                               workers, draw_workers, encode_workers, queue_size)
+    for filename, objs in tqdm(pipeline, total=total):
+        image_set.add(filename)
+
     if plot_image:
-        plt.bar(range(len(every_class_num)), every_class_num.values(), align='center')
-        plt.xticks(range(len(every_class_num)), every_class_num.keys(), rotation=0)
-        for index, (i, v) in enumerate(every_class_num.items()):
-            plt.text(x=index, y=v, s=str(v), ha='center')
-        plt.xlabel('image class')
-        plt.ylabel('number of images')
-        plt.title('class distribution')
-
-        res_path = os.path.join(save_path, '00000_class_distribution.png')
-        plt.savefig(res_path)
-        plt.show()
+        plot_class_distribution(every_class_num, save_path)
 
-if __name__ == '__main__':
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('-ip', '--image-path', type=str, required=True, help='Path to the directory containing the images')
-    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to the COCO .json annotation file')
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to the COCO .json annotation file, shard manifest or compiled .cocoindex')
     parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the labeled images')
     parser.add_argument('-p', '--plot-image', action='store_true', help='Whether to save the statistical result as an image')
-    opt = parser.parse_args()
+    parser.add_argument('-w', '--workers', type=int, default=4, help='Number of threads decoding images')
+    parser.add_argument('-dw', '--draw-workers', type=int, default=2, help='Number of threads drawing boxes')
+    parser.add_argument('-ew', '--encode-workers', type=int, default=4, help='Number of threads encoding and writing images')
+    parser.add_argument('-qs', '--queue-size', type=int, default=32, help='Maximum number of images waiting in each stage')
+    parser.add_argument('-ps', '--preview-size', type=int, default=None, help='Write previews whose longer side is at most this many pixels')
+    parser.add_argument('-q', '--quality', type=int, default=None, help='JPEG/WebP quality of the written images')
+    parser.add_argument('-se', '--skip-existing', action='store_true', help='Do not render images whose output already exists')
+    parser.add_argument('-sc', '--sample-per-class', type=int, default=0, help='Only render a random sample of this many images per class')
+    parser.add_argument('-st', '--sample-top', type=int, default=0, help='Also render the images with the most boxes (this many)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for sampling')
+    parser.add_argument('-b', '--backend', type=str, default='pycocotools', choices=['pycocotools', 'stream', 'index'], help='COCO reader: full pycocotools index, bounded-memory streaming or a compiled binary index')
+    opt = parser.parse_args(argv)
 
     print(opt)
-    show_image(opt.image_path, opt.anno_path, opt.save_path, opt.plot_image)
+    show_image(opt.image_path, opt.anno_path, opt.save_path, opt.plot_image,
+               opt.workers, opt.draw_workers, opt.encode_workers, opt.queue_size,
+               opt.preview_size, opt.quality, opt.skip_existing, opt.sample_per_class, opt.sample_top, opt.seed,
+               opt.backend)
     print(every_class_num)
     print("category nums: {}".format(len(category_set)))
     print("image nums: {}".format(len(image_set)))
-    print("bbox nums: {}".format(sum(every_class_num.values())))
\ No newline at end of file
+    print("bbox nums: {}".format(sum(every_class_num.values())))
+
+if __name__ == '__main__':
+    main()
@@ -1,129 +1,129 @@
 import os
 import cv2
-import matplotlib.pyplot as plt
 from tqdm import tqdm
-from lxml import etree
+from vocxml import parse_voc
+from archiveinput import is_archive, iter_archive
 from collections import defaultdict
+from sampling import stratified_sample
+from renderpool import paint_box, plot_class_distribution, read_image, register_objects, render_pipeline, write_params
 import argparse
 
 category_set = dict()
 image_set = set()
 every_class_num = defaultdict(int)
 
-category_item_id = -1
 
-
-def draw_box(img, objects):
-    for object in objects:
-        category_name = object['name']
-        every_class_num[category_name] += 1
-        if category_name not in category_set:
-            category_id = addCatItem(category_name)
-        else:
-            category_id = category_set[category_name]
-        xmin = int(object['bndbox']['xmin'])
-        ymin = int(object['bndbox']['ymin'])
-        xmax = int(object['bndbox']['xmax'])
-        ymax = int(object['bndbox']['ymax'])
-        def hex2rgb(h):  # rgb order (PIL)
-            return tuple(int(h[1 + i:1 + i + 2], 16) for i in (0, 2, 4))
-
-        hex = ('FF0000', '00FF00', '0000FF', 'FFA500', 'FF00FF', '00FFFF', 'FFD700', '800080', '008000', '800000',
-               '008080', 'FF4500', '9400D3', '008B8B', 'FF1493', '32CD32', '1E90FF', 'FF69B4', 'FF6347', '20B2AA')
-
-
-        palette = [hex2rgb('#' + c) for c in hex]
-        n = len(palette)
-        c = palette[int(category_id) % n]
-        color = (c[2], c[1], c[0])
-
-        cv2.rectangle(img, (xmin, ymin), (xmax, ymax), color)
-        cv2.putText(img, category_name, (xmin, ymin), cv2.FONT_HERSHEY_SIMPLEX, 1, color, thickness=2)
-    return img
-
-
-def addCatItem(name):
-    global category_item_id
-    category_item = dict()
-    category_item_id += 1
-    category_item['id'] = category_item_id
-    category_item['name'] = name
-    category_set[name] = category_item_id
-    return category_item_id
-
-
-def parse_xml_to_dict(xml):
-    if len(xml) == 0:  # 遍历到底层，直接返回tag对应的信息
-        return {xml.tag: xml.text}
-
-    result = {}
-    for child in xml:
-        child_result = parse_xml_to_dict(child)  # 递归遍历标签信息
-        if child.tag != 'object':
-            result[child.tag] = child_result[child.tag]
-        else:
-            if child.tag not in result:  # 因为object可能有多个，所以需要放入列表里
-                result[child.tag] = []
-            result[child.tag].append(child_result[child.tag])
-    return {xml.tag: result}
+def reset():
+    """Empty the module state, so show_image can run more than once in a process"""
+    category_set.clear()
+    image_set.clear()
+    every_class_num.clear()
 
 
-def show_image(image_path, anno_path, save_path, plot_image=False):
+def show_image(image_path, anno_path, save_path, plot_image=False, workers=4, draw_workers=2, encode_workers=4, queue_size=32,
+               preview_size=None, quality=None, skip_existing=False, sample_per_class=0, sample_top=0, seed=0):
+    reset()
     assert os.path.exists(image_path), "image path:{} dose not exists".format(image_path)
     assert os.path.exists(anno_path), "annotation path:{} does not exists".format(anno_path)
-    anno_file_list = [os.path.join(anno_path, file) for file in os.listdir(anno_path) if file.endswith(".xml")]
+    # An archive of xml files is read member by member, in archive order; a folder in name
+    # order, so a sample with the same seed picks the same images everywhere
+    if is_archive(anno_path):
+        anno_file_list = iter_archive(anno_path, ('.xml',))
+    else:
+        anno_file_list = [(os.path.join(anno_path, file), None) for file in sorted(os.listdir(anno_path)) if file.endswith(".xml")]
     
     if not os.path.exists(save_path):
         os.makedirs(save_path)
 
-    for xml_file in tqdm(anno_file_list):
-        if not xml_file.endswith('.xml'):
-            continue
-
-        with open(xml_file) as fid:
-            xml_str = fid.read()
-        xml = etree.fromstring(xml_str)
-        xml_info_dict = parse_xml_to_dict(xml)
-
-        filename = xml_info_dict['annotation']['filename']
-        image_set.add(filename)
+    def read_anno(anno_file):
+        """Parse one (xml file, bytes or None) into its image file name and (name, xmin, ymin, xmax, ymax) objects"""
+        filename, size, objects = parse_voc(*anno_file)
+        return filename, objects
+
+    items = map(read_anno, anno_file_list)
+    total = len(anno_file_list) if isinstance(anno_file_list, list) else None
+    sampled = bool(sample_per_class or sample_top)
+    if sampled:
+        # Class counts and colours come from the annotations of every image;
+        # only the sampled images are decoded
+        items = list(items)
+        for filename, objects in items:
+            image_set.add(filename)
+            register_objects(objects, category_set, every_class_num)
+        keep = stratified_sample([[obj[0] for obj in objects] for _, objects in items], sample_per_class, sample_top, seed)
+        items = [items[i] for i in keep]
+        total = len(items)
+
+    params = write_params(quality)
+
+    def decode(item):
+        """Read the image of one annotation; img is None if the image is missing"""
+        filename, objects = item
         file_path = os.path.join(image_path, filename)
         if not os.path.exists(file_path):
-            continue
-
-        img = cv2.imread(file_path)
-        if img is None:
-            continue
-        if 'object' in xml_info_dict['annotation']:
-            img = draw_box(img, xml_info_dict['annotation']['object'])
-        res_path = os.path.join(save_path, filename)
-        cv2.imwrite(res_path, img)
-        
-    if plot_image:
-        plt.bar(range(len(every_class_num)), every_class_num.values(), align='center')
-        plt.xticks(range(len(every_class_num)), every_class_num.keys(), rotation=0)
-        for index, (i, v) in enumerate(every_class_num.items()):
-            plt.text(x=index, y=v, s=str(v), ha='center')
-        plt.xlabel('image class')
-        plt.ylabel('number of images')
-        plt.title('class distribution')
+            return filename, objects, None, None, False
+        if skip_existing and os.path.exists(os.path.join(save_path, filename)):
+            return filename, objects, None, None, True
+        img, scale = read_image(file_path, preview_size)
+        return filename, objects, img, scale, False
+
+    def register(item, data):
+        filename, objects, img, scale, existing = data
+        image_set.add(filename)
+        if img is None and not existing:
+            return None
+        if sampled:
+            category_ids = [category_set[obj[0]] for obj in objects]
+        else:
+            category_ids = register_objects(objects, category_set, every_class_num)
+        return None if existing else category_ids
 
-        res_path = os.path.join(save_path, '00000_class_distribution.png')
-        plt.savefig(res_path)
-        plt.show()
+    def draw(data, category_ids):
+        filename, objects, img, scale, existing = data
+        return filename, paint_box(img, objects, category_ids, scale)
 
+    def encode(item, drawn):
+        filename, img = drawn
+        cv2.imwrite(os.path.join(save_path, filename), img, params)
 
-if __name__ == '__main__':
+    # Images are decoded, drawn and encoded on thread pools; class counts are
+    # still taken on this thread, in file order
+    pipeline = render_pipeline(items, decode, register, draw, encode,
+                               workers, draw_workers, encode_workers, queue_size)
+    for _ in tqdm(pipeline, total=total):
+        pass
+
+    if plot_image:
+        plot_class_distribution(every_class_num, save_path)
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('-ip', '--image-path', type=str, required=True, help='Path to the directory containing the images')
-    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to the VOC .xml annotations folder')
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to the VOC .xml annotations folder, or a tar/zip archive of it')
     parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the labeled images')
     parser.add_argument('-p', '--plot-image', action='store_true', help='Whether to save the statistical result as an image')
-    opt = parser.parse_args()
+    parser.add_argument('-w', '--workers', type=int, default=4, help='Number of threads decoding images')
+    parser.add_argument('-dw', '--draw-workers', type=int, default=2, help='Number of threads drawing boxes')
+    parser.add_argument('-ew', '--encode-workers', type=int, default=4, help='Number of threads encoding and writing images')
+    parser.add_argument('-qs', '--queue-size', type=int, default=32, help='Maximum number of images waiting in each stage')
+    parser.add_argument('-ps', '--preview-size', type=int, default=None, help='Write previews whose longer side is at most this many pixels')
+    parser.add_argument('-q', '--quality', type=int, default=None, help='JPEG/WebP quality of the written images')
+    parser.add_argument('-se', '--skip-existing', action='store_true', help='Do not render images whose output already exists')
+    parser.add_argument('-sc', '--sample-per-class', type=int, default=0, help='Only render a random sample of this many images per class')
+    parser.add_argument('-st', '--sample-top', type=int, default=0, help='Also render the images with the most boxes (this many)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for sampling')
+    opt = parser.parse_args(argv)
 
     print(opt)
-    show_image(opt.image_path, opt.anno_path, opt.save_path, opt.plot_image)
+    show_image(opt.image_path, opt.anno_path, opt.save_path, opt.plot_image,
+               opt.workers, opt.draw_workers, opt.encode_workers, opt.queue_size,
+               opt.preview_size, opt.quality, opt.skip_existing, opt.sample_per_class, opt.sample_top, opt.seed)
     print(every_class_num)
     print("category nums: {}".format(len(category_set)))
     print("image nums: {}".format(len(image_set)))
-    print("bbox nums: {}".format(sum(every_class_num.values())))
\ No newline at end of file
+    print("bbox nums: {}".format(sum(every_class_num.values())))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,69 +3,32 @@ import os
 import sys
 from collections import defaultdict
 import cv2
-import matplotlib.pyplot as plt
 from tqdm import tqdm
+import boxops
+from imageindex import INDEX_NAME, load_image_index
+from sampling import stratified_sample
+from renderpool import paint_box, plot_class_distribution, read_image, register_objects, render_pipeline, write_params
+from yololabels import read_labels
 
 category_set = dict()
 image_set = set()
 every_class_num = defaultdict(int)
 
-category_item_id = -1
 
+def reset():
+    """Empty the module state, so show_image can run more than once in a process"""
+    category_set.clear()
+    image_set.clear()
+    every_class_num.clear()
 
-def xywhn2xyxy(box, size):
-    box = list(map(float, box))
-    size = list(map(float, size))
-    xmin = (box[0] - box[2] / 2.) * size[0]
-    ymin = (box[1] - box[3] / 2.) * size[1]
-    xmax = (box[0] + box[2] / 2.) * size[0]
-    ymax = (box[1] + box[3] / 2.) * size[1]
-    return (xmin, ymin, xmax, ymax)
 
-
-def addCatItem(name):
-    global category_item_id
-    category_item = dict()
-    category_item_id += 1
-    category_item['id'] = category_item_id
-    category_item['name'] = name
-    category_set[name] = category_item_id
-    return category_item_id
-
-
-def draw_box(img, objects, draw=True):
-    for object in objects:
-        category_name = object[0]
-        every_class_num[category_name] += 1
-        if category_name not in category_set:
-            category_id = addCatItem(category_name)
-        else:
-            category_id = category_set[category_name]
-        xmin = int(object[1][0])
-        ymin = int(object[1][1])
-        xmax = int(object[1][2])
-        ymax = int(object[1][3])
-        def hex2rgb(h):  # rgb order (PIL)
-            return tuple(int(h[1 + i:1 + i + 2], 16) for i in (0, 2, 4))
-
-        hex = ('FF0000', '00FF00', '0000FF', 'FFA500', 'FF00FF', '00FFFF', 'FFD700', '800080', '008000', '800000',
-               '008080', 'FF4500', '9400D3', '008B8B', 'FF1493', '32CD32', '1E90FF', 'FF69B4', 'FF6347', '20B2AA')
-
-
-        palette = [hex2rgb('#' + c) for c in hex]
-        n = len(palette)
-        c = palette[int(category_id) % n]
-        color = (c[2], c[1], c[0])
-
-        cv2.rectangle(img, (xmin, ymin), (xmax, ymax), color)
-        cv2.putText(img, category_name, (xmin, ymin), cv2.FONT_HERSHEY_SIMPLEX, 1, color, thickness=2)
-    return img
-
-
-def show_image(image_path, anno_path, save_path, plot_image=False):
+def show_image(image_path, anno_path, save_path, plot_image=False, image_index=False, index_path=None,
+               workers=4, draw_workers=2, encode_workers=4, queue_size=32, preview_size=None, quality=None, skip_existing=False,
+               sample_per_class=0, sample_top=0, seed=0, label_cache=False, check_files=True):
+    reset()
     assert os.path.exists(image_path), "image path:{} dose not exists".format(image_path)
     assert os.path.exists(anno_path), "annotation path:{} does not exists".format(anno_path)
-    anno_file_list = [os.path.join(anno_path, file) for file in os.listdir(anno_path) if file.endswith(".txt")]
+    anno_file_list = [os.path.join(anno_path, file) for file in sorted(os.listdir(anno_path)) if file.endswith(".txt")]
     
     if not os.path.exists(save_path):
         os.makedirs(save_path)
@@ -75,59 +38,123 @@ def show_image(image_path, anno_path, save_path, plot_image=False):
 
     category_id = dict((k, v.strip()) for k, v in enumerate(classes))
 
-    for txt_file in tqdm(anno_file_list):
-        if not txt_file.endswith('.txt') or 'classes' in txt_file:
-            continue
-        filename = txt_file.split(os.sep)[-1][:-3] + "jpg"
+    # Match label files to images by stem, whatever the image extension
+    if image_index:
+        images = dict(load_image_index(image_path, index_path).stems)
+    else:
+        images = {os.path.splitext(i)[0]: i for i in os.listdir(image_path) if i != INDEX_NAME}
+
+    anno_file_list = [file for file in anno_file_list if 'classes' not in file]
+
+    # Labels of every file with a matching image are parsed in bulk up front (or taken from the label cache)
+    paired = [file for file in anno_file_list if os.path.splitext(os.path.basename(file))[0] in images]
+    labels = read_labels(anno_path, paired, label_cache, check_files)
+    for error in labels.errors:
+        print(f"WARNING: skipped malformed line {error}")
+    label_row = {file: i for i, file in enumerate(paired)}
+
+    sampled = bool(sample_per_class or sample_top)
+    if sampled:
+        # Class counts and colours come from the labels of every image with a
+        # matching image file; only the sampled images are decoded
+        label_classes = []
+        for txt_file in anno_file_list:
+            stem = os.path.splitext(os.path.basename(txt_file))[0]
+            image_set.add(images.get(stem, stem))
+            names = []
+            if stem in images:
+                names = [category_id[category] for category in labels.of(label_row[txt_file])[0].tolist()]
+                register_objects([[name] for name in names], category_set, every_class_num)
+            label_classes.append(names)
+        keep = stratified_sample(label_classes, sample_per_class, sample_top, seed)
+        anno_file_list = [anno_file_list[i] for i in keep]
+
+    params = write_params(quality)
+
+    def decode(txt_file):
+        """Read the image of one label file and its boxes; img is None if the image is missing"""
+        stem = os.path.splitext(os.path.basename(txt_file))[0]
+        filename = images.get(stem)
+        if filename is None:
+            return stem, None, None
+        if skip_existing and os.path.exists(os.path.join(save_path, filename)):
+            # Only the class names are needed to count an already rendered image
+            img, width, height = None, 1, 1
+        else:
+            # Boxes are denormalized by the decoded size, so they fit previews as they are
+            img, _ = read_image(os.path.join(image_path, filename), preview_size)
+            if img is None:
+                return filename, None, None
+            width = img.shape[1]
+            height = img.shape[0]
+
+        class_ids, boxes = labels.of(label_row[txt_file])
+        bboxes = boxops.denormalize(boxops.cxcywh2xyxy(boxes), width, height)
+        objects = [[category_id[category], *bbox] for category, bbox in zip(class_ids.tolist(), bboxes.tolist())]
+        return filename, img, objects
+
+    def register(txt_file, data):
+        filename, img, objects = data
         image_set.add(filename)
-        file_path = os.path.join(image_path, filename)
-        if not os.path.exists(file_path):
-            continue
-
-        img = cv2.imread(file_path)
-        if img is None:
-            continue
-        width = img.shape[1]
-        height = img.shape[0]
-
-        objects = []
-        with open(txt_file, 'r') as fid:
-            for line in fid.readlines():
-                line = line.strip().split()
-                category_name = category_id[int(line[0])]
-                bbox = xywhn2xyxy((line[1], line[2], line[3], line[4]), (width, height))
-                obj = [category_name, bbox]
-                objects.append(obj)
-
-        img = draw_box(img, objects)
-        res_path = os.path.join(save_path, filename)
-        cv2.imwrite(res_path, img)
-        
-    if plot_image:
-        plt.bar(range(len(every_class_num)), every_class_num.values(), align='center')
-        plt.xticks(range(len(every_class_num)), every_class_num.keys(), rotation=0)
-        for index, (i, v) in enumerate(every_class_num.items()):
-            plt.text(x=index, y=v, s=str(v), ha='center')
-        plt.xlabel('image class')
-        plt.ylabel('number of images')
-        plt.title('class distribution')
+        if objects is None:
+            return None
+        if sampled:
+            category_ids = [category_set[obj[0]] for obj in objects]
+        else:
+            category_ids = register_objects(objects, category_set, every_class_num)
+        return None if img is None else category_ids
 
-        res_path = os.path.join(save_path, '00000_class_distribution.png')
-        plt.savefig(res_path)
-        plt.show()
+    def draw(data, category_ids):
+        filename, img, objects = data
+        return filename, paint_box(img, objects, category_ids)
 
+    def encode(txt_file, drawn):
+        filename, img = drawn
+        cv2.imwrite(os.path.join(save_path, filename), img, params)
 
-if __name__ == '__main__':
+    # Images are decoded, drawn and encoded on thread pools; class counts are
+    # still taken on this thread, in file order
+    pipeline = render_pipeline(anno_file_list, decode, register, draw, encode,
+                               workers, draw_workers, encode_workers, queue_size)
+    for _ in tqdm(pipeline, total=len(anno_file_list)):
+        pass
+
+    if plot_image:
+        plot_class_distribution(every_class_num, save_path)
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('-ip', '--image-path', type=str, required=True, help='Path to the directory containing images')
     parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to the YOLO .txt annotations folder(with classes.txt)')
     parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the labeled images')
     parser.add_argument('-p', '--plot-image', action='store_true', help='Whether to save the statistical result as an image')
-    opt = parser.parse_args()
+    parser.add_argument('-x', '--image-index', action='store_true', help='Find images through a persistent index of the images folder (built on first use)')
+    parser.add_argument('-xp', '--index-path', type=str, default=None, help='Where to keep the image index (default: .imageindex.json in the images folder)')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='Number of threads decoding images')
+    parser.add_argument('-dw', '--draw-workers', type=int, default=2, help='Number of threads drawing boxes')
+    parser.add_argument('-ew', '--encode-workers', type=int, default=4, help='Number of threads encoding and writing images')
+    parser.add_argument('-qs', '--queue-size', type=int, default=32, help='Maximum number of images waiting in each stage')
+    parser.add_argument('-ps', '--preview-size', type=int, default=None, help='Write previews whose longer side is at most this many pixels')
+    parser.add_argument('-q', '--quality', type=int, default=None, help='JPEG/WebP quality of the written images')
+    parser.add_argument('-se', '--skip-existing', action='store_true', help='Do not render images whose output already exists')
+    parser.add_argument('-sc', '--sample-per-class', type=int, default=0, help='Only render a random sample of this many images per class')
+    parser.add_argument('-st', '--sample-top', type=int, default=0, help='Also render the images with the most boxes (this many)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for sampling')
+    parser.add_argument('-c', '--label-cache', action='store_true', help='Read labels from a packed cache next to classes.txt (built or refreshed as needed)')
+    parser.add_argument('--skip-file-check', action='store_true', help='With --label-cache, only check the labels folder, not the size and mtime of every label file (faster on large folders, but misses labels edited in place)')
+    opt = parser.parse_args(argv)
 
     print(opt)
-    show_image(opt.image_path, opt.anno_path, opt.save_path, opt.plot_image)
+    show_image(opt.image_path, opt.anno_path, opt.save_path, opt.plot_image, opt.image_index, opt.index_path,
+               opt.workers, opt.draw_workers, opt.encode_workers, opt.queue_size,
+               opt.preview_size, opt.quality, opt.skip_existing, opt.sample_per_class, opt.sample_top, opt.seed, opt.label_cache,
+               not opt.skip_file_check)
     print(every_class_num)
     print("category nums: {}".format(len(category_set)))
     print("image nums: {}".format(len(image_set)))
-    print("bbox nums: {}".format(sum(every_class_num.values())))
\ No newline at end of file
+    print("bbox nums: {}".format(sum(every_class_num.values())))
+
+
+if __name__ == '__main__':
+    main()
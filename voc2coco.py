@@ -1,15 +1,16 @@
-import xml.etree.ElementTree as ET
 import os
-import json
 from datetime import datetime
 import argparse
 from tqdm import tqdm  # Import tqdm for the progress bar
+from parallel import imap
+from cocowriter import open_coco_writer
+from cocoreader import coco_file_bytes
+from metrics import Metrics, report
+from vocxml import parse_voc
+from archiveinput import is_archive, iter_archive
 
-coco = dict()
-coco['images'] = []
-coco['type'] = 'instances'
-coco['annotations'] = []
-coco['categories'] = []
+coco = None  # CocoWriter (or ShardedCocoWriter) for the output being written
+category_items = []
 
 category_set = dict()
 image_set = set()
@@ -18,6 +19,17 @@ category_item_id = -1
 image_id = 000000
 annotation_id = 0
 
+def reset():
+    """Restore the module state, so parse can run more than once in a process"""
+    global coco, category_item_id, image_id, annotation_id
+    coco = None
+    category_items.clear()
+    category_set.clear()
+    image_set.clear()
+    category_item_id = -1
+    image_id = 0
+    annotation_id = 0
+
 def addCatItems(categories):
     global category_item_id
     category_ids = []
@@ -27,7 +39,7 @@ def addCatItems(categories):
         category_item_id += 1
         category_item['id'] = category_item_id
         category_item['name'] = category
-        coco['categories'].append(category_item)
+        category_items.append(category_item)
         category_set[category] = category_item_id
         category_ids.append(category_item_id)
 
@@ -51,7 +63,7 @@ def addImgItem(file_name, size):
     image_item['flickr_url'] = None
     image_item['coco_url'] = None
     image_item['date_captured'] = str(datetime.today())
-    coco['images'].append(image_item)
+    coco.add_image(image_item)
     image_set.add(file_name)
     return image_id
 
@@ -81,110 +93,106 @@ def addAnnoItem(object_name, image_id, category_id, bbox):
     annotation_item['ignore'] = 0
     annotation_item['image_id'] = image_id
     annotation_item['bbox'] = bbox
+    annotation_item['category_id'] = category_id
     annotation_id += 1
     annotation_item['id'] = annotation_id
-    coco['annotations'].append(annotation_item)
+    coco.add_annotation(annotation_item)
 
 def read_xml_files(xml_dir):
     xml_files = []
     if os.path.isdir(xml_dir):
-        xml_list = os.listdir(xml_dir)
+        xml_list = sorted(os.listdir(xml_dir))
         xml_files = [os.path.join(xml_dir, i) for i in xml_list if i.endswith('.xml')]
     return xml_files
 
-def parse(anno_path, save_path):
+def parse_xml_file(xml_file, data=None):
+    """Parse one VOC xml file into (file_name, size, objects) with objects as (name, [x, y, w, h])"""
+    file_name, (width, height, depth), objects = parse_voc(xml_file, data)
+    assert file_name is not None, "filename is not in the file"
+    if any(obj[0] is None for obj in objects):
+        raise Exception('xml structure broken at bndbox tag: object without name in {}'.format(xml_file))
+
+    size = {'width': width, 'height': height}
+    if depth is not None:
+        size['depth'] = depth
+    return file_name, size, [(name, [xmin, ymin, xmax - xmin, ymax - ymin]) for name, xmin, ymin, xmax, ymax in objects]
+
+def parse_xml_member(member):
+    """parse_xml_file for one (name, bytes) archive member"""
+    return parse_xml_file(*member)
+
+def parse(anno_path, save_path, workers=1, images_per_shard=None, metrics=None):
+    global coco
+    reset()
     assert os.path.exists(anno_path), "anno path:{} does not exist".format(anno_path)
-
-    xml_files_list = read_xml_files(anno_path)
-
-    # Gather categories dynamically from the XML files
-    categories = set()
-
-    for xml_file in tqdm(xml_files_list, desc="Reading XML Files", unit="file"):
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-
-        object_info = root.findall('object')
-        for object in object_info:
-            object_name = object.findtext('name')
-            categories.add(object_name)
-
-    # Mapping categories to indices
-    addCatItems(list(categories))
-    
-    for xml_file in tqdm(xml_files_list, desc="Processing Annotations", unit="file"):
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-
-        size = dict()
-        size['width'] = None
-        size['height'] = None
-
-        if root.tag != 'annotation':
-            raise Exception('pascal voc xml root element should be annotation, rather than {}'.format(root.tag))
-
-        file_name = root.findtext('filename')
-        assert file_name is not None, "filename is not in the file"
-
-        size_info = root.findall('size')
-        assert size_info is not None, "size is not in the file"
-        for subelem in size_info[0]:
-            size[subelem.tag] = int(subelem.text)
-
-        if file_name is not None and size['width'] is not None and file_name not in image_set:
-            current_image_id = addImgItem(file_name, size)
-        elif file_name in image_set:
-            raise Exception('file_name duplicated')
-        else:
-            raise Exception("file name:{}\t size:{}".format(file_name, size))
-
-        object_info = root.findall('object')
-        if len(object_info) == 0:
-            continue
-
-        for object in object_info:
-            object_name = object.findtext('name')
-            current_category_id = category_set[object_name]
-
-            bndbox = dict()
-            bndbox['xmin'] = None
-            bndbox['xmax'] = None
-            bndbox['ymin'] = None
-            bndbox['ymax'] = None
-            # box:[xmin,ymin,xmax,ymax]
-            bndbox_info = object.findall('bndbox')
-            for box in bndbox_info[0]:
-                bndbox[box.tag] = int(box.text)
-
-            if bndbox['xmin'] is not None:
-                if object_name is None:
-                    raise Exception('xml structure broken at bndbox tag')
-                if current_category_id is None:
-                    raise Exception('xml structure broken at bndbox tag')
-                bbox = []
-                # x
-                bbox.append(bndbox['xmin'])
-                # y
-                bbox.append(bndbox['ymin'])
-                # w
-                bbox.append(bndbox['xmax'] - bndbox['xmin'])
-                # h
-                bbox.append(bndbox['ymax'] - bndbox['ymin'])
-                addAnnoItem(object_name, current_image_id, current_category_id, bbox)
+    metrics = metrics if metrics is not None else Metrics()
+
+    # An archive is read member by member in one pass, in archive order
+    if is_archive(anno_path):
+        members = metrics.timed('read', metrics.track_read(iter_archive(anno_path, ('.xml',))))
+        results = imap(parse_xml_member, members, workers)
+        total = None
+    else:
+        with metrics.stage('list'):
+            xml_files_list = read_xml_files(anno_path)
+            metrics.add_read(sum(os.path.getsize(xml_file) for xml_file in xml_files_list))
+        results = imap(parse_xml_file, xml_files_list, workers)
+        total = len(xml_files_list)
 
     json_parent_dir = os.path.dirname(save_path)
-    if not os.path.exists(json_parent_dir):
+    if json_parent_dir and not os.path.exists(json_parent_dir):
         os.makedirs(json_parent_dir)
-    json.dump(coco, open(save_path, 'w'))
-    print("class nums:{}".format(len(coco['categories'])))
-    print("image nums:{}".format(len(coco['images'])))
-    print("bbox nums:{}".format(len(coco['annotations'])))
 
-if __name__ == '__main__':
+    # Parse every XML file once and stream images and annotations to disk as they come.
+    # Category ids are only known after the pass, so annotations carry the category
+    # name until the writer maps it on close (full shards wait with their annotations
+    # spooled and are finished then, one at a time).
+    categories = set()
+    with open_coco_writer(save_path, images_per_shard) as coco:
+        for file_name, size, objects in tqdm(metrics.timed('parse', results), total=total, desc="Processing Annotations", unit="file"):
+            with metrics.stage('write'):
+                if file_name is not None and size['width'] is not None and file_name not in image_set:
+                    current_image_id = addImgItem(file_name, size)
+                elif file_name in image_set:
+                    raise Exception('file_name duplicated')
+                else:
+                    raise Exception("file name:{}\t size:{}".format(file_name, size))
+
+                for object_name, bbox in objects:
+                    categories.add(object_name)
+                    addAnnoItem(object_name, current_image_id, object_name, bbox)
+
+        # Category ids follow sorted names so repeated runs agree
+        with metrics.stage('write'):
+            addCatItems(sorted(categories))
+            coco.close(category_items, category_map=category_set)
+
+    metrics.add_written(coco_file_bytes(save_path))
+    metrics.count('category_nums', coco.category_nums)
+    metrics.count('image_nums', coco.image_nums)
+    metrics.count('bbox_nums', coco.annotation_nums)
+    print("class nums:{}".format(metrics.get('category_nums')))
+    print("image nums:{}".format(metrics.get('image_nums')))
+    print("bbox nums:{}".format(metrics.get('bbox_nums')))
+    if images_per_shard is not None:
+        print("shards:{}".format(len(coco.shards)))
+    return metrics
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to VOC .xml annotations folder')
-    parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the generated COCO .json annotation file')
-    opt = parser.parse_args()
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to VOC .xml annotations folder, or a tar/zip archive of it')
+    parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the generated COCO .json annotation file (the shard manifest with --images-per-shard)')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes for parsing (0 uses all CPUs)')
+    parser.add_argument('-is', '--images-per-shard', type=int, default=None, help='Split the output into COCO files of this many images, listed in a manifest at the save path')
+    parser.add_argument('-m', '--metrics', type=str, default=None, help='Write stage times, counts, bytes read and written and peak memory to this .json file')
+    parser.add_argument('--trace', type=str, default=None, help='Write the stage calls to this .json file as a Chrome trace')
+    parser.add_argument('--trace-memory', action='store_true', help='Track the peak Python memory with tracemalloc (slows the run down)')
+    opt = parser.parse_args(argv)
 
     print(opt)
-    parse(opt.anno_path, opt.save_path)
\ No newline at end of file
+    metrics = Metrics(opt.trace_memory, opt.trace is not None)
+    parse(opt.anno_path, opt.save_path, opt.workers, opt.images_per_shard, metrics)
+    report(metrics, opt.metrics, opt.trace)
+
+if __name__ == '__main__':
+    main()
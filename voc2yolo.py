@@ -1,78 +1,134 @@
 import os
 import argparse
-from lxml import etree
+from functools import partial
 from tqdm import tqdm
+from parallel import imap
+import boxops
+from vocxml import parse_voc
+from archiveinput import is_archive, iter_archive
+from manifest import Manifest, file_fingerprint
+from shardwriter import SHARD_FORMATS, open_shards
+from writepool import write_behind, write_file
+from metrics import Metrics, report
 
 image_set = set()
-bbox_nums = 0
-total_files = 0  # Track the total number of files processed
 categories_set = set()
 
-def parse_xml_to_dict(xml):
-    if len(xml) == 0:
-        return {xml.tag: xml.text}
+def reset():
+    """Empty the module state, so parse can run more than once in a process"""
+    image_set.clear()
+    categories_set.clear()
 
-    result = {}
-    for child in xml:
-        child_result = parse_xml_to_dict(child)
-        if child.tag != 'object':
-            result[child.tag] = child_result[child.tag]
-        else:
-            if child.tag not in result:
-                result[child.tag] = []
-            result[child.tag].append(child_result[child.tag])
-    return {xml.tag: result}
-
-def xyxy2xywhn(bbox, size):
-    bbox = list(map(float, bbox))
-    size = list(map(float, size))
-    xc = (bbox[0] + (bbox[2] - bbox[0]) / 2.) / size[0]
-    yc = (bbox[1] + (bbox[3] - bbox[1]) / 2.) / size[1]
-    wn = (bbox[2] - bbox[0]) / size[0]
-    hn = (bbox[3] - bbox[1]) / size[1]
-    return (xc, yc, wn, hn)
-
-def parser_info(info: dict, class_indices):
-    filename = info['annotation']['filename']
-    image_set.add(filename)
-    objects = []
-    width = int(info['annotation']['size']['width'])
-    height = int(info['annotation']['size']['height'])
-    for obj in info['annotation']['object']:
-        obj_name = obj['name']
-        xmin = int(obj['bndbox']['xmin'])
-        ymin = int(obj['bndbox']['ymin'])
-        xmax = int(obj['bndbox']['xmax'])
-        ymax = int(obj['bndbox']['ymax'])
-        bbox = xyxy2xywhn((xmin, ymin, xmax, ymax), (width, height))
-        if class_indices is not None:
-            obj_category = class_indices[obj_name]
-            object = [obj_category, bbox]
-            objects.append(object)
-            categories_set.add(obj_name)
+def parser_info(info):
+    filename, (width, height, _), objs = info
+    names = [obj[0] for obj in objs]
+    # Convert all boxes of the file to normalized (xc, yc, w, h) at once
+    boxes = boxops.normalize(boxops.xyxy2cxcywh([obj[1:] for obj in objs]), width, height)
+    objects = list(zip(names, boxes.tolist()))
 
     return filename, objects
 
-def parse(voc_dir, save_dir):
-    global total_files, bbox_nums
+def read_xml(xml_file):
+    return parser_info(parse_voc(xml_file))
+
+def read_xml_member(member):
+    """(member name, read_xml result) for one (name, bytes) archive member"""
+    name, data = member
+    return name, parser_info(parse_voc(name, data))
+
+def txt_name(filename):
+    return "{}.txt".format(filename.split(".")[0])
 
+def txt_file(save_dir, class_indices, item):
+    """(path, content, None) of the .txt file for one image, for write_behind"""
+    filename, objects = item
+    content = "".join("{} {:.5f} {:.5f} {:.5f} {:.5f}\n".format(class_indices[obj_name], bbox[0], bbox[1], bbox[2], bbox[3])
+                      for obj_name, bbox in objects)
+    return os.path.join(save_dir, txt_name(filename)), content, None
+
+def save_anno_to_txt(save_dir, class_indices, item):
+    path, content, _ = txt_file(save_dir, class_indices, item)
+    write_file(path, content)
+
+def parse(voc_dir, save_dir, workers=1, incremental=False, content_hash=False, write_threads=4, write_queue=64,
+          shard_format=None, shard_size=None, shard_images=None, metrics=None):
+    reset()
     assert os.path.exists(voc_dir), "ERROR: {} does not exist".format(voc_dir)
+    metrics = metrics if metrics is not None else Metrics()
     if not os.path.exists(save_dir):
         os.makedirs(save_dir)
 
-    xml_files = [os.path.join(voc_dir, i) for i in os.listdir(voc_dir) if os.path.splitext(i)[-1] == '.xml']
-
-    # Automatically gather categories from XML files
-    categories = set()
-    for xml_file in xml_files:
-        with open(xml_file) as fid:
-            xml_str = fid.read()
-        xml = etree.fromstring(xml_str)
-        info_dict = parse_xml_to_dict(xml)
-        for obj in info_dict['annotation']['object']:
-            categories.add(obj['name'])
-
-    categories = list(categories)
+    with metrics.stage('list'):
+        archive = is_archive(voc_dir)
+        assert not (archive and incremental), "ERROR: --incremental needs an annotations folder, not an archive"
+        if archive:
+            xml_files = []
+        else:
+            xml_files = [os.path.join(voc_dir, i) for i in sorted(os.listdir(voc_dir)) if os.path.splitext(i)[-1] == '.xml']
+
+        # With incremental, xml files unchanged since the last run are not parsed again:
+        # their image name and object names come from the manifest and their .txt is kept
+        manifest = Manifest(save_dir, {'tool': 'voc2yolo', 'content_hash': content_hash}) if incremental else None
+        fingerprints = dict()
+        cached = []
+        to_parse = xml_files
+        if manifest is not None:
+            to_parse = []
+            for xml_file in xml_files:
+                key = os.path.basename(xml_file)
+                fingerprints[key] = file_fingerprint(xml_file, content_hash)
+                if manifest.is_current(key, fingerprints[key]):
+                    cached.append(xml_file)
+                else:
+                    to_parse.append(xml_file)
+        metrics.add_read(sum(os.path.getsize(xml_file) for xml_file in to_parse))
+
+    # Parse every XML file once and gather categories on the way
+    parsed = []
+
+    def gather(results, total):
+        for xml_file, (filename, objects) in tqdm(results, total=total, desc="Processing XML Files", unit="file"):
+            image_set.add(filename)
+            for obj_name, _ in objects:
+                categories_set.add(obj_name)
+            if len(objects) != 0:
+                metrics.count('bbox_nums', len(objects))
+                metrics.count('image_nums')
+                parsed.append((filename, objects))
+            if manifest is not None:
+                outputs = [txt_name(filename)] if objects else []
+                manifest.record(os.path.basename(xml_file), fingerprints[os.path.basename(xml_file)], outputs,
+                                filename=filename, names=[obj_name for obj_name, _ in objects])
+
+    if archive:
+        # Members are parsed as the archive is read, in one pass
+        members = metrics.timed('read', metrics.track_read(iter_archive(voc_dir, ('.xml',))))
+        gather(metrics.timed('parse', imap(read_xml_member, members, workers)), None)
+    else:
+        gather(zip(to_parse, metrics.timed('parse', imap(read_xml, to_parse, workers))), len(to_parse))
+    for xml_file in cached:
+        entry = manifest.entries[os.path.basename(xml_file)]
+        image_set.add(entry['filename'])
+        categories_set.update(entry['names'])
+        if entry['names']:
+            metrics.count('bbox_nums', len(entry['names']))
+            metrics.count('image_nums')
+
+    # Sorted so classes.txt and the class indices are stable between runs
+    categories = sorted(categories_set)
+
+    # A changed category list shifts class indices, so cached files must be rewritten too
+    if manifest is not None:
+        if cached and manifest.previous_meta.get('categories') != categories:
+            for xml_file in cached:
+                entry = manifest.entries[os.path.basename(xml_file)]
+                if entry['names']:
+                    metrics.count('bbox_nums', -len(entry['names']))
+                    metrics.count('image_nums', -1)
+            metrics.add_read(sum(os.path.getsize(xml_file) for xml_file in cached))
+            gather(zip(cached, metrics.timed('parse', imap(read_xml, cached, workers))), len(cached))
+            cached = []
+        manifest.meta['categories'] = categories
 
     # Save the class names in classes.txt
     with open(os.path.join(save_dir, "classes.txt"), 'w') as classes_file:
@@ -81,31 +137,52 @@ def parse(voc_dir, save_dir):
 
     class_indices = dict((v, k) for k, v in enumerate(categories))
 
-    xml_files = tqdm(xml_files, desc="Processing XML Files", unit="file")
-    for xml_file in xml_files:
-        with open(xml_file) as fid:
-            xml_str = fid.read()
-        xml = etree.fromstring(xml_str)
-        info_dict = parse_xml_to_dict(xml)
-        filename, objects = parser_info(info_dict, class_indices=class_indices)
-        if len(objects) != 0:
-            bbox_nums += len(objects)
-            total_files += 1
-            with open(os.path.join(save_dir, "{}.txt".format(filename.split(".")[0])), 'w') as f:
-                for obj in objects:
-                    f.write(
-                        "{} {:.5f} {:.5f} {:.5f} {:.5f}\n".format(obj[0], obj[1][0], obj[1][1], obj[1][2], obj[1][3]))
+    # Files are written on background threads (or packed into shards); the progress
+    # bar counts completed writes
+    shards = open_shards(save_dir, shard_format, shard_size, shard_images)
+    assert shards is None or manifest is None, "ERROR: --incremental does not work with --shards"
+    files = metrics.timed('transform', imap(partial(txt_file, save_dir, class_indices), parsed, workers))
+    written = write_behind(metrics.track_written(files), write_threads, write_queue, shards)
+    for _ in tqdm(metrics.timed('write', written), total=len(parsed), desc="Writing TXT Files", unit="file"):
+        pass
+    if shards is not None:
+        shards.close()
+        print(f"shards: {len(shards.shards)}")
+
+    if manifest is not None:
+        removed = manifest.remove_stale()
+        manifest.save()
+        print(f"unchanged: {len(cached)}, removed: {removed}")
 
     # Output the statistics
-    print(f"class nums: {len(categories)}")
-    print(f"image nums: {total_files}")
-    print(f"bbox nums: {bbox_nums}")
+    metrics.count('category_nums', len(categories))
+    print(f"class nums: {metrics.get('category_nums')}")
+    print(f"image nums: {metrics.get('image_nums')}")
+    print(f"bbox nums: {metrics.get('bbox_nums')}")
+    return metrics
 
-if __name__ == '__main__':
+def main(argv=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to VOC .xml annotations folder')
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to VOC .xml annotations folder, or a tar/zip archive of it')
     parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the generated YOLO .txt annotations folder(with classes.txt)')
-    opt = parser.parse_args()
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes for parsing and writing (0 uses all CPUs)')
+    parser.add_argument('-i', '--incremental', action='store_true', help='Only re-parse and rewrite xml files that changed since the last run')
+    parser.add_argument('--content-hash', action='store_true', help='Detect changed inputs by content hash instead of size and mtime')
+    parser.add_argument('-wt', '--write-threads', type=int, default=4, help='Number of threads writing output files (0 writes them inline)')
+    parser.add_argument('-wq', '--write-queue', type=int, default=64, help='Maximum number of output files waiting to be written')
+    parser.add_argument('-sh', '--shards', type=str, default=None, choices=SHARD_FORMATS, help='Pack the output files into tar or zip shards (indexed in shards.json) instead of writing one file each')
+    parser.add_argument('-ss', '--shard-size', type=float, default=1024, help='Maximum size of one shard in MiB')
+    parser.add_argument('-si', '--shard-images', type=str, default=None, help='Images folder; pack each image next to its label in the same shard (WebDataset layout)')
+    parser.add_argument('-m', '--metrics', type=str, default=None, help='Write stage times, counts, bytes read and written and peak memory to this .json file')
+    parser.add_argument('--trace', type=str, default=None, help='Write the stage calls to this .json file as a Chrome trace')
+    parser.add_argument('--trace-memory', action='store_true', help='Track the peak Python memory with tracemalloc (slows the run down)')
+    opt = parser.parse_args(argv)
 
     print(opt)
-    parse(opt.anno_path, opt.save_path)
\ No newline at end of file
+    metrics = Metrics(opt.trace_memory, opt.trace is not None)
+    parse(opt.anno_path, opt.save_path, opt.workers, opt.incremental, opt.content_hash, opt.write_threads, opt.write_queue,
+          opt.shards, opt.shard_size, opt.shard_images, metrics)
+    report(metrics, opt.metrics, opt.trace)
+
+if __name__ == '__main__':
+    main()
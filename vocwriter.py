@@ -0,0 +1,78 @@
+import math
+import re
+
+# The layout lxml's pretty_print gives the trees coco2voc and yolo2voc used to build
+HEADER = ('<annotation>\n'
+          '  <folder>DATA</folder>\n'
+          '  <filename>{}</filename>\n'
+          '  <source>\n'
+          '    <database>The VOC Database</database>\n'
+          '    <annotation>PASCAL VOC</annotation>\n'
+          '    <image>flickr</image>\n'
+          '  </source>\n'
+          '  <size>\n'
+          '    <width>{}</width>\n'
+          '    <height>{}</height>\n'
+          '    <depth>{}</depth>\n'
+          '  </size>\n'
+          '  <segmented>0</segmented>\n')
+OBJECT = ('  <object>\n'
+          '    <name>{}</name>\n'
+          '    <pose>Unspecified</pose>\n'
+          '    <truncated>0</truncated>\n'
+          '    <difficult>0</difficult>\n'
+          '    <bndbox>\n'
+          '      <xmin>{}</xmin>\n'
+          '      <ymin>{}</ymin>\n'
+          '      <xmax>{}</xmax>\n'
+          '      <ymax>{}</ymax>\n'
+          '    </bndbox>\n'
+          '  </object>\n')
+FOOTER = '</annotation>\n'
+
+# Control characters XML 1.0 cannot hold; lxml refuses them too
+_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def xml_text(value):
+    """Text of one element as lxml.objectify writes it, escaped for the template.
+
+    Numbers and booleans are formatted the way objectify does; &, < and > are
+    escaped and \\r and non-ASCII characters become character references, as
+    lxml does when writing without an encoding.
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return 'INF' if value > 0 else '-INF'
+        return repr(value)
+    if isinstance(value, bytes):
+        value = value.decode()
+    text = str(value)
+    if _INVALID.search(text):
+        raise ValueError(f"All strings must be XML compatible, got {text!r}")
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\r', '&#13;')
+    if not text.isascii():
+        text = text.encode('ascii', 'xmlcharrefreplace').decode('ascii')
+    return text
+
+
+def render_voc(filename, width, height, depth, objects):
+    """VOC xml document for one image as bytes; objects are (name, xmin, ymin, xmax, ymax)"""
+    parts = [HEADER.format(xml_text(filename), xml_text(width), xml_text(height), xml_text(depth))]
+    for obj in objects:
+        parts.append(OBJECT.format(*map(xml_text, obj)))
+    parts.append(FOOTER)
+    return ''.join(parts).encode('ascii')
+
+
+def write_voc(anno_path, filename, width, height, depth, objects):
+    """Write the VOC xml file for one image to anno_path"""
+    data = render_voc(filename, width, height, depth, objects)
+    with open(anno_path, 'wb') as f:
+        f.write(data)
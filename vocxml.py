@@ -0,0 +1,54 @@
+import xml.etree.ElementTree as ET
+
+BOX_KEYS = ('xmin', 'ymin', 'xmax', 'ymax')
+
+
+def to_int(text):
+    """int() of a coordinate or size field, accepting values written as floats ("12.0")"""
+    try:
+        return int(text)
+    except ValueError:
+        return int(float(text))
+
+
+def parse_voc(xml_file, data=None, boxes=True):
+    """Read the fields the converters use from one VOC xml file.
+
+    Returns (filename, size, objects): size is (width, height, depth) with None
+    for missing fields, objects is a list of (name, xmin, ymin, xmax, ymax).
+    Objects without a <bndbox>, or whose <bndbox> misses a coordinate, are
+    skipped and a file without <object> gives an empty list. With boxes=False
+    the coordinates are not read at all and objects are (name,) tuples of every
+    object with a <bndbox>, which is all statistics need.
+
+    The file is parsed by the C expat parser and only the needed elements are
+    looked up; building per-element Python callbacks (iterparse) or nested
+    dicts is slower for files of this size. data is the file's contents if
+    they were already read (e.g. from an archive).
+    """
+    if data is None:
+        with open(xml_file, 'rb') as f:
+            data = f.read()
+    root = ET.fromstring(data)
+    if root.tag != 'annotation':
+        raise ValueError('pascal voc xml root element should be annotation, rather than {}'.format(root.tag))
+
+    size = (None, None, None)
+    size_info = root.find('size')
+    if size_info is not None:
+        size = tuple(None if text is None else to_int(text)
+                     for text in (size_info.findtext('width'), size_info.findtext('height'), size_info.findtext('depth')))
+
+    objects = []
+    for obj in root.iterfind('object'):
+        bndbox = obj.find('bndbox')
+        if bndbox is None:
+            continue
+        if not boxes:
+            objects.append((obj.findtext('name'),))
+            continue
+        coords = [bndbox.findtext(key) for key in BOX_KEYS]
+        if None in coords:
+            continue
+        objects.append((obj.findtext('name'),) + tuple(to_int(text) for text in coords))
+    return root.findtext('filename'), size, objects
@@ -0,0 +1,57 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def write_file(path, data):
+    """Write str (in text mode) or bytes to path"""
+    with open(path, 'wb' if isinstance(data, bytes) else 'w') as f:
+        f.write(data)
+
+
+def write_behind(files, threads=4, queue_size=64, sink=None):
+    """Write (path, data, tag) files on background threads, yielding each tag once its file is written.
+
+    The caller keeps producing files (parsing, converting) while earlier ones are
+    being opened, written and closed, which is what costs the most on network
+    file systems. At most queue_size files are in flight; when the queue is full
+    the caller waits for the oldest. Tags come back in input order, so a progress
+    bar over this generator counts completed writes. An exception raised while
+    writing a file is re-raised here, on the caller's thread, and the files not
+    started yet are dropped. A None path yields its tag without writing anything;
+    with threads=0 every file is written inline.
+
+    With a sink (e.g. a ShardWriter) files go to sink.write(path, data) instead,
+    on a single background thread so they reach it in input order.
+    """
+    write = write_file
+    if sink is not None:
+        write = sink.write
+        threads = min(threads, 1)
+    if threads <= 0:
+        for path, data, tag in files:
+            if path is not None:
+                write(path, data)
+            yield tag
+        return
+
+    pending = deque()
+    with ThreadPoolExecutor(threads) as pool:
+        try:
+            for path, data, tag in files:
+                future = pool.submit(write, path, data) if path is not None else None
+                pending.append((future, tag))
+                # Hand back whatever is already written, and wait only when the queue is full
+                while pending and (len(pending) >= queue_size or pending[0][0] is None or pending[0][0].done()):
+                    future, tag = pending.popleft()
+                    if future is not None:
+                        future.result()
+                    yield tag
+            while pending:
+                future, tag = pending.popleft()
+                if future is not None:
+                    future.result()
+                yield tag
+        finally:
+            for future, _ in pending:
+                if future is not None:
+                    future.cancel()
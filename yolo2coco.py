@@ -1,15 +1,20 @@
 import argparse
-import json
 import os
 from datetime import datetime
-import cv2
 from tqdm import tqdm
+from imagesize import get_image_shape
+from imageindex import load_image_index
+from parallel import imap
+from cocowriter import open_coco_writer
+from cocoreader import coco_file_bytes
+from metrics import Metrics, report
+import numpy as np
+import boxops
+from archiveinput import is_archive, iter_archive, member_basename
+from yololabels import BATCH_FILES, CACHE_NAME, load_label_files, parse_classes, read_classes, read_labels
 
-coco = dict()
-coco['images'] = []
-coco['type'] = 'instances'
-coco['annotations'] = []
-coco['categories'] = []
+coco = None  # CocoWriter (or ShardedCocoWriter) for the output being written
+category_items = []
 
 category_set = dict()
 image_set = set()
@@ -17,18 +22,30 @@ image_set = set()
 image_id = 0
 annotation_id = 0
 
+CHUNK_FILES = 4096  # label files whose boxes are converted to Python lists at a time
+
+def reset():
+    """Restore the module state, so parse can run more than once in a process"""
+    global coco, image_id, annotation_id
+    coco = None
+    category_items.clear()
+    category_set.clear()
+    image_set.clear()
+    image_id = 0
+    annotation_id = 0
+
 def addCatItem(category_dict):
-    """Add category items to the coco dictionary"""
+    """Add category items to the category table"""
     for k, v in category_dict.items():
         category_item = {
             'supercategory': 'none',
             'id': int(k),
             'name': v
         }
-        coco['categories'].append(category_item)
+        category_items.append(category_item)
 
 def addImgItem(file_name, size):
-    """Add image item to the coco dictionary"""
+    """Write an image item to the coco file"""
     global image_id
     image_id += 1
     image_item = {
@@ -41,12 +58,12 @@ def addImgItem(file_name, size):
         'coco_url': None,
         'date_captured': str(datetime.today())
     }
-    coco['images'].append(image_item)
+    coco.add_image(image_item)
     image_set.add(file_name)
     return image_id
 
-def addAnnoItem(object_name, image_id, category_id, bbox):
-    """Add annotation item to the coco dictionary"""
+def addAnnoItem(image_id, category_id, bbox):
+    """Write an annotation item to the coco file"""
     global annotation_id
     annotation_item = {
         'segmentation': [[
@@ -64,63 +81,173 @@ def addAnnoItem(object_name, image_id, category_id, bbox):
     }
     annotation_id += 1
     annotation_item['id'] = annotation_id
-    coco['annotations'].append(annotation_item)
-
-def xywhn2xywh(bbox, size):
-    """Convert normalized coordinates to absolute coordinates"""
-    bbox = list(map(float, bbox))
-    size = list(map(float, size))
-    xmin = (bbox[0] - bbox[2] / 2.) * size[1]
-    ymin = (bbox[1] - bbox[3] / 2.) * size[0]
-    w = bbox[2] * size[1]
-    h = bbox[3] * size[0]
-    return list(map(int, (xmin, ymin, w, h)))
-
-def parse(anno_path, save_path, image_path):
+    coco.add_annotation(annotation_item)
+
+def read_image_shape(item):
+    """Shape of the image of one (label file, image file, indexed shape) item"""
+    file, image_file, shape = item
+    if shape is None:
+        shape = get_image_shape(image_file)
+    return shape
+
+def iter_archive_chunks(anno_path, images, index, classes, metrics):
+    """Yield (items, labels) for batches of the label files of an archive, parsed as they are read.
+
+    Members come in archive order and only one batch is held in memory; the
+    class names are put into classes when classes.txt goes past.
+    """
+    members = metrics.timed('read', metrics.track_read(iter_archive(anno_path, ('.txt',))))
+    items, datas = [], []
+    for name, data in members:
+        base = member_basename(name)
+        if base == 'classes.txt':
+            classes.extend(parse_classes(data))
+            continue
+        filename = os.path.splitext(base)[0]
+        if filename in images:
+            items.append((base, images[filename], index.shape(filename) if index is not None else None))
+            datas.append(data)
+        if len(items) == BATCH_FILES:
+            with metrics.stage('parse'):
+                labels = load_label_files([file for file, _, _ in items], datas=datas)
+            yield items, labels
+            items, datas = [], []
+    if items:
+        with metrics.stage('parse'):
+            labels = load_label_files([file for file, _, _ in items], datas=datas)
+        yield items, labels
+
+def write_chunk(items, shapes, labels, first, last, metrics):
+    """Write images first..last-1 of items (rows of labels) and their boxes to coco"""
+    # Convert normalized coordinates to absolute coordinates for the boxes of the chunk
+    # at once; only this chunk is turned into Python lists for the writer
+    with metrics.stage('transform'):
+        widths = np.array([shape[1] if shape is not None else 0 for shape in shapes[first:last]], dtype=np.float64)
+        heights = np.array([shape[0] if shape is not None else 0 for shape in shapes[first:last]], dtype=np.float64)
+        lo, hi = labels.starts[first], labels.ends[last - 1]
+        file_index = labels.file_index[lo:hi] - first
+        bboxes = boxops.truncate(boxops.denormalize(boxops.cxcywh2xywh(labels.boxes[lo:hi]),
+                                                    widths[file_index], heights[file_index])).tolist()
+        class_ids = labels.class_ids[lo:hi].tolist()
+
+    for i in range(first, last):
+        if shapes[i] is None:
+            continue
+        with metrics.stage('write'):
+            current_image_id = addImgItem(os.path.basename(items[i][1]), shapes[i])
+            for j in range(labels.starts[i] - lo, labels.ends[i] - lo):
+                addAnnoItem(current_image_id, class_ids[j], bboxes[j])
+    return set(class_ids)
+
+def parse(anno_path, save_path, image_path, workers=1, image_index=False, index_path=None, label_cache=False,
+          images_per_shard=None, metrics=None, check_files=True):
     """Parse YOLO annotations and convert to COCO format"""
+    global coco
+    reset()
     assert os.path.exists(image_path), f"ERROR: {image_path} does not exist"
     assert os.path.exists(anno_path), f"ERROR: {anno_path} does not exist"
+    metrics = metrics if metrics is not None else Metrics()
 
-    # Read category names
-    with open(os.path.join(anno_path, 'classes.txt'), 'r') as f:
-        category_set = {k: v.strip() for k, v in enumerate(f.readlines())}
-    addCatItem(category_set)
+    # Read category names; those of an archive are only known once classes.txt has been read
+    archive = is_archive(anno_path)
+    if archive:
+        assert not label_cache, "ERROR: --label-cache needs an annotations folder, not an archive"
+        classes = []
+    else:
+        classes = read_classes(anno_path)
+        addCatItem(dict(enumerate(classes)))
 
-    # Get all image and annotation files
-    images = {os.path.splitext(i)[0]: os.path.join(image_path, i) for i in os.listdir(image_path)}
-    files = [os.path.join(anno_path, i) for i in os.listdir(anno_path) if i.endswith('.txt')]
+    with metrics.stage('list'):
+        # Get all image and annotation files; with image_index, image sizes come from the
+        # sidecar index instead of reading every image header again
+        index = None
+        if image_index:
+            index = load_image_index(image_path, index_path)
+            images = {stem: index.path(stem) for stem in index.stems}
+        else:
+            images = {os.path.splitext(i)[0]: os.path.join(image_path, i) for i in os.listdir(image_path)}
 
-    # Use tqdm for progress bar when processing annotation files
-    for file in tqdm(files, desc="Processing annotation files", ncols=100):
-        filename = os.path.splitext(os.path.basename(file))[0]
-        if filename in images:
-            img = cv2.imread(images[filename])
-            shape = img.shape
-            current_image_id = addImgItem(os.path.basename(images[filename]), shape)
+        # Only label files with a matching image are converted
+        items = []
+        if not archive:
+            files = [os.path.join(anno_path, i) for i in sorted(os.listdir(anno_path)) if i.endswith('.txt')]
+            for file in files:
+                filename = os.path.splitext(os.path.basename(file))[0]
+                if filename in images:
+                    items.append((file, images[filename], index.shape(filename) if index is not None else None))
+
+    # Label files of a folder are parsed in bulk (or taken from the label cache); malformed lines are reported and skipped
+    if not archive:
+        with metrics.stage('parse'):
+            labels = read_labels(anno_path, [file for file, _, _ in items], label_cache, check_files)
+            if label_cache:
+                metrics.add_read(os.path.getsize(os.path.join(anno_path, CACHE_NAME)))
+            else:
+                metrics.add_read(sum(os.path.getsize(file) for file, _, _ in items))
+        for error in labels.errors:
+            print(f"WARNING: skipped malformed line {error}")
+        shapes = list(tqdm(metrics.timed('probe', imap(read_image_shape, items, workers)), total=len(items), desc="Reading image sizes", ncols=100))
+
+    # Ids are assigned here, in file order, so they do not depend on the worker count.
+    # Images and annotations are streamed to save_path as they are produced.
+    class_ids = set()
+    with open_coco_writer(save_path, images_per_shard, None if archive else category_items) as coco:
+        progress = tqdm(total=None if archive else len(items), desc="Processing annotation files", ncols=100)
+        if archive:
+            # An archive is converted batch by batch as it is read, in archive order
+            for items, labels in iter_archive_chunks(anno_path, images, index, classes, metrics):
+                for error in labels.errors:
+                    print(f"WARNING: skipped malformed line {error}")
+                shapes = list(metrics.timed('probe', imap(read_image_shape, items, workers)))
+                class_ids |= write_chunk(items, shapes, labels, 0, len(items), metrics)
+                progress.update(len(items))
         else:
-            continue
-        
-        with open(file, 'r') as fid:
-            for line in fid.readlines():
-                category, x_center, y_center, w, h = map(float, line.strip().split())
-                category_id = int(category)
-                category_name = category_set[category_id]
-                bbox = xywhn2xywh((x_center, y_center, w, h), shape)
-                addAnnoItem(category_name, current_image_id, category_id, bbox)
-
-    # Save COCO format data
-    with open(save_path, 'w') as json_file:
-        json.dump(coco, json_file)
-    print(f"class nums: {len(coco['categories'])}")
-    print(f"image nums: {len(coco['images'])}")
-    print(f"bbox nums: {len(coco['annotations'])}")
+            for first in range(0, len(items), CHUNK_FILES):
+                last = min(first + CHUNK_FILES, len(items))
+                class_ids |= write_chunk(items, shapes, labels, first, last, metrics)
+                progress.update(last - first)
+        progress.close()
 
-if __name__ == '__main__':
+        assert classes or not archive, f"ERROR: no classes.txt in {anno_path}"
+        unknown = sorted(class_id for class_id in class_ids if not 0 <= class_id < len(classes))
+        assert not unknown, f"ERROR: class ids {unknown} are not in classes.txt"
+        if archive:
+            addCatItem(dict(enumerate(classes)))
+        with metrics.stage('write'):
+            coco.close(category_items)
+
+    metrics.add_written(coco_file_bytes(save_path))
+    metrics.count('category_nums', coco.category_nums)
+    metrics.count('image_nums', coco.image_nums)
+    metrics.count('bbox_nums', coco.annotation_nums)
+    print(f"class nums: {metrics.get('category_nums')}")
+    print(f"image nums: {metrics.get('image_nums')}")
+    print(f"bbox nums: {metrics.get('bbox_nums')}")
+    if images_per_shard is not None:
+        print(f"shards: {len(coco.shards)}")
+    return metrics
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to YOLO .txt annotations folder(with classes.txt)')
-    parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the generated COCO .json annotation file')
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to YOLO .txt annotations folder(with classes.txt), or a tar/zip archive of it')
+    parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the generated COCO .json annotation file (the shard manifest with --images-per-shard)')
     parser.add_argument('-ip', '--img-path', type=str, required=True, help='Path to YOLO images folder')
-    opt = parser.parse_args()
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes for reading labels (0 uses all CPUs)')
+    parser.add_argument('-x', '--image-index', action='store_true', help='Take image sizes from a persistent index of the images folder (built on first use)')
+    parser.add_argument('-xp', '--index-path', type=str, default=None, help='Where to keep the image index (default: .imageindex.json in the images folder)')
+    parser.add_argument('-c', '--label-cache', action='store_true', help='Read labels from a packed cache next to classes.txt (built or refreshed as needed)')
+    parser.add_argument('--skip-file-check', action='store_true', help='With --label-cache, only check the labels folder, not the size and mtime of every label file (faster on large folders, but misses labels edited in place)')
+    parser.add_argument('-is', '--images-per-shard', type=int, default=None, help='Split the output into COCO files of this many images, listed in a manifest at the save path')
+    parser.add_argument('-m', '--metrics', type=str, default=None, help='Write stage times, counts, bytes read and written and peak memory to this .json file')
+    parser.add_argument('--trace', type=str, default=None, help='Write the stage calls to this .json file as a Chrome trace')
+    parser.add_argument('--trace-memory', action='store_true', help='Track the peak Python memory with tracemalloc (slows the run down)')
+    opt = parser.parse_args(argv)
 
     print(opt)
-    parse(opt.anno_path, opt.save_path, opt.img_path)
\ No newline at end of file
+    metrics = Metrics(opt.trace_memory, opt.trace is not None)
+    parse(opt.anno_path, opt.save_path, opt.img_path, opt.workers, opt.image_index, opt.index_path, opt.label_cache,
+          opt.images_per_shard, metrics, not opt.skip_file_check)
+    report(metrics, opt.metrics, opt.trace)
+
+if __name__ == '__main__':
+    main()
@@ -1,68 +1,51 @@
 import argparse
 import os
-import cv2
-from lxml import etree, objectify
+from functools import partial
 from tqdm import tqdm
-
-# Global variables
-images_nums = 0
-category_nums = 0
-bbox_nums = 0
+from imagesize import get_image_shape
+from imageindex import INDEX_NAME, load_image_index
+from parallel import imap
+import boxops
+from manifest import Manifest, file_fingerprint
+from vocwriter import render_voc, write_voc
+from shardwriter import SHARD_FORMATS, open_shards
+from writepool import write_behind
+from yololabels import CACHE_NAME, read_labels
+from metrics import Metrics, report
 
 def save_anno_to_xml(filename, size, objs, save_path):
-    """Save the annotation information to XML format"""
-    E = objectify.ElementMaker(annotate=False)
-    anno_tree = E.annotation(
-        E.folder("DATA"),
-        E.filename(filename),
-        E.source(
-            E.database("The VOC Database"),
-            E.annotation("PASCAL VOC"),
-            E.image("flickr")
-        ),
-        E.size(
-            E.width(size[1]),
-            E.height(size[0]),
-            E.depth(size[2])
-        ),
-        E.segmented(0)
-    )
-    for obj in objs:
-        anno_tree.append(
-            E.object(
-                E.name(obj[0]),
-                E.pose("Unspecified"),
-                E.truncated(0),
-                E.difficult(0),
-                E.bndbox(
-                    E.xmin(obj[1][0]),
-                    E.ymin(obj[1][1]),
-                    E.xmax(obj[1][2]),
-                    E.ymax(obj[1][3])
-                )
-            )
-        )
-    anno_path = os.path.join(save_path, filename[:-3] + "xml")
-    etree.ElementTree(anno_tree).write(anno_path, pretty_print=True)
-
-def xywhn2xyxy(bbox, size):
-    """Convert YOLO bbox (xywhn) to (xyxy) format"""
-    bbox = list(map(float, bbox))
-    size = list(map(float, size))
-    xmin = (bbox[0] - bbox[2] / 2.) * size[1]
-    ymin = (bbox[1] - bbox[3] / 2.) * size[0]
-    xmax = (bbox[0] + bbox[2] / 2.) * size[1]
-    ymax = (bbox[1] + bbox[3] / 2.) * size[0]
-    return [int(xmin), int(ymin), int(xmax), int(ymax)]
-
-def parse(anno_path, save_path, image_path):
+    """Save the annotation information to XML format; objs are [name, [xmin, ymin, xmax, ymax]]"""
+    anno_path = os.path.join(save_path, os.path.splitext(filename)[0] + ".xml")
+    write_voc(anno_path, filename, size[1], size[0], size[2], [[obj[0]] + list(obj[1]) for obj in objs])
+
+def convert_label_file(save_path, category_id, item):
+    """Render the VOC xml file of one image from its parsed YOLO labels.
+
+    Returns (path, xml, box count) for write_behind, with a None path if the image is unreadable.
+    """
+    img_path, shape, class_ids, boxes = item
+    if shape is None:
+        shape = get_image_shape(img_path)  # Get image shape (height, width, channels)
+    if shape is None:
+        return None, None, 0
+
+    # Convert YOLO bbox (xywhn) to (xyxy) format for the whole file at once
+    boxes = boxops.truncate(boxops.denormalize(boxops.cxcywh2xyxy(boxes), shape[1], shape[0]))
+    objects = [[category_id[category]] + bbox for category, bbox in zip(class_ids.tolist(), boxes.tolist())]
+
+    filename = os.path.basename(img_path)
+    anno_path = os.path.join(save_path, os.path.splitext(filename)[0] + ".xml")
+    return anno_path, render_voc(filename, shape[1], shape[0], shape[2], objects), len(objects)
+
+def parse(anno_path, save_path, image_path, workers=1, incremental=False, content_hash=False, image_index=False, index_path=None, label_cache=False,
+          write_threads=4, write_queue=64, shard_format=None, shard_size=None, shard_images=None, metrics=None,
+          check_files=True):
     """Parse YOLO annotation files and save to VOC XML format"""
-    global images_nums, category_nums, bbox_nums
-    
     # Check if the provided paths exist
     assert os.path.exists(image_path), f"ERROR: {image_path} does not exist"
     assert os.path.exists(anno_path), f"ERROR: {anno_path} does not exist"
-    
+    metrics = metrics if metrics is not None else Metrics()
+
     if not os.path.exists(save_path):
         os.makedirs(save_path)
 
@@ -70,59 +53,119 @@ def parse(anno_path, save_path, image_path):
     category_set = []
     with open(os.path.join(anno_path, 'classes.txt'), 'r') as f:
         category_set = [line.strip() for line in f.readlines()]
-    category_nums = len(category_set)
+    metrics.count('category_nums', len(category_set))
     category_id = {k: v for k, v in enumerate(category_set)}
 
-    # Prepare image and annotation file lists
-    images = [os.path.join(image_path, img) for img in os.listdir(image_path)]
-    image_index = {os.path.splitext(os.path.basename(img))[0]: img for img in images}
-    files = [os.path.join(anno_path, f) for f in os.listdir(anno_path) if f.endswith('.txt')]
-
-    images_nums = len(images)
-
-    # Iterate through each annotation file with a progress bar
-    for file in tqdm(files, desc="Processing annotations", ncols=100):
-        filename = os.path.splitext(os.path.basename(file))[0]
-        
-        # Skip if file is not an annotation file or is a class file
-        if 'classes' in filename or not file.endswith('.txt'):
-            continue
-
-        # Find corresponding image
-        if filename in image_index:
-            img_path = image_index[filename]
-            img = cv2.imread(img_path)
-            shape = img.shape  # Get image shape (height, width, channels)
-        
+    with metrics.stage('list'):
+        # Prepare image and annotation file lists; with image_index, image sizes come from
+        # the sidecar index instead of reading every image header again
+        index = None
+        if image_index:
+            index = load_image_index(image_path, index_path)
+            images = [index.path(stem) for stem in index.stems]
+        else:
+            images = [os.path.join(image_path, img) for img in os.listdir(image_path) if img != INDEX_NAME]
+        image_index = {os.path.splitext(os.path.basename(img))[0]: img for img in images}
+        files = [os.path.join(anno_path, f) for f in sorted(os.listdir(anno_path)) if f.endswith('.txt')]
+
+        metrics.count('image_nums', len(images))
+
+        # Pair each annotation file with its image, skipping the class file
+        items = []
+        for file in files:
+            filename = os.path.splitext(os.path.basename(file))[0]
+            if 'classes' in filename:
+                continue
+            if filename in image_index:
+                items.append((file, image_index[filename], index.shape(filename) if index is not None else None))
+
+        # With incremental, pairs whose label file and image are unchanged since the last
+        # run keep their existing .xml file
+        manifest = None
+        skipped = 0
+        if incremental:
+            manifest = Manifest(save_path, {'tool': 'yolo2voc', 'content_hash': content_hash, 'classes': category_set})
+            fingerprints = dict()
+            todo = []
+            for file, img_path, shape in items:
+                key = os.path.basename(file)
+                fingerprints[key] = [file_fingerprint(file, content_hash), file_fingerprint(img_path, content_hash)]
+                if manifest.is_current(key, fingerprints[key]):
+                    metrics.count('bbox_nums', manifest.entries[key]['boxes'])
+                    skipped += 1
+                else:
+                    todo.append((file, img_path, shape))
+            items = todo
+
+    # Parse the remaining label files in bulk (or take them from the label cache); malformed lines are reported and skipped
+    with metrics.stage('parse'):
+        labels = read_labels(anno_path, [file for file, _, _ in items], label_cache, check_files)
+        if label_cache:
+            metrics.add_read(os.path.getsize(os.path.join(anno_path, CACHE_NAME)))
         else:
-            continue
-        
-        objects = []
-        with open(file, 'r') as fid:
-            for line in fid.readlines():
-                # Read and process each line (object information)
-                parts = line.strip().split()
-                category = int(parts[0])
-                category_name = category_id[category]
-                bbox = xywhn2xyxy(parts[1:], shape)
-                objects.append([category_name, bbox])
-
-        # Update bbox count and save annotations
-        bbox_nums += len(objects)
-        save_anno_to_xml(filename, shape, objects, save_path)
+            metrics.add_read(sum(os.path.getsize(file) for file, _, _ in items))
+    for error in labels.errors:
+        print(f"WARNING: skipped malformed line {error}")
+    jobs = ((img_path, shape) + labels.of(i) for i, (_, img_path, shape) in enumerate(items))
+
+    # Iterate through each annotation file with a progress bar; files are written on
+    # background threads (or packed into shards) and the bar counts completed writes
+    shards = open_shards(save_path, shard_format, shard_size, shard_images)
+    assert shards is None or manifest is None, "ERROR: --incremental does not work with --shards"
+    # Images without a size in the index are probed inside the conversion jobs, so probing is part of transform here
+    files = metrics.timed('transform', imap(partial(convert_label_file, save_path, category_id), jobs, workers))
+    written = metrics.timed('write', write_behind(metrics.track_written(files), write_threads, write_queue, shards))
+    for (file, img_path, _), count in tqdm(zip(items, written), total=len(items), desc="Processing annotations", ncols=100):
+        metrics.count('bbox_nums', count)
+        if manifest is not None:
+            key = os.path.basename(file)
+            xml_name = os.path.splitext(os.path.basename(img_path))[0] + ".xml"
+            manifest.record(key, fingerprints[key], [xml_name], boxes=count)
+
+    if shards is not None:
+        shards.close()
+        print(f'shards: {len(shards.shards)}')
+
+    if manifest is not None:
+        removed = manifest.remove_stale()
+        manifest.save()
+        print(f'unchanged: {skipped}, removed: {removed}')
 
     # Print final statistics
-    print(f'class nums: {category_nums}')
-    print(f'image nums: {images_nums}')
-    print(f'bbox nums: {bbox_nums}')
+    print(f"class nums: {metrics.get('category_nums')}")
+    print(f"image nums: {metrics.get('image_nums')}")
+    print(f"bbox nums: {metrics.get('bbox_nums')}")
+    return metrics
 
-if __name__ == '__main__':
+def main(argv=None):
     # Argument parsing
     parser = argparse.ArgumentParser()
     parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to YOLO .txt annotations folder(with classes.txt)')
     parser.add_argument('-sp', '--save-path', type=str, required=True, help='Path to save the generated VOC .xml annotations folder')
     parser.add_argument('-ip', '--img-path', type=str, required=True, help='Path to YOLO images folder')
-    opt = parser.parse_args()
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes for converting (0 uses all CPUs)')
+    parser.add_argument('-i', '--incremental', action='store_true', help='Only rewrite files whose label or image changed since the last run')
+    parser.add_argument('--content-hash', action='store_true', help='Detect changed inputs by content hash instead of size and mtime')
+    parser.add_argument('-x', '--image-index', action='store_true', help='Take image sizes from a persistent index of the images folder (built on first use)')
+    parser.add_argument('-xp', '--index-path', type=str, default=None, help='Where to keep the image index (default: .imageindex.json in the images folder)')
+    parser.add_argument('-c', '--label-cache', action='store_true', help='Read labels from a packed cache next to classes.txt (built or refreshed as needed)')
+    parser.add_argument('--skip-file-check', action='store_true', help='With --label-cache, only check the labels folder, not the size and mtime of every label file (faster on large folders, but misses labels edited in place)')
+    parser.add_argument('-wt', '--write-threads', type=int, default=4, help='Number of threads writing output files (0 writes them inline)')
+    parser.add_argument('-wq', '--write-queue', type=int, default=64, help='Maximum number of output files waiting to be written')
+    parser.add_argument('-sh', '--shards', type=str, default=None, choices=SHARD_FORMATS, help='Pack the output files into tar or zip shards (indexed in shards.json) instead of writing one file each')
+    parser.add_argument('-ss', '--shard-size', type=float, default=1024, help='Maximum size of one shard in MiB')
+    parser.add_argument('-si', '--shard-images', type=str, default=None, help='Images folder; pack each image next to its label in the same shard (WebDataset layout)')
+    parser.add_argument('-m', '--metrics', type=str, default=None, help='Write stage times, counts, bytes read and written and peak memory to this .json file')
+    parser.add_argument('--trace', type=str, default=None, help='Write the stage calls to this .json file as a Chrome trace')
+    parser.add_argument('--trace-memory', action='store_true', help='Track the peak Python memory with tracemalloc (slows the run down)')
+    opt = parser.parse_args(argv)
 
     print(opt)
-    parse(opt.anno_path, opt.save_path, opt.img_path)
\ No newline at end of file
+    metrics = Metrics(opt.trace_memory, opt.trace is not None)
+    parse(opt.anno_path, opt.save_path, opt.img_path, opt.workers, opt.incremental, opt.content_hash, opt.image_index, opt.index_path, opt.label_cache,
+          opt.write_threads, opt.write_queue, opt.shards, opt.shard_size, opt.shard_images, metrics,
+          not opt.skip_file_check)
+    report(metrics, opt.metrics, opt.trace)
+
+if __name__ == '__main__':
+    main()
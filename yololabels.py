@@ -0,0 +1,297 @@
+import argparse
+import hashlib
+import os
+import warnings
+
+import numpy as np
+
+from packedarrays import read_packed, update_packed, write_packed
+
+BATCH_FILES = 4096  # label files parsed per numpy batch
+FIELDS = 5  # class cx cy w h
+CACHE_NAME = '.labels.cache'
+CACHE_VERSION = 1
+
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[list(b' \t\n\r\x0b\x0c')] = True
+
+
+class YoloLabels:
+    """Labels of many YOLO .txt files in flat arrays.
+
+    - files: the label file paths, in load order
+    - line_counts: lines in each file (including blank and malformed ones)
+    - file_index, class_ids: file row and class id of every box
+    - boxes: float64 [N, 4] normalized (cx, cy, w, h)
+    - errors: "file:line: message" for every malformed line (those lines are skipped)
+    - error_rows: the file row of every error
+
+    Boxes are stored grouped by file, in file order.
+    """
+
+    def __init__(self, files, line_counts, file_index, class_ids, boxes, errors=(), error_rows=()):
+        self.files = list(files)
+        self.line_counts = np.asarray(line_counts, dtype=np.int64)
+        self.file_index = np.asarray(file_index, dtype=np.int64)
+        self.class_ids = np.asarray(class_ids, dtype=np.int64)
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.errors = list(errors)
+        self.error_rows = list(error_rows)
+        self.ends = np.searchsorted(self.file_index, np.arange(len(self.files)), side='right')
+        self.starts = np.concatenate(([0], self.ends[:-1])).astype(np.int64)
+
+    @property
+    def bbox_nums(self):
+        return len(self.class_ids)
+
+    def __len__(self):
+        return len(self.files)
+
+    def of(self, i):
+        """(class_ids, boxes) of file i"""
+        return self.class_ids[self.starts[i]:self.ends[i]], self.boxes[self.starts[i]:self.ends[i]]
+
+    def box_counts(self):
+        """Number of boxes in each file"""
+        return self.ends - self.starts
+
+    def subset(self, rows):
+        """YoloLabels of the files at rows, in that order"""
+        rows = np.asarray(rows, dtype=np.int64)
+        counts = self.box_counts()[rows]
+        first = np.cumsum(counts) - counts
+        boxes = np.repeat(self.starts[rows] - first, counts) + np.arange(counts.sum())
+        new_row = {row: i for i, row in enumerate(rows.tolist())}
+        errors = [(new_row[row], error) for row, error in zip(self.error_rows, self.errors) if row in new_row]
+        return YoloLabels([self.files[row] for row in rows.tolist()], self.line_counts[rows],
+                          np.repeat(np.arange(len(rows)), counts), self.class_ids[boxes], self.boxes[boxes],
+                          [error for _, error in errors], [row for row, _ in errors])
+
+
+def read_classes(anno_path):
+    """Class names from anno_path/classes.txt"""
+    with open(os.path.join(anno_path, 'classes.txt'), 'r') as f:
+        return [line.strip() for line in f.readlines()]
+
+
+def label_files(anno_path):
+    """Sorted label files of a YOLO annotation folder, without classes.txt"""
+    return [os.path.join(anno_path, i) for i in sorted(os.listdir(anno_path))
+            if i.endswith('.txt') and i != 'classes.txt']
+
+
+def _parse_lines_slow(files, datas, first_file):
+    """Line by line parse of one batch; used to locate errors when the fast path fails"""
+    file_index, rows, errors = [], [], []
+    for offset, (file, data) in enumerate(zip(files, datas)):
+        row = first_file + offset
+        for line_no, line in enumerate(data.split(b'\n')[:-1], 1):
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) < FIELDS:
+                errors.append((row, f"{file}:{line_no}: expected {FIELDS} fields, got {len(parts)}"))
+                continue
+            try:
+                values = [float(part) for part in parts[:FIELDS]]
+            except ValueError:
+                errors.append((row, f"{file}:{line_no}: not a number in {line.decode('latin-1').strip()!r}"))
+                continue
+            if not values[0].is_integer():
+                errors.append((row, f"{file}:{line_no}: class id {values[0]} is not an integer"))
+                continue
+            file_index.append(row)
+            rows.append(values)
+    return file_index, np.array(rows, dtype=np.float64).reshape(-1, FIELDS), errors
+
+
+def _parse_batch(files, datas, first_file):
+    """Parse one batch of label files (each ending with a newline) into (file_index, [N, 5] rows, [(row, error)])"""
+    lines_per_file = np.array([data.count(b'\n') for data in datas], dtype=np.int64)
+    buf = b''.join(datas)
+    if not buf:
+        return [], np.zeros((0, FIELDS)), []
+
+    # Locate every token and its line with array ops instead of splitting line by line
+    chars = np.frombuffer(buf, dtype=np.uint8)
+    space = _WHITESPACE[chars]
+    token_start = ~space
+    token_start[1:] &= space[:-1]
+    newlines = np.flatnonzero(chars == 10)
+    token_line = np.searchsorted(newlines, np.flatnonzero(token_start))
+    per_line = np.bincount(token_line, minlength=len(newlines))
+
+    # All numbers of the batch in one C-level pass; it stops at the first non-number
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', DeprecationWarning)
+            values = np.fromstring(buf.decode('latin-1'), sep=' ')
+    except (ValueError, DeprecationWarning):
+        values = None
+    if values is None or len(values) != len(token_line) or np.any(per_line[per_line > 0] < FIELDS):
+        return _parse_lines_slow(files, datas, first_file)
+
+    # Take the first 5 numbers of every non-blank line; extra fields are ignored
+    rows = per_line > 0
+    first = (np.cumsum(per_line) - per_line)[rows]
+    values = values[first[:, None] + np.arange(FIELDS)]
+    if not np.all(values[:, 0] == np.floor(values[:, 0])):
+        return _parse_lines_slow(files, datas, first_file)
+    file_of_line = np.repeat(np.arange(first_file, first_file + len(datas)), lines_per_file)
+    return file_of_line[rows], values, []
+
+
+def read_bytes(path):
+    """Whole file contents; plain os.read skips the buffering and decoding setup of open()"""
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        chunks = []
+        while True:
+            chunk = os.read(fd, 1 << 16)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+
+def load_label_files(files, batch_size=BATCH_FILES, datas=None):
+    """Read YOLO label files into a YoloLabels, parsing numbers batch by batch.
+
+    datas optionally holds the contents of every file (e.g. read from an archive)
+    so nothing is read from disk.
+    """
+    line_counts = []
+    file_index, rows, errors = [], [], []
+    for first in range(0, len(files), batch_size):
+        batch = files[first:first + batch_size]
+        batch_datas = []
+        for i, file in enumerate(batch, first):
+            data = read_bytes(file) if datas is None else datas[i]
+            if data and not data.endswith(b'\n'):
+                data += b'\n'
+            batch_datas.append(data)
+            line_counts.append(data.count(b'\n'))
+        index, values, batch_errors = _parse_batch(batch, batch_datas, first)
+        file_index.append(np.asarray(index, dtype=np.int64))
+        rows.append(values)
+        errors.extend(batch_errors)
+
+    rows = np.concatenate(rows) if rows else np.zeros((0, FIELDS))
+    file_index = np.concatenate(file_index) if file_index else np.zeros(0, dtype=np.int64)
+    return YoloLabels(files, line_counts, file_index, rows[:, 0].astype(np.int64), rows[:, 1:],
+                      [error for _, error in errors], [row for row, _ in errors])
+
+
+def parse_classes(data):
+    """Class names from the bytes of a classes.txt file (e.g. read from an archive)"""
+    return [line.strip() for line in data.decode().splitlines()]
+
+
+def load_label_dir(anno_path, batch_size=BATCH_FILES):
+    """Read classes.txt and every label file of a YOLO annotation folder"""
+    return read_classes(anno_path), load_label_files(label_files(anno_path), batch_size)
+
+
+def folder_fingerprint(anno_path):
+    """[mtime_ns, inode] of the folder itself; adding, removing or renaming a file changes it"""
+    st = os.stat(anno_path)
+    return [st.st_mtime_ns, st.st_ino]
+
+
+def files_digest(files):
+    """sha1 over the name, size and mtime of every file (one stat per file)"""
+    sha1 = hashlib.sha1()
+    for file in files:
+        st = os.stat(file)
+        sha1.update(f"{os.path.basename(file)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return sha1.hexdigest()
+
+
+def build_label_cache(anno_path, cache_path=None, check_files=True, batch_size=BATCH_FILES):
+    """Parse every label file of anno_path and write them to a packed cache file.
+
+    The cache holds the YoloLabels arrays as they are, plus the file names as one
+    newline-separated blob. It is stamped with the folder fingerprint taken after
+    the cache itself was written (writing it changes the folder mtime), unless the
+    file list changed while parsing, in which case the stamp will not match and
+    the next open rebuilds it. With check_files (the default) the size and mtime
+    of every file is recorded too, to catch labels edited in place.
+    """
+    cache_path = cache_path or os.path.join(anno_path, CACHE_NAME)
+    files = label_files(anno_path)
+    labels = load_label_files(files, batch_size)
+    meta = {'version': CACHE_VERSION, 'errors': labels.errors, 'error_rows': labels.error_rows,
+            'files_digest': files_digest(files) if check_files else None}
+    names = '\n'.join(os.path.basename(file) for file in files).encode()
+    write_packed(cache_path, {
+        'fingerprint': np.zeros(2, dtype=np.int64),
+        'names': np.frombuffer(names, dtype=np.uint8),
+        'line_counts': labels.line_counts,
+        'file_index': labels.file_index,
+        'class_ids': labels.class_ids,
+        'boxes': labels.boxes,
+    }, meta)
+    if label_files(anno_path) == files:
+        update_packed(cache_path, 'fingerprint', np.array(folder_fingerprint(anno_path), dtype=np.int64))
+    return labels
+
+
+def open_label_cache(anno_path, cache_path=None, check_files=True):
+    """YoloLabels from the cache of anno_path, or None if it is missing or out of date.
+
+    The arrays are memory-mapped and the label files are never read; checking
+    costs one stat of the folder plus, with check_files, one stat of every label
+    file. Editing a file in place does not change the folder, so without
+    check_files the cache is only safe when files are added, removed or renamed.
+    """
+    cache_path = cache_path or os.path.join(anno_path, CACHE_NAME)
+    try:
+        meta, arrays = read_packed(cache_path)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != CACHE_VERSION or arrays['fingerprint'].tolist() != folder_fingerprint(anno_path):
+        return None
+    names = arrays['names'].tobytes().decode()
+    files = [os.path.join(anno_path, name) for name in names.split('\n')] if names else []
+    if check_files and meta['files_digest'] != files_digest(files):
+        return None
+    return YoloLabels(files, arrays['line_counts'], arrays['file_index'], arrays['class_ids'], arrays['boxes'],
+                      meta['errors'], meta['error_rows'])
+
+
+def load_label_cache(anno_path, cache_path=None, check_files=True, rebuild=False):
+    """Labels of every file of anno_path, from the cache if it is current, else (re)building it"""
+    labels = None if rebuild else open_label_cache(anno_path, cache_path, check_files)
+    if labels is None:
+        labels = build_label_cache(anno_path, cache_path, check_files)
+    return labels
+
+
+def read_labels(anno_path, files, cache=False, check_files=True):
+    """YoloLabels of files (label files in anno_path), taken from the folder's cache with cache=True.
+
+    check_files=False validates the cache with one stat of the folder only (see open_label_cache).
+    """
+    if cache:
+        labels = load_label_cache(anno_path, check_files=check_files)
+        rows = {file: row for row, file in enumerate(labels.files)}
+        if all(file in rows for file in files):
+            return labels.subset([rows[file] for file in files])
+    return load_label_files(files)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-ap', '--anno-path', type=str, required=True, help='Path to the YOLO .txt annotations folder(with classes.txt)')
+    parser.add_argument('-cp', '--cache-path', type=str, default=None, help='Where to keep the cache (default: .labels.cache in the annotations folder)')
+    parser.add_argument('--skip-file-check', action='store_true', help='Only check the folder itself, not the size and mtime of every label file (misses labels edited in place)')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the cache even if it is current')
+    opt = parser.parse_args()
+
+    print(opt)
+    labels = load_label_cache(opt.anno_path, opt.cache_path, not opt.skip_file_check, opt.rebuild)
+    for error in labels.errors:
+        print(f"WARNING: skipped malformed line {error}")
+    print(f"file nums: {len(labels)}")
+    print(f"bbox nums: {labels.bbox_nums}")